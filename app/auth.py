@@ -1,13 +1,15 @@
+import asyncio
 import uuid
-import secrets
 from datetime import datetime, timedelta
 from typing import Optional
 from fastapi import APIRouter, Request, Depends, HTTPException, status, Form
 from fastapi.responses import HTMLResponse, RedirectResponse
 from fastapi.security import HTTPBearer
 from passlib.context import CryptContext
-from app.db import get_db, init_db, create_user, get_user_by_email, get_user_by_id, check_email_exists, check_username_exists
+from app.db import db_pool, read_pool, user_cache, init_db, create_user, get_user_by_email, get_user_by_id, check_email_exists, check_username_exists
 from app.models import User, UserCreate, UserLogin, UserResponse, SessionData
+from app.passwords import password_executor
+from app.sessions import session_store
 from app.settings import settings
 from app.templates import get_templates
 
@@ -18,9 +20,6 @@ security = HTTPBearer()
 # Password hashing
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
-# In-memory session storage (in production, use Redis or database)
-sessions = {}
-
 def hash_password(password: str) -> str:
     """Hash a password using bcrypt"""
     return pwd_context.hash(password)
@@ -29,27 +28,48 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against its hash"""
     return pwd_context.verify(plain_password, hashed_password)
 
+async def hash_password_async(password: str) -> str:
+    """hash_password on the password pool; raises PasswordBusy when it is full"""
+    return await password_executor.run(hash_password, password)
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """verify_password on the password pool; raises PasswordBusy when it is full"""
+    return await password_executor.run(verify_password, plain_password, hashed_password)
+
 def create_session(user: User) -> str:
     """Create a new session for a user"""
-    session_id = secrets.token_urlsafe(32)
-    sessions[session_id] = SessionData(
+    return session_store.create(SessionData(
         user_id=user.id,
         email=user.email,
         username=user.username
-    )
-    return session_id
+    ))
 
 def get_session(session_id: str) -> Optional[SessionData]:
     """Get session data by session ID"""
-    return sessions.get(session_id)
+    return session_store.get(session_id)
 
 def delete_session(session_id: str):
     """Delete a session"""
-    if session_id in sessions:
-        del sessions[session_id]
+    session_store.delete(session_id)
+
+async def get_current_user(request: Request) -> Optional[User]:
+    """Get current authenticated user from session
 
-async def get_current_user(request: Request, db=Depends(get_db)) -> Optional[User]:
-    """Get current authenticated user from session"""
+    The result is memoized on ``request.state``, so every dependency in one
+    request shares a single lookup. Users come from the per-worker user
+    cache; only a miss borrows a pooled connection, and it is released
+    before the route runs.
+    """
+    try:
+        return request.state.current_user
+    except AttributeError:
+        pass
+    
+    user = await _load_current_user(request)
+    request.state.current_user = user
+    return user
+
+async def _load_current_user(request: Request) -> Optional[User]:
     session_id = request.cookies.get(settings.SESSION_COOKIE_NAME)
     if not session_id:
         return None
@@ -58,34 +78,40 @@ async def get_current_user(request: Request, db=Depends(get_db)) -> Optional[Use
     if not session_data:
         return None
     
-    user = await get_user_by_id(db, session_data.user_id)
+    found, user = user_cache.lookup(session_data.user_id)
+    if found:
+        return user
+    
+    async with read_pool.acquire() as db:
+        user = await get_user_by_id(db, session_data.user_id)
+    if user:
+        user_cache.set(user.id, user)
     return user
 
 @router.get("/login", response_class=HTMLResponse)
 async def login_page(request: Request):
     """Display login page"""
     template = templates.get_template("auth.html")
-    return HTMLResponse(template.render(request=request, mode="login"))
+    return HTMLResponse(await template.render_async(request=request, mode="login"))
 
 @router.get("/register", response_class=HTMLResponse)
 async def register_page(request: Request):
     """Display registration page"""
     template = templates.get_template("auth.html")
-    return HTMLResponse(template.render(request=request, mode="register"))
+    return HTMLResponse(await template.render_async(request=request, mode="register"))
 
 @router.post("/register")
 async def register(
     request: Request,
     email: str = Form(...),
     username: str = Form(...),
-    password: str = Form(...),
-    db=Depends(get_db)
+    password: str = Form(...)
 ):
     """Handle user registration"""
     # Validate input
     if not email or not username or not password:
         template = templates.get_template("auth.html")
-        return HTMLResponse(template.render(
+        return HTMLResponse(await template.render_async(
             request=request, 
             mode="register", 
             error="All fields are required",
@@ -95,7 +121,7 @@ async def register(
     
     if len(password) < 8:
         template = templates.get_template("auth.html")
-        return HTMLResponse(template.render(
+        return HTMLResponse(await template.render_async(
             request=request, 
             mode="register", 
             error="Password must be at least 8 characters long",
@@ -104,9 +130,13 @@ async def register(
         ))
     
     # Check if email or username already exists
-    if await check_email_exists(db, email):
+    async with read_pool.acquire() as db:
+        email_taken = await check_email_exists(db, email)
+        username_taken = not email_taken and await check_username_exists(db, username)
+    
+    if email_taken:
         template = templates.get_template("auth.html")
-        return HTMLResponse(template.render(
+        return HTMLResponse(await template.render_async(
             request=request, 
             mode="register", 
             error="Email already registered",
@@ -114,9 +144,9 @@ async def register(
             username=username
         ))
     
-    if await check_username_exists(db, username):
+    if username_taken:
         template = templates.get_template("auth.html")
-        return HTMLResponse(template.render(
+        return HTMLResponse(await template.render_async(
             request=request, 
             mode="register", 
             error="Username already taken",
@@ -126,13 +156,14 @@ async def register(
     
     # Create user
     user_data = UserCreate(email=email, username=username, password=password)
-    hashed_password = hash_password(password)
+    hashed_password = await hash_password_async(password)
     
     try:
-        user = await create_user(db, user_data, hashed_password)
+        async with db_pool.acquire() as db:
+            user = await create_user(db, user_data, hashed_password)
         
         # Create session and redirect to dashboard
-        session_id = create_session(user)
+        session_id = await asyncio.to_thread(create_session, user)
         response = RedirectResponse(url="/", status_code=302)
         response.set_cookie(
             key=settings.SESSION_COOKIE_NAME,
@@ -140,13 +171,13 @@ async def register(
             httponly=settings.SESSION_COOKIE_HTTPONLY,
             secure=settings.SESSION_COOKIE_SECURE,
             samesite=settings.SESSION_COOKIE_SAMESITE,
-            max_age=3600 * 24 * 7  # 7 days
+            max_age=settings.SESSION_TTL
         )
         return response
         
     except Exception as e:
         template = templates.get_template("auth.html")
-        return HTMLResponse(template.render(
+        return HTMLResponse(await template.render_async(
             request=request, 
             mode="register", 
             error="Failed to create user. Please try again.",
@@ -158,14 +189,13 @@ async def register(
 async def login(
     request: Request,
     email: str = Form(...),
-    password: str = Form(...),
-    db=Depends(get_db)
+    password: str = Form(...)
 ):
     """Handle user login"""
     # Validate input
     if not email or not password:
         template = templates.get_template("auth.html")
-        return HTMLResponse(template.render(
+        return HTMLResponse(await template.render_async(
             request=request, 
             mode="login", 
             error="Email and password are required",
@@ -173,10 +203,11 @@ async def login(
         ))
     
     # Get user by email
-    user = await get_user_by_email(db, email)
+    async with read_pool.acquire() as db:
+        user = await get_user_by_email(db, email)
     if not user:
         template = templates.get_template("auth.html")
-        return HTMLResponse(template.render(
+        return HTMLResponse(await template.render_async(
             request=request, 
             mode="login", 
             error="Invalid email or password",
@@ -184,9 +215,9 @@ async def login(
         ))
     
     # Verify password
-    if not verify_password(password, user.hashed_password):
+    if not await verify_password_async(password, user.hashed_password):
         template = templates.get_template("auth.html")
-        return HTMLResponse(template.render(
+        return HTMLResponse(await template.render_async(
             request=request, 
             mode="login", 
             error="Invalid email or password",
@@ -194,7 +225,9 @@ async def login(
         ))
     
     # Create session and redirect to dashboard
-    session_id = create_session(user)
+    # Off the event loop: the insert may wait on a lock held by a connection
+    # that needs the loop to commit (the event writer, pooled requests)
+    session_id = await asyncio.to_thread(create_session, user)
     response = RedirectResponse(url="/", status_code=302)
     response.set_cookie(
         key=settings.SESSION_COOKIE_NAME,
@@ -202,7 +235,7 @@ async def login(
         httponly=settings.SESSION_COOKIE_HTTPONLY,
         secure=settings.SESSION_COOKIE_SECURE,
         samesite=settings.SESSION_COOKIE_SAMESITE,
-        max_age=3600 * 24 * 7  # 7 days
+        max_age=settings.SESSION_TTL
     )
     return response
 
@@ -211,7 +244,10 @@ async def logout(request: Request):
     """Logout user and clear session"""
     session_id = request.cookies.get(settings.SESSION_COOKIE_NAME)
     if session_id:
-        delete_session(session_id)
+        session_data = get_session(session_id)
+        if session_data:
+            user_cache.invalidate(session_data.user_id)
+        await asyncio.to_thread(delete_session, session_id)
     
     response = RedirectResponse(url="/", status_code=302)
     response.delete_cookie(settings.SESSION_COOKIE_NAME)
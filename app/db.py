@@ -1,19 +1,278 @@
+import asyncio
+import base64
+import calendar
+import sqlite3
+import time
 import aiosqlite
 import uuid
+from contextlib import asynccontextmanager
 from datetime import datetime, timezone
-from app.models import User, UserCreate
+from typing import NamedTuple, Optional
+from app.cache import TTLCache
+from app.hll import HyperLogLog, merge_all
+from app.models import Site, SourceType, TrackedLink, User, UserCreate
+from app.sessions import SESSIONS_INDEX_SQL, SESSIONS_TABLE_SQL
+from app.settings import settings
+from app.tracking import add_utm_params, classify_source
 
-async def get_db():
-    """Get database connection"""
-    db = await aiosqlite.connect('engagemeter.db')
+def connection_pragmas(readonly: bool = False) -> list[str]:
+    """PRAGMAs applied once when a connection is opened, never per request.
+
+    WAL itself is a property of the database file and is switched on by
+    init_db. ``synchronous = NORMAL`` is durable against application crashes
+    in WAL mode and only syncs at checkpoints. Read-only connections also
+    set ``query_only`` so a reader can never take the write lock.
+    """
+    pragmas = [
+        f'PRAGMA busy_timeout = {int(settings.DATABASE_BUSY_TIMEOUT_MS)}',
+        'PRAGMA synchronous = NORMAL',
+        f'PRAGMA cache_size = -{int(settings.DATABASE_CACHE_SIZE_KB)}',
+        f'PRAGMA mmap_size = {int(settings.DATABASE_MMAP_SIZE)}',
+        'PRAGMA temp_store = MEMORY',
+    ]
+    if readonly:
+        pragmas.append('PRAGMA query_only = ON')
+    return pragmas
+
+async def connect(db_path: Optional[str] = None, readonly: bool = False) -> aiosqlite.Connection:
+    """Open a configured database connection (``readonly`` for the reader role)"""
+    db = await aiosqlite.connect(db_path or settings.DATABASE_PATH)
     db.row_factory = aiosqlite.Row
+    await db.create_function('classify_source', 2, classify_source, deterministic=True)
+    for pragma in connection_pragmas(readonly):
+        async with db.execute(pragma) as cursor:
+            await cursor.fetchall()
     return db
 
+class PoolTimeout(Exception):
+    """Raised when no pooled connection frees up within the acquire timeout"""
+
+class ConnectionPool:
+    """Fixed-size pool of reusable aiosqlite connections.
+
+    Every aiosqlite connection owns a thread, so connections are opened lazily
+    up to ``size`` and then handed out again instead of being reopened per
+    request. A semaphore caps checkouts: when all connections are in use,
+    callers wait up to ``timeout`` seconds and then get ``PoolTimeout``. A
+    broken connection is discarded on release and its slot is reopened by the
+    next caller. A ``readonly`` pool opens reader connections.
+    """
+
+    def __init__(self, db_path: Optional[str] = None, size: Optional[int] = None,
+                 timeout: Optional[float] = None, readonly: bool = False):
+        self.db_path = db_path
+        self.readonly = readonly
+        self.size = size or (settings.DATABASE_READ_POOL_SIZE if readonly else settings.DATABASE_POOL_SIZE)
+        self.timeout = timeout if timeout is not None else settings.DATABASE_POOL_TIMEOUT
+        self._loop = None
+        self._connections: set = set()
+        self._reset()
+
+    def _reset(self):
+        self._slots = asyncio.Semaphore(self.size)
+        self._idle: list = []
+        self._connections = set()
+        self.in_use = 0
+        self.waiters = 0
+        self.acquired = 0
+        self.timeouts = 0
+        self.total_wait_ms = 0.0
+        self.max_wait_ms = 0.0
+
+    def _check_loop(self):
+        # Connections and the semaphore belong to the loop that created them
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            for db in self._connections:
+                db.stop()
+            self._loop = loop
+            self._reset()
+
+    async def _get(self) -> aiosqlite.Connection:
+        self._check_loop()
+        if self._slots.locked():
+            self.waiters += 1
+            started = time.perf_counter()
+            try:
+                await asyncio.wait_for(self._slots.acquire(), self.timeout)
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                raise PoolTimeout(f"No database connection available after {self.timeout}s")
+            finally:
+                self.waiters -= 1
+            waited_ms = (time.perf_counter() - started) * 1000
+            self.total_wait_ms += waited_ms
+            self.max_wait_ms = max(self.max_wait_ms, waited_ms)
+        else:
+            await self._slots.acquire()
+
+        if self._idle:
+            return self._idle.pop()
+        try:
+            db = await connect(self.db_path, self.readonly)
+        except BaseException:
+            self._slots.release()
+            raise
+        self._connections.add(db)
+        return db
+
+    async def _put(self, db: aiosqlite.Connection):
+        try:
+            if db.in_transaction:
+                await db.rollback()
+            self._idle.append(db)
+        except Exception:
+            # Broken connection: drop it so the slot reopens a fresh one
+            self._connections.discard(db)
+            await self._close_quietly(db)
+        finally:
+            self._slots.release()
+
+    @staticmethod
+    async def _close_quietly(db: aiosqlite.Connection):
+        try:
+            await db.close()
+        except Exception:
+            pass
+
+    @asynccontextmanager
+    async def acquire(self):
+        """Borrow a connection for the duration of the ``async with`` block"""
+        db = await self._get()
+        self.in_use += 1
+        self.acquired += 1
+        try:
+            yield db
+        finally:
+            self.in_use -= 1
+            await self._put(db)
+
+    async def close(self):
+        """Wait for borrowed connections to come back, then close them all.
+
+        Connections still checked out after ``timeout`` seconds are closed
+        anyway, since their worker threads would otherwise keep the process
+        alive.
+        """
+        if self._loop is not asyncio.get_running_loop():
+            for db in self._connections:
+                db.stop()
+            self._connections = set()
+            return
+
+        held = 0
+        try:
+            for _ in range(self.size):
+                await asyncio.wait_for(self._slots.acquire(), self.timeout)
+                held += 1
+        except asyncio.TimeoutError:
+            pass
+        for db in list(self._connections):
+            await self._close_quietly(db)
+        self._connections = set()
+        self._idle = []
+        for _ in range(held):
+            self._slots.release()
+
+    def stats(self) -> dict:
+        """Pool usage and wait time counters"""
+        return {
+            "role": "reader" if self.readonly else "writer",
+            "size": self.size,
+            "open": len(self._connections),
+            "in_use": self.in_use,
+            "idle": len(self._idle),
+            "waiters": self.waiters,
+            "acquired": self.acquired,
+            "timeouts": self.timeouts,
+            "total_wait_ms": round(self.total_wait_ms, 3),
+            "max_wait_ms": round(self.max_wait_ms, 3),
+        }
+
+# Writes (and reads that must see them in the same transaction) go through
+# db_pool; everything else goes through read_pool, whose connections WAL
+# lets run alongside the writer and each other
+db_pool = ConnectionPool()
+read_pool = ConnectionPool(readonly=True)
+
+async def get_db():
+    """Yield a pooled writer connection (FastAPI dependency)"""
+    async with db_pool.acquire() as db:
+        yield db
+
+async def get_read_db():
+    """Yield a pooled read-only connection (FastAPI dependency)"""
+    async with read_pool.acquire() as db:
+        yield db
+
+async def read(query, *args, **kwargs):
+    """Run ``query(db, ...)`` on its own reader connection.
+
+    Independent queries started with asyncio.gather(read(...), read(...))
+    run concurrently, each on a different reader.
+    """
+    async with read_pool.acquire() as db:
+        return await query(db, *args, **kwargs)
+
+async def close_pools():
+    """Close the writer and reader pools"""
+    await db_pool.close()
+    await read_pool.close()
+
 async def init_db():
     """Initialize database with required tables"""
-    db = await get_db()
+    # A dedicated connection, so no pooled connection outlives the caller's loop
+    db = await connect()
+    try:
+        await _create_tables(db)
+    finally:
+        await db.close()
+    # Keys, versions and partitions belong to one database file
+    entity_key_cache.clear()
+    data_version_cache.clear()
+    known_partitions.clear()
+    print("Database initialized successfully")
+
+async def _add_column_if_missing(db: aiosqlite.Connection, table: str, column: str, definition: str):
+    """ALTER TABLE ... ADD COLUMN unless the column already exists"""
+    async with db.execute(f'PRAGMA table_info({table})') as cursor:
+        columns = {row['name'] for row in await cursor.fetchall()}
+    if column not in columns:
+        await db.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+
+async def _table_exists(db: aiosqlite.Connection, table: str) -> bool:
+    async with db.execute('''
+        SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?
+    ''', (table,)) as cursor:
+        return await cursor.fetchone() is not None
+
+async def _rename_legacy_events(db: aiosqlite.Connection):
+    """Move a UUID/ISO-timestamp events table out of the way as events_legacy.
+
+    Renaming is a schema-only change, so startup stays fast however many rows
+    there are. The old indexes are dropped: the migration reads by rowid.
+    """
+    async with db.execute("SELECT type FROM pragma_table_info('events') WHERE name = 'id'") as cursor:
+        row = await cursor.fetchone()
+    if row is None or row['type'] != 'TEXT':
+        return
+    await _add_column_if_missing(db, 'events', 'source', 'TEXT')
+    await db.execute('ALTER TABLE events RENAME TO events_legacy')
+    for index in ('idx_events_ts', 'idx_events_site_id', 'idx_events_tracked_link_id'):
+        await db.execute(f'DROP INDEX IF EXISTS {index}')
+
+async def _create_tables(db: aiosqlite.Connection):
+    """Create tables and indexes that do not exist yet"""
+    # Lets the retention job hand freed pages back to the filesystem. Only
+    # takes effect on a new database; existing files need one VACUUM
+    # (scripts/retention.py --convert)
+    await db.execute('PRAGMA auto_vacuum = INCREMENTAL')
+    # Persistent: every later connection to the file uses the WAL, so
+    # readers no longer block the writer or each other
+    async with db.execute('PRAGMA journal_mode = WAL') as cursor:
+        await cursor.fetchall()
     
-        # Create users table
+    # Create users table
     await db.execute('''
         CREATE TABLE IF NOT EXISTS users (
             id TEXT PRIMARY KEY,
@@ -25,11 +284,24 @@ async def init_db():
         )
     ''')
     
+    # Create sites table
+    await db.execute('''
+        CREATE TABLE IF NOT EXISTS sites (
+            id TEXT PRIMARY KEY,
+            user_id TEXT NOT NULL,
+            domain TEXT NOT NULL,
+            created_at TEXT NOT NULL,
+            is_active BOOLEAN NOT NULL DEFAULT 1,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    ''')
+    
     # Create tracked_links table
     await db.execute('''
         CREATE TABLE IF NOT EXISTS tracked_links (
             id TEXT PRIMARY KEY,
             user_id TEXT NOT NULL,
+            site_id TEXT NOT NULL,
             original_url TEXT NOT NULL,
             short_code TEXT UNIQUE NOT NULL,
             source TEXT NOT NULL,
@@ -38,31 +310,181 @@ async def init_db():
             utm_campaign TEXT NOT NULL DEFAULT 'link_tracking',
             created_at TEXT NOT NULL,
             is_active BOOLEAN NOT NULL DEFAULT 1,
-            FOREIGN KEY (user_id) REFERENCES users (id)
+            FOREIGN KEY (user_id) REFERENCES users (id),
+            FOREIGN KEY (site_id) REFERENCES sites (id)
         )
     ''')
     
-    # Create click_events table
+    # Login sessions, shared by all workers (see app.sessions)
+    await db.execute(SESSIONS_TABLE_SQL)
+    await db.execute(SESSIONS_INDEX_SQL)
+    
+    # Integer surrogate keys for the UUIDs referenced by events
     await db.execute('''
-        CREATE TABLE IF NOT EXISTS click_events (
-            id TEXT PRIMARY KEY,
-            link_id TEXT NOT NULL,
-            user_agent TEXT,
-            referrer TEXT,
-            ip_address TEXT,
-            clicked_at TEXT NOT NULL,
-            FOREIGN KEY (link_id) REFERENCES tracked_links (id)
+        CREATE TABLE IF NOT EXISTS entity_keys (
+            id INTEGER PRIMARY KEY,
+            uuid TEXT UNIQUE NOT NULL
+        )
+    ''')
+    
+    # Events from before the compact format stay readable as events_legacy
+    # until migrate_legacy_events has copied them over
+    await _rename_legacy_events(db)
+    
+    # Events live in one table per UTC day, created on first write (see
+    # event_partition). A single events table from before partitioning is
+    # left in place until partition_events has moved its rows.
+    
+    # Create indexes. Listings filter on the owner and sort newest first, so
+    # created_at is part of each key; tests/test_query_plans.py checks that
+    # every query in this module has an index to use. Listing keys end with
+    # id, so keyset pages (see get_tracked_links_page) come straight off the
+    # index, with or without a site filter.
+    await db.execute('CREATE INDEX IF NOT EXISTS idx_sites_user_page ON sites(user_id, created_at, id)')
+    await db.execute('CREATE INDEX IF NOT EXISTS idx_tracked_links_user_page ON tracked_links(user_id, created_at, id)')
+    await db.execute('CREATE INDEX IF NOT EXISTS idx_tracked_links_user_site_page '
+                     'ON tracked_links(user_id, site_id, created_at, id)')
+    await db.execute('CREATE INDEX IF NOT EXISTS idx_tracked_links_site_created ON tracked_links(site_id, created_at)')
+    
+    # Superseded by the indexes above, never read (click_events), or a
+    # duplicate of the UNIQUE constraint's own index (short_code)
+    for index in ('idx_sites_user_created', 'idx_tracked_links_user_created',
+                  'idx_sites_user_id', 'idx_tracked_links_user_id', 'idx_tracked_links_site_id',
+                  'idx_tracked_links_short_code', 'idx_events_site_key', 'idx_events_link_key',
+                  'idx_click_events_link_id', 'idx_click_events_clicked_at'):
+        await db.execute(f'DROP INDEX IF EXISTS {index}')
+    
+    # Hourly rollup of events, kept up to date as events are written.
+    # hour is the UTC start of the hour in epoch seconds; tracked_link_id is ''
+    # for events without a link so it can be part of the key
+    await db.execute('''
+        CREATE TABLE IF NOT EXISTS events_hourly (
+            site_id TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            hour INTEGER NOT NULL,
+            tracked_link_id TEXT NOT NULL DEFAULT '',
+            source TEXT NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (site_id, kind, hour, tracked_link_id, source)
+        ) WITHOUT ROWID
+    ''')
+    
+    # Unique-visitor sketches (see app/hll.py), one per site and hour of
+    # pageviews, merged into on every event write. hour is in epoch seconds
+    # like events_hourly; sketches grow to a few KiB, so the table keeps a
+    # rowid and stores them out of the key index
+    await db.execute('''
+        CREATE TABLE IF NOT EXISTS visitors_hourly (
+            site_id TEXT NOT NULL,
+            hour INTEGER NOT NULL,
+            sketch BLOB NOT NULL,
+            PRIMARY KEY (site_id, hour)
         )
     ''')
     
-    # Create indexes
-    await db.execute('CREATE INDEX IF NOT EXISTS idx_tracked_links_user_id ON tracked_links(user_id)')
-    await db.execute('CREATE INDEX IF NOT EXISTS idx_tracked_links_short_code ON tracked_links(short_code)')
-    await db.execute('CREATE INDEX IF NOT EXISTS idx_click_events_link_id ON click_events(link_id)')
-    await db.execute('CREATE INDEX IF NOT EXISTS idx_click_events_clicked_at ON click_events(clicked_at)')
+    # Change counters behind the list/dashboard ETags; scope is 'user:<id>'
+    # or 'site:<id>'
+    await db.execute('''
+        CREATE TABLE IF NOT EXISTS data_versions (
+            scope TEXT PRIMARY KEY,
+            version INTEGER NOT NULL
+        ) WITHOUT ROWID
+    ''')
+    
+    # Short-code counters, one per code length; workers reserve blocks of
+    # counter values and app/short_codes.py turns each value into a code
+    # with a permutation keyed by perm_key, which is fixed on first use
+    await db.execute('''
+        CREATE TABLE IF NOT EXISTS short_code_counters (
+            length INTEGER PRIMARY KEY,
+            next INTEGER NOT NULL,
+            perm_key TEXT NOT NULL
+        )
+    ''')
     
     await db.commit()
-    print("Database initialized successfully")
+
+# Row Mapping
+# Rows read back from our own tables were validated when they were written,
+# so they become models without running pydantic validation again. Each
+# mapper also owns the column list its SELECTs use, so values are taken by
+# position rather than looked up by name.
+
+class RowMapper:
+    """Builds trusted ``model`` instances from rows selected as ``mapper.select``.
+
+    The columns are the model's fields, in order; ``converters`` turn stored
+    values into field types (ISO text to datetime, 0/1 to bool). Instances
+    are assembled the way ``model_construct`` does it, without its
+    per-field default handling, which is why every field must be selected.
+    """
+
+    def __init__(self, model, converters: dict):
+        self.model = model
+        self.columns = tuple(model.model_fields)
+        self.select = ', '.join(self.columns)
+        self._converters = tuple((self.columns.index(name), name, convert)
+                                 for name, convert in converters.items())
+
+    def __call__(self, row):
+        values = dict(zip(self.columns, row))
+        for index, name, convert in self._converters:
+            values[name] = convert(row[index])
+        instance = self.model.__new__(self.model)
+        object.__setattr__(instance, '__dict__', values)
+        object.__setattr__(instance, '__pydantic_fields_set__', set(self.columns))
+        object.__setattr__(instance, '__pydantic_extra__', None)
+        object.__setattr__(instance, '__pydantic_private__', None)
+        return instance
+
+    def all(self, rows) -> list:
+        return [self(row) for row in rows]
+
+# Every entity table stores created_at as ISO text and is_active as 0/1
+_ENTITY_CONVERTERS = {'created_at': datetime.fromisoformat, 'is_active': bool}
+USER_ROWS = RowMapper(User, _ENTITY_CONVERTERS)
+SITE_ROWS = RowMapper(Site, _ENTITY_CONVERTERS)
+TRACKED_LINK_ROWS = RowMapper(TrackedLink, {**_ENTITY_CONVERTERS, 'source': SourceType})
+
+# Keyset Pagination
+# Listings are read newest first in pages keyed by (created_at, id). A cursor
+# names the last row of the previous page, so rows inserted in the meantime
+# (always newer) never shift later pages, and every page is one index range
+# scan however deep into the list it is.
+
+class Page(NamedTuple):
+    items: list
+    next_cursor: Optional[str]  # None on the last page
+
+def encode_cursor(created_at: datetime, item_id: str) -> str:
+    """Opaque cursor for the row after which the next page starts"""
+    raw = f'{created_at.isoformat()}|{item_id}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(cursor: str) -> tuple[str, str]:
+    """(created_at, id) from encode_cursor; ValueError if it isn't a cursor"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, item_id = raw.split('|', 1)
+        datetime.fromisoformat(created_at)
+    except ValueError:
+        raise ValueError('Invalid cursor') from None
+    return created_at, item_id
+
+async def _keyset_page(db: aiosqlite.Connection, mapper: RowMapper, table: str, where: str,
+                       params: list, limit: int, cursor: Optional[str]) -> Page:
+    # created_at round-trips exactly: it is stored as datetime.isoformat()
+    if cursor:
+        where += ' AND (created_at, id) < (?, ?)'
+        params = [*params, *decode_cursor(cursor)]
+    async with db.execute(f'''
+        SELECT {mapper.select} FROM {table} WHERE {where}
+        ORDER BY created_at DESC, id DESC LIMIT ?
+    ''', [*params, limit + 1]) as c:
+        rows = await c.fetchall()
+    items = mapper.all(rows[:limit])
+    more = len(rows) > limit
+    return Page(items, encode_cursor(items[-1].created_at, items[-1].id) if more else None)
 
 async def create_user(db: aiosqlite.Connection, user_data: UserCreate, hashed_password: str) -> User:
     """Create a new user account"""
@@ -85,39 +507,26 @@ async def create_user(db: aiosqlite.Connection, user_data: UserCreate, hashed_pa
         is_active=True
     )
 
+# user_id -> User for signed-in users, filled by app.auth.get_current_user.
+# Functions that change a user row must invalidate it; other workers see
+# the change once their entry expires.
+user_cache = TTLCache(settings.USER_CACHE_SIZE, settings.USER_CACHE_TTL)
+
 async def get_user_by_email(db: aiosqlite.Connection, email: str) -> User | None:
     """Get user by email"""
-    async with db.execute('''
-        SELECT * FROM users WHERE email = ? AND is_active = 1
+    async with db.execute(f'''
+        SELECT {USER_ROWS.select} FROM users WHERE email = ? AND is_active = 1
     ''', (email,)) as cursor:
         row = await cursor.fetchone()
-        if row:
-            return User(
-                id=row['id'],
-                email=row['email'],
-                username=row['username'],
-                hashed_password=row['hashed_password'],
-                created_at=datetime.fromisoformat(row['created_at']),
-                is_active=bool(row['is_active'])
-            )
-        return None
+    return USER_ROWS(row) if row else None
 
 async def get_user_by_id(db: aiosqlite.Connection, user_id: str) -> User | None:
     """Get user by ID"""
-    async with db.execute('''
-        SELECT * FROM users WHERE id = ? AND is_active = 1
+    async with db.execute(f'''
+        SELECT {USER_ROWS.select} FROM users WHERE id = ? AND is_active = 1
     ''', (user_id,)) as cursor:
         row = await cursor.fetchone()
-        if row:
-            return User(
-                id=row['id'],
-                email=row['email'],
-                username=row['username'],
-                hashed_password=row['hashed_password'],
-                created_at=datetime.fromisoformat(row['created_at']),
-                is_active=bool(row['is_active'])
-            )
-        return None
+    return USER_ROWS(row) if row else None
 
 async def check_email_exists(db: aiosqlite.Connection, email: str) -> bool:
     """Check if email already exists"""
@@ -135,11 +544,53 @@ async def check_username_exists(db: aiosqlite.Connection, username: str) -> bool
         row = await cursor.fetchone()
         return row['count'] > 0
 
+# Data Versions
+# scope -> version, so conditional GETs can answer 304 without a query.
+# Writes in this worker invalidate straight away; writes in other workers
+# show up within DATA_VERSION_CACHE_TTL seconds.
+data_version_cache = TTLCache(settings.DATA_VERSION_CACHE_SIZE, settings.DATA_VERSION_CACHE_TTL)
+
+def user_scope(user_id: str) -> str:
+    return f'user:{user_id}'
+
+def site_scope(site_id: str) -> str:
+    return f'site:{site_id}'
+
+async def bump_data_versions(db: aiosqlite.Connection, scopes) -> None:
+    """Increment the version of each scope (caller commits)"""
+    scopes = list(scopes)
+    await db.executemany('''
+        INSERT INTO data_versions (scope, version) VALUES (?, 1)
+        ON CONFLICT (scope) DO UPDATE SET version = version + 1
+    ''', [(scope,) for scope in scopes])
+    for scope in scopes:
+        data_version_cache.invalidate(scope)
+
+async def get_data_version(db: aiosqlite.Connection, scope: str) -> int:
+    """Current version of a scope (0 if it was never written), using the version cache"""
+    found, version = data_version_cache.lookup(scope)
+    if found:
+        return version
+    
+    async with db.execute('''
+        SELECT version FROM data_versions WHERE scope = ?
+    ''', (scope,)) as cursor:
+        row = await cursor.fetchone()
+    
+    version = row['version'] if row else 0
+    data_version_cache.set(scope, version)
+    return version
+
+async def current_data_version(scope: str) -> int:
+    """get_data_version that only takes a reader connection on a cache miss"""
+    found, version = data_version_cache.lookup(scope)
+    if found:
+        return version
+    return await read(get_data_version, scope)
+
 # Site Management Operations
 async def create_site(db: aiosqlite.Connection, user_id: str, domain: str):
     """Create a new site for a user"""
-    from app.models import Site
-    
     site_id = str(uuid.uuid4())
     now = datetime.now(timezone.utc).isoformat()
     
@@ -147,6 +598,7 @@ async def create_site(db: aiosqlite.Connection, user_id: str, domain: str):
         INSERT INTO sites (id, user_id, domain, created_at, is_active)
         VALUES (?, ?, ?, ?, ?)
     ''', (site_id, user_id, domain, now, True))
+    await bump_data_versions(db, [user_scope(user_id)])
     
     await db.commit()
     
@@ -160,83 +612,128 @@ async def create_site(db: aiosqlite.Connection, user_id: str, domain: str):
 
 async def get_user_sites(db: aiosqlite.Connection, user_id: str):
     """Get all sites for a user"""
-    from app.models import Site
+    async with db.execute(f'''
+        SELECT {SITE_ROWS.select} FROM sites WHERE user_id = ? AND is_active = 1 ORDER BY created_at DESC
+    ''', (user_id,)) as cursor:
+        return SITE_ROWS.all(await cursor.fetchall())
+
+async def get_sites_page(db: aiosqlite.Connection, user_id: str, limit: int,
+                         cursor: Optional[str] = None) -> Page:
+    """One page of a user's sites, newest first (see Keyset Pagination)"""
+    return await _keyset_page(db, SITE_ROWS, 'sites', 'user_id = ? AND is_active = 1', [user_id],
+                              limit, cursor)
+
+# site_id -> owning user_id for active sites, or None for unknown/deleted sites
+site_owner_cache = TTLCache(settings.LINK_CACHE_SIZE, settings.LINK_CACHE_TTL)
+
+async def get_site_owner(db: aiosqlite.Connection, site_id: str) -> Optional[str]:
+    """Get the user_id owning an active site, using the site owner cache"""
+    found, user_id = site_owner_cache.lookup(site_id)
+    if found:
+        return user_id
     
-    sites = []
     async with db.execute('''
-        SELECT * FROM sites WHERE user_id = ? AND is_active = 1 ORDER BY created_at DESC
-    ''', (user_id,)) as cursor:
-        async for row in cursor:
-            sites.append(Site(
-                id=row['id'],
-                user_id=row['user_id'],
-                domain=row['domain'],
-                created_at=datetime.fromisoformat(row['created_at']),
-                is_active=bool(row['is_active'])
-            ))
-    return sites
+        SELECT user_id FROM sites WHERE id = ? AND is_active = 1
+    ''', (site_id,)) as cursor:
+        row = await cursor.fetchone()
+    
+    user_id = row['user_id'] if row else None
+    site_owner_cache.set(site_id, user_id, None if user_id else settings.LINK_CACHE_NEGATIVE_TTL)
+    return user_id
 
 async def get_site_by_id(db: aiosqlite.Connection, site_id: str, user_id: str):
     """Get a specific site by ID (user must own it)"""
-    from app.models import Site
-    
-    async with db.execute('''
-        SELECT * FROM sites WHERE id = ? AND user_id = ? AND is_active = 1
+    async with db.execute(f'''
+        SELECT {SITE_ROWS.select} FROM sites WHERE id = ? AND user_id = ? AND is_active = 1
     ''', (site_id, user_id)) as cursor:
         row = await cursor.fetchone()
-        if row:
-            return Site(
-                id=row['id'],
-                user_id=row['user_id'],
-                domain=row['domain'],
-                created_at=datetime.fromisoformat(row['created_at']),
-                is_active=bool(row['is_active'])
-            )
-        return None
+    return SITE_ROWS(row) if row else None
 
 async def update_site(db: aiosqlite.Connection, site_id: str, user_id: str, domain: str):
     """Update a site's domain"""
-    from app.models import Site
-    
-    await db.execute('''
+    cursor = await db.execute('''
         UPDATE sites SET domain = ? WHERE id = ? AND user_id = ? AND is_active = 1
     ''', (domain, site_id, user_id))
     
-    if db.total_changes > 0:
+    if cursor.rowcount > 0:
+        await bump_data_versions(db, [user_scope(user_id), site_scope(site_id)])
         await db.commit()
         return await get_site_by_id(db, site_id, user_id)
     return None
 
 async def delete_site(db: aiosqlite.Connection, site_id: str, user_id: str) -> bool:
     """Soft delete a site (set is_active = 0)"""
-    await db.execute('''
+    cursor = await db.execute('''
         UPDATE sites SET is_active = 0 WHERE id = ? AND user_id = ? AND is_active = 1
     ''', (site_id, user_id))
     
-    if db.total_changes > 0:
+    if cursor.rowcount > 0:
+        await bump_data_versions(db, [user_scope(user_id), site_scope(site_id)])
         await db.commit()
+        site_owner_cache.invalidate(site_id)
+        async with db.execute('''
+            SELECT short_code FROM tracked_links WHERE site_id = ?
+        ''', (site_id,)) as cursor:
+            async for row in cursor:
+                link_cache.invalidate(row['short_code'])
         return True
     return False
 
 # Link Tracking Operations
+class ResolvedLink(NamedTuple):
+    """Everything the redirect path needs for one short code"""
+    redirect_url: str
+    link_id: str
+    site_id: str
+    user_id: str
+    utm_source: str
+    utm_medium: str
+    utm_campaign: str
+
+# short_code -> ResolvedLink, or None for codes known not to exist
+link_cache = TTLCache(settings.LINK_CACHE_SIZE, settings.LINK_CACHE_TTL)
+
+async def reserve_short_code_block(db: aiosqlite.Connection, length: int, size: int,
+                                   perm_key: str) -> tuple[int, str]:
+    """Reserve ``size`` counter values for ``length``-character codes.
+
+    Returns the first value and the permutation key; ``perm_key`` is only
+    stored if this is the first block for that length. Commits straight
+    away so blocks are never handed out twice; call this before writing
+    anything else in the same transaction.
+    """
+    async with db.execute('''
+        INSERT INTO short_code_counters (length, next, perm_key) VALUES (?, ?, ?)
+        ON CONFLICT (length) DO UPDATE SET next = next + excluded.next
+        RETURNING next, perm_key
+    ''', (length, size, perm_key)) as cursor:
+        row = await cursor.fetchone()
+    await db.commit()
+    return row['next'] - size, row['perm_key']
+
 async def create_tracked_link(db: aiosqlite.Connection, user_id: str, site_id: str, 
                             original_url: str, source: str, short_code: str, 
                             utm_source: str, utm_medium: str = "social", 
                             utm_campaign: str = "link_tracking"):
     """Create a new tracked link"""
-    from app.models import TrackedLink
-    
     link_id = str(uuid.uuid4())
     now = datetime.now(timezone.utc).isoformat()
     
-    await db.execute('''
-        INSERT INTO tracked_links (id, user_id, site_id, original_url, source, short_code, 
-                                 utm_source, utm_medium, utm_campaign, created_at, is_active)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    ''', (link_id, user_id, site_id, original_url, source, short_code, 
-          utm_source, utm_medium, utm_campaign, now, True))
+    try:
+        await db.execute('''
+            INSERT INTO tracked_links (id, user_id, site_id, original_url, source, short_code, 
+                                     utm_source, utm_medium, utm_campaign, created_at, is_active)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (link_id, user_id, site_id, original_url, source, short_code, 
+              utm_source, utm_medium, utm_campaign, now, True))
+    except sqlite3.IntegrityError:  # short_code taken
+        await db.rollback()
+        raise
+    await bump_data_versions(db, [user_scope(user_id), site_scope(site_id)])
     
     await db.commit()
+    # Drop a remembered miss for this code
+    link_cache.invalidate(short_code)
     
     return TrackedLink(
         id=link_id,
@@ -252,37 +749,88 @@ async def create_tracked_link(db: aiosqlite.Connection, user_id: str, site_id: s
         is_active=True
     )
 
+class NewTrackedLink(NamedTuple):
+    """One link for create_tracked_links; the rest is filled in on insert"""
+    site_id: str
+    original_url: str
+    source: str
+    short_code: str
+    utm_source: str
+    utm_medium: str = "social"
+    utm_campaign: str = "link_tracking"
+
+async def create_tracked_links(db: aiosqlite.Connection, user_id: str,
+                               links: list[NewTrackedLink]) -> list[TrackedLink]:
+    """Create many tracked links in one transaction.
+
+    A short code that is already taken raises sqlite3.IntegrityError and
+    nothing is written.
+    """
+    now = datetime.now(timezone.utc).isoformat()
+    rows = [(str(uuid.uuid4()), user_id, link.site_id, link.original_url, link.source, link.short_code,
+             link.utm_source, link.utm_medium, link.utm_campaign, now, True) for link in links]
+    try:
+        await db.executemany(f'''
+            INSERT INTO tracked_links ({TRACKED_LINK_ROWS.select})
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', rows)
+        sites = {link.site_id for link in links}
+        await bump_data_versions(db, [user_scope(user_id), *(site_scope(site) for site in sites)])
+        await db.commit()
+    except sqlite3.IntegrityError:
+        await db.rollback()
+        raise
+    for link in links:
+        link_cache.invalidate(link.short_code)
+    return TRACKED_LINK_ROWS.all(rows)
+
 async def get_tracked_link_by_short_code(db: aiosqlite.Connection, short_code: str):
     """Get a tracked link by its short code"""
-    from app.models import TrackedLink
-    
+    async with db.execute(f'''
+        SELECT {TRACKED_LINK_ROWS.select} FROM tracked_links WHERE short_code = ? AND is_active = 1
+    ''', (short_code,)) as cursor:
+        row = await cursor.fetchone()
+    return TRACKED_LINK_ROWS(row) if row else None
+
+async def resolve_short_code(db: aiosqlite.Connection, short_code: str) -> Optional[ResolvedLink]:
+    """Resolve a short code to its redirect target, using the link cache"""
+    found, resolved = link_cache.lookup(short_code)
+    if found:
+        return resolved
+    return await load_short_code(db, short_code)
+
+async def load_short_code(db: aiosqlite.Connection, short_code: str) -> Optional[ResolvedLink]:
+    """Look a short code up in the database and cache the result (hit or miss)"""
     async with db.execute('''
-        SELECT * FROM tracked_links WHERE short_code = ? AND is_active = 1
+        SELECT tl.id, tl.site_id, tl.user_id, tl.original_url,
+               tl.utm_source, tl.utm_medium, tl.utm_campaign
+        FROM tracked_links tl
+        JOIN sites s ON s.id = tl.site_id AND s.is_active = 1
+        WHERE tl.short_code = ? AND tl.is_active = 1
     ''', (short_code,)) as cursor:
         row = await cursor.fetchone()
-        if row:
-            return TrackedLink(
-                id=row['id'],
-                user_id=row['user_id'],
-                site_id=row['site_id'],
-                original_url=row['original_url'],
-                source=row['source'],
-                short_code=row['short_code'],
-                utm_source=row['utm_source'],
-                utm_medium=row['utm_medium'],
-                utm_campaign=row['utm_campaign'],
-                created_at=datetime.fromisoformat(row['created_at']),
-                is_active=bool(row['is_active'])
-            )
+    
+    if row is None:
+        link_cache.set(short_code, None, settings.LINK_CACHE_NEGATIVE_TTL)
         return None
+    
+    resolved = ResolvedLink(
+        redirect_url=add_utm_params(row['original_url'], row['utm_source'],
+                                    row['utm_medium'], row['utm_campaign']),
+        link_id=row['id'],
+        site_id=row['site_id'],
+        user_id=row['user_id'],
+        utm_source=row['utm_source'],
+        utm_medium=row['utm_medium'],
+        utm_campaign=row['utm_campaign'],
+    )
+    link_cache.set(short_code, resolved)
+    return resolved
 
 async def get_user_tracked_links(db: aiosqlite.Connection, user_id: str, site_id=None):
     """Get all tracked links for a user (optionally filtered by site)"""
-    from app.models import TrackedLink
-    
-    links = []
-    query = '''
-        SELECT * FROM tracked_links WHERE user_id = ? AND is_active = 1
+    query = f'''
+        SELECT {TRACKED_LINK_ROWS.select} FROM tracked_links WHERE user_id = ? AND is_active = 1
     '''
     params = [user_id]
     
@@ -292,98 +840,578 @@ async def get_user_tracked_links(db: aiosqlite.Connection, user_id: str, site_id
     
     query += ' ORDER BY created_at DESC'
     
+    # One fetchall is one round trip to the connection thread; async for
+    # would take one per arraysize rows
     async with db.execute(query, params) as cursor:
-        async for row in cursor:
-            links.append(TrackedLink(
-                id=row['id'],
-                user_id=row['user_id'],
-                site_id=row['site_id'],
-                original_url=row['original_url'],
-                source=row['source'],
-                short_code=row['short_code'],
-                utm_source=row['utm_source'],
-                utm_medium=row['utm_medium'],
-                utm_campaign=row['utm_campaign'],
-                created_at=datetime.fromisoformat(row['created_at']),
-                is_active=bool(row['is_active'])
-            ))
-    return links
+        return TRACKED_LINK_ROWS.all(await cursor.fetchall())
+
+async def get_tracked_links_page(db: aiosqlite.Connection, user_id: str, limit: int,
+                                 cursor: Optional[str] = None, site_id: Optional[str] = None) -> Page:
+    """One page of a user's tracked links, newest first, optionally for one site"""
+    where, params = 'user_id = ? AND is_active = 1', [user_id]
+    if site_id:
+        where += ' AND site_id = ?'
+        params.append(site_id)
+    return await _keyset_page(db, TRACKED_LINK_ROWS, 'tracked_links', where, params, limit, cursor)
 
 async def delete_tracked_link(db: aiosqlite.Connection, link_id: str, user_id: str) -> bool:
     """Soft delete a tracked link (set is_active = 0)"""
-    await db.execute('''
+    async with db.execute('''
         UPDATE tracked_links SET is_active = 0 WHERE id = ? AND user_id = ? AND is_active = 1
-    ''', (link_id, user_id))
+        RETURNING short_code, site_id
+    ''', (link_id, user_id)) as cursor:
+        rows = await cursor.fetchall()
     
-    if db.total_changes > 0:
+    if rows:
+        await bump_data_versions(db, [user_scope(user_id)] + [site_scope(row['site_id']) for row in rows])
         await db.commit()
+        for row in rows:
+            link_cache.invalidate(row['short_code'])
         return True
     return False
 
 # Event Tracking Operations
-async def create_event(db: aiosqlite.Connection, event_data: dict) -> str:
-    """Create a new event record"""
-    event_id = str(uuid.uuid4())
-    now = datetime.now(timezone.utc).isoformat()
+class EventRow(NamedTuple):
+    """One event as queued for writing, still keyed by UUIDs"""
+    tracked_link_id: Optional[str]
+    site_id: str
+    user_id: str
+    kind: str
+    ts: int  # epoch milliseconds, UTC
+    ip_hash: Optional[str]
+    ua_hash: Optional[str]
+    referer: Optional[str]
+    utm_source: Optional[str]
+    utm_medium: Optional[str]
+    utm_campaign: Optional[str]
+    country: Optional[str]
+    path: Optional[str]
+    session_id: Optional[str]
+    source: str
+
+# Events are partitioned by UTC day into tables named events_YYYYMMDD, so
+# range queries only open the days they cover and expiring a day is a DROP
+# TABLE rather than a DELETE of millions of rows. ts is epoch milliseconds;
+# *_key columns point at entity_keys instead of repeating 36-character UUIDs.
+DAY_MS = 86_400_000
+EVENT_PARTITION_GLOB = 'events_[0-9][0-9][0-9][0-9][0-9][0-9][0-9][0-9]'
+
+EVENT_COLUMNS = (
+    'ts, site_key, user_key, link_key, kind, source, ip_hash, ua_hash, '
+    'referer, utm_source, utm_medium, utm_campaign, country, path, session_id'
+)
+
+EVENT_INSERT_SQL = f'''
+    INSERT INTO {{table}} ({EVENT_COLUMNS})
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+def event_partition(ts: int) -> str:
+    """Name of the table holding events at ``ts`` (epoch ms)"""
+    return 'events_' + time.strftime('%Y%m%d', time.gmtime(ts // 1000))
+
+def partition_start(name: str) -> int:
+    """First epoch millisecond covered by a partition table"""
+    return calendar.timegm(time.strptime(name[len('events_'):], '%Y%m%d')) * 1000
+
+def event_partition_ddl(name: str) -> tuple[str, str]:
+    """CREATE statements for one day's partition"""
+    return (f'''
+        CREATE TABLE IF NOT EXISTS {name} (
+            id INTEGER PRIMARY KEY,
+            ts INTEGER NOT NULL,
+            site_key INTEGER NOT NULL,
+            user_key INTEGER NOT NULL,
+            link_key INTEGER,
+            kind TEXT NOT NULL CHECK (kind IN ('click', 'pageview')),
+            source TEXT,
+            ip_hash TEXT,
+            ua_hash TEXT,
+            referer TEXT,
+            utm_source TEXT,
+            utm_medium TEXT,
+            utm_campaign TEXT,
+            country TEXT,
+            path TEXT,
+            session_id TEXT,
+            FOREIGN KEY (site_key) REFERENCES entity_keys (id),
+            FOREIGN KEY (user_key) REFERENCES entity_keys (id),
+            FOREIGN KEY (link_key) REFERENCES entity_keys (id)
+        )
+    ''', f'CREATE INDEX IF NOT EXISTS idx_{name}_site_ts ON {name}(site_key, ts)')
+
+# Partitions this worker knows exist, so the write path issues CREATE TABLE
+# once per day rather than per batch
+known_partitions: set[str] = set()
+
+async def _create_partition(db: aiosqlite.Connection, name: str):
+    for sql in event_partition_ddl(name):
+        await db.execute(sql)
+    known_partitions.add(name)
+
+async def list_event_partitions(db: aiosqlite.Connection, start_ms: Optional[int] = None,
+                                end_ms: Optional[int] = None) -> list[str]:
+    """Partition tables, oldest first, limited to those overlapping [start_ms, end_ms)"""
+    async with db.execute('''
+        SELECT name FROM sqlite_master WHERE type = 'table' AND name GLOB ?
+    ''', (EVENT_PARTITION_GLOB,)) as cursor:
+        names = sorted(row['name'] for row in await cursor.fetchall())
+    return [
+        name for name in names
+        if (start_ms is None or partition_start(name) + DAY_MS > start_ms)
+        and (end_ms is None or partition_start(name) < end_ms)
+    ]
+
+def now_ms() -> int:
+    """Current UTC time in epoch milliseconds, the events.ts format"""
+    return time.time_ns() // 1_000_000
+
+def iso_to_ms(ts: str) -> int:
+    """Epoch milliseconds for an ISO-8601 timestamp (naive means UTC)"""
+    parsed = datetime.fromisoformat(ts)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp() * 1000)
+
+def event_row(event_data: dict, ts: int) -> EventRow:
+    """Build the row written for one event; ``ts`` is epoch milliseconds"""
+    return EventRow(event_data.get('tracked_link_id'), event_data['site_id'], event_data['user_id'],
+                    event_data['kind'], ts, event_data.get('ip_hash'), event_data.get('ua_hash'),
+                    event_data.get('referer'), event_data.get('utm_source'), event_data.get('utm_medium'),
+                    event_data.get('utm_campaign'), event_data.get('country'), event_data.get('path'),
+                    event_data.get('session_id'),
+                    classify_source(event_data.get('utm_source'), event_data.get('referer')))
+
+# UUID -> entity_keys.id. Mappings never change once committed, so entries
+# only leave the cache when it is full.
+entity_key_cache = TTLCache(settings.ENTITY_KEY_CACHE_SIZE, float('inf'))
+
+async def get_entity_keys(db: aiosqlite.Connection, uuids) -> dict[str, int]:
+    """Map UUIDs to their integer keys, allocating keys for new ones.
+
+    Newly allocated keys are committed straight away so they can be cached;
+    call this before writing anything else in the same transaction.
+    """
+    keys = {}
+    missing = []
+    for value in uuids:
+        found, key = entity_key_cache.lookup(value)
+        if found:
+            keys[value] = key
+        else:
+            missing.append(value)
+    if not missing:
+        return keys
     
-    await db.execute('''
-        INSERT INTO events (id, tracked_link_id, site_id, user_id, kind, ts, ip_hash, ua_hash,
-                          referer, utm_source, utm_medium, utm_campaign, country, path, session_id)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    ''', (event_id, event_data.get('tracked_link_id'), event_data['site_id'], event_data['user_id'],
-          event_data['kind'], now, event_data.get('ip_hash'), event_data.get('ua_hash'),
-          event_data.get('referer'), event_data.get('utm_source'), event_data.get('utm_medium'),
-          event_data.get('utm_campaign'), event_data.get('country'), event_data.get('path'),
-          event_data.get('session_id')))
+    await db.executemany('INSERT OR IGNORE INTO entity_keys (uuid) VALUES (?)',
+                         [(value,) for value in missing])
+    await db.commit()
+    placeholders = ','.join('?' * len(missing))
+    async with db.execute(f'''
+        SELECT id, uuid FROM entity_keys WHERE uuid IN ({placeholders})
+    ''', missing) as cursor:
+        async for row in cursor:
+            keys[row['uuid']] = row['id']
+            entity_key_cache.set(row['uuid'], row['id'])
+    return keys
+
+async def _insert_events(db: aiosqlite.Connection, rows: list[EventRow]):
+    """Resolve entity keys and insert rows into their day partitions (caller commits)"""
+    uuids = {row.site_id for row in rows} | {row.user_id for row in rows}
+    uuids.update(row.tracked_link_id for row in rows if row.tracked_link_id)
+    keys = await get_entity_keys(db, uuids)
+    
+    by_partition: dict[str, list] = {}
+    for row in rows:
+        by_partition.setdefault(event_partition(row.ts), []).append((
+            row.ts, keys[row.site_id], keys[row.user_id],
+            keys[row.tracked_link_id] if row.tracked_link_id else None,
+            row.kind, row.source, row.ip_hash, row.ua_hash, row.referer, row.utm_source,
+            row.utm_medium, row.utm_campaign, row.country, row.path, row.session_id))
+    for name, params in by_partition.items():
+        if name not in known_partitions:
+            await _create_partition(db, name)
+        try:
+            await db.executemany(EVENT_INSERT_SQL.format(table=name), params)
+        except sqlite3.OperationalError as e:
+            # Dropped by another worker since we last saw it
+            if 'no such table' not in str(e):
+                raise
+            await _create_partition(db, name)
+            await db.executemany(EVENT_INSERT_SQL.format(table=name), params)
+
+async def create_event(db: aiosqlite.Connection, event_data: dict) -> bool:
+    """Create a new event record
+
+    While the buffered event writer is running the event is queued and written
+    in its next batch, so callers never pay for a commit. Returns False if the
+    writer's queue is full. Without a running writer (scripts, one-off tools)
+    the event is inserted and committed on ``db`` directly.
+    """
+    from app.event_writer import event_writer
+    
+    if event_writer.running:
+        return event_writer.enqueue(event_data)
+    
+    await create_events(db, [event_row(event_data, now_ms())])
+    return True
+
+async def create_events(db: aiosqlite.Connection, rows: list[EventRow]) -> int:
+    """Insert a batch of prepared event rows and their rollups in a single transaction"""
+    if not rows:
+        return 0
     
+    await _insert_events(db, rows)
+    await update_hourly_rollup(db, rows)
+    await update_visitor_sketches(db, rows)
+    await bump_data_versions(db, {site_scope(row.site_id) for row in rows})
     await db.commit()
-    return event_id
+    return len(rows)
+
+HOURLY_ROLLUP_SQL = '''
+    INSERT INTO events_hourly (site_id, kind, hour, tracked_link_id, source, count)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT (site_id, kind, hour, tracked_link_id, source)
+    DO UPDATE SET count = count + excluded.count
+'''
+
+def hourly_rollup_counts(rows: list[EventRow]) -> dict[tuple, int]:
+    """Count event rows per (site_id, kind, hour, tracked_link_id, source)"""
+    counts: dict[tuple, int] = {}
+    for row in rows:
+        key = (row.site_id, row.kind, row.ts // 3_600_000 * 3600, row.tracked_link_id or '', row.source)
+        counts[key] = counts.get(key, 0) + 1
+    return counts
+
+async def update_hourly_rollup(db: aiosqlite.Connection, rows: list[EventRow]) -> None:
+    """Add event rows to events_hourly (caller commits)"""
+    counts = hourly_rollup_counts(rows)
+    await db.executemany(HOURLY_ROLLUP_SQL, [key + (count,) for key, count in counts.items()])
+
+async def rebuild_hourly_rollup(db: aiosqlite.Connection, batch_size: int = 10000,
+                                since_ms: Optional[int] = None) -> int:
+    """Recompute events_hourly from the raw events; returns events counted
+
+    With ``since_ms`` only the days from the one containing it onwards are
+    recomputed, reading just those partitions. Run migrate_legacy_events
+    and partition_events first: rows not yet in a partition are not counted.
+    """
+    if since_ms is None:
+        await db.execute('DELETE FROM events_hourly')
+    else:
+        since_ms = since_ms // DAY_MS * DAY_MS
+        await db.execute('DELETE FROM events_hourly WHERE hour >= ?', (since_ms // 1000,))
+    total = 0
+    for name in await list_event_partitions(db, since_ms):
+        last_id = 0
+        while True:
+            async with db.execute(f'''
+                SELECT MAX(id) AS last_id, COUNT(*) AS n
+                FROM (SELECT id FROM {name} WHERE id > ? ORDER BY id LIMIT ?)
+            ''', (last_id, batch_size)) as cursor:
+                batch = await cursor.fetchone()
+            if not batch['n']:
+                break
+            await db.execute(f'''
+                INSERT INTO events_hourly (site_id, kind, hour, tracked_link_id, source, count)
+                SELECT s.uuid, e.kind, e.ts / 3600000 * 3600, COALESCE(l.uuid, ''),
+                       COALESCE(e.source, classify_source(e.utm_source, e.referer)), COUNT(*)
+                FROM {name} e
+                JOIN entity_keys s ON s.id = e.site_key
+                LEFT JOIN entity_keys l ON l.id = e.link_key
+                WHERE e.id > ? AND e.id <= ?
+                GROUP BY 1, 2, 3, 4, 5
+                ON CONFLICT (site_id, kind, hour, tracked_link_id, source)
+                DO UPDATE SET count = count + excluded.count
+            ''', (last_id, batch['last_id']))
+            last_id = batch['last_id']
+            total += batch['n']
+    await db.commit()
+    return total
+
+VISITORS_HOURLY_SQL = '''
+    INSERT INTO visitors_hourly (site_id, hour, sketch) VALUES (?, ?, ?)
+    ON CONFLICT (site_id, hour) DO UPDATE SET sketch = excluded.sketch
+'''
+
+def visitor_sketches(pageviews) -> dict[tuple[str, int], HyperLogLog]:
+    """Sketch the visitors in (site_id, ts, ip_hash, ua_hash) pageviews per (site_id, hour).
+
+    A visitor is the hashed IP and user agent together; pageviews with
+    neither are left out.
+    """
+    sketches: dict[tuple[str, int], HyperLogLog] = {}
+    for site_id, ts, ip_hash, ua_hash in pageviews:
+        if not ip_hash and not ua_hash:
+            continue
+        key = (site_id, ts // 3_600_000 * 3600)
+        sketch = sketches.get(key)
+        if sketch is None:
+            sketch = sketches[key] = HyperLogLog(settings.HLL_PRECISION)
+        sketch.add(f"{ip_hash or ''}|{ua_hash or ''}")
+    return sketches
+
+async def _merge_visitor_sketches(db: aiosqlite.Connection, sketches: dict[tuple[str, int], HyperLogLog]):
+    """Fold sketches into the stored ones for the same site and hour (caller commits)"""
+    for (site_id, hour), sketch in sketches.items():
+        async with db.execute('''
+            SELECT sketch FROM visitors_hourly WHERE site_id = ? AND hour = ?
+        ''', (site_id, hour)) as cursor:
+            stored = await cursor.fetchone()
+        if stored is not None:
+            sketch.merge_bytes(stored['sketch'])
+    await db.executemany(VISITORS_HOURLY_SQL, [(site_id, hour, sketch.to_bytes())
+                                               for (site_id, hour), sketch in sketches.items()])
+
+async def update_visitor_sketches(db: aiosqlite.Connection, rows: list[EventRow]) -> None:
+    """Add the visitors behind pageview rows to visitors_hourly (caller commits)
+
+    Run inside the batch's write transaction, so the read-merge-write of
+    each sketch can't interleave with another writer's.
+    """
+    await _merge_visitor_sketches(db, visitor_sketches(
+        (row.site_id, row.ts, row.ip_hash, row.ua_hash) for row in rows if row.kind == 'pageview'))
+
+async def rebuild_visitor_sketches(db: aiosqlite.Connection, batch_size: int = 10000,
+                                   since_ms: Optional[int] = None) -> int:
+    """Recompute visitors_hourly from the raw events; returns pageviews read
+
+    ``since_ms`` works as in rebuild_hourly_rollup. Hours whose partitions
+    retention has dropped keep their sketches unless the whole table is
+    rebuilt.
+    """
+    if since_ms is None:
+        await db.execute('DELETE FROM visitors_hourly')
+    else:
+        since_ms = since_ms // DAY_MS * DAY_MS
+        await db.execute('DELETE FROM visitors_hourly WHERE hour >= ?', (since_ms // 1000,))
+    total = 0
+    for name in await list_event_partitions(db, since_ms):
+        last_id = 0
+        while True:
+            async with db.execute(f'''
+                SELECT e.id, s.uuid, e.ts, e.ip_hash, e.ua_hash
+                FROM {name} e
+                JOIN entity_keys s ON s.id = e.site_key
+                WHERE e.id > ? AND e.kind = 'pageview'
+                ORDER BY e.id
+                LIMIT ?
+            ''', (last_id, batch_size)) as cursor:
+                batch = await cursor.fetchall()
+            if not batch:
+                break
+            await _merge_visitor_sketches(db, visitor_sketches(tuple(row)[1:] for row in batch))
+            last_id = batch[-1]['id']
+            total += len(batch)
+    await db.commit()
+    return total
+
+async def backfill_event_sources(db: aiosqlite.Connection, batch_size: int = 5000) -> int:
+    """Classify events stored without a source; commits per batch to keep locks short"""
+    total = 0
+    for name in await list_event_partitions(db):
+        last_id = 0
+        while True:
+            async with db.execute(f'''
+                SELECT id, utm_source, referer, source FROM {name}
+                WHERE id > ? ORDER BY id LIMIT ?
+            ''', (last_id, batch_size)) as cursor:
+                rows = await cursor.fetchall()
+            if not rows:
+                break
+            last_id = rows[-1]['id']
+            missing = [row for row in rows if row['source'] is None]
+            if missing:
+                await db.executemany(f'UPDATE {name} SET source = ? WHERE id = ?', [
+                    (classify_source(row['utm_source'], row['referer']), row['id']) for row in missing
+                ])
+                await db.commit()
+                total += len(missing)
+    return total
+
+async def migrate_legacy_events(db: aiosqlite.Connection, batch_size: int = 5000) -> int:
+    """Copy events_legacy into the compact events table, then drop it.
+
+    Works through the old table in rowid batches, deleting each batch in the
+    transaction that copies it, so it can run while the app keeps writing and
+    resume where it stopped if interrupted. Rollups already include these
+    events and are left alone. Returns the number of events moved.
+    """
+    if not await _table_exists(db, 'events_legacy'):
+        return 0
+    
+    total = 0
+    while True:
+        async with db.execute('''
+            SELECT rowid, tracked_link_id, site_id, user_id, kind, ts, ip_hash, ua_hash,
+                   referer, utm_source, utm_medium, utm_campaign, country, path, session_id,
+                   COALESCE(source, classify_source(utm_source, referer)) AS source
+            FROM events_legacy ORDER BY rowid LIMIT ?
+        ''', (batch_size,)) as cursor:
+            rows = await cursor.fetchall()
+        if not rows:
+            break
+        await _insert_events(db, [
+            EventRow(row['tracked_link_id'], row['site_id'], row['user_id'], row['kind'],
+                     iso_to_ms(row['ts']), row['ip_hash'], row['ua_hash'], row['referer'],
+                     row['utm_source'], row['utm_medium'], row['utm_campaign'], row['country'],
+                     row['path'], row['session_id'], row['source'])
+            for row in rows
+        ])
+        await db.execute('DELETE FROM events_legacy WHERE rowid <= ?', (rows[-1]['rowid'],))
+        await db.commit()
+        total += len(rows)
+    
+    await db.execute('DROP TABLE events_legacy')
+    await db.commit()
+    return total
+
+async def partition_events(db: aiosqlite.Connection, batch_size: int = 5000) -> int:
+    """Move rows from a pre-partitioning events table into day partitions, then drop it.
+
+    Same shape as migrate_legacy_events: rowid batches, each copied and
+    deleted in one transaction, so it can run while the app is serving and
+    resume if interrupted. Rollups already include these events. Returns
+    the number of events moved.
+    """
+    if not await _table_exists(db, 'events'):
+        return 0
+    
+    total = 0
+    while True:
+        async with db.execute('''
+            SELECT id, ts FROM events ORDER BY id LIMIT ?
+        ''', (batch_size,)) as cursor:
+            rows = await cursor.fetchall()
+        if not rows:
+            break
+        first_id, last_id = rows[0]['id'], rows[-1]['id']
+        for name in sorted({event_partition(row['ts']) for row in rows}):
+            if name not in known_partitions:
+                await _create_partition(db, name)
+            start = partition_start(name)
+            await db.execute(f'''
+                INSERT INTO {name} ({EVENT_COLUMNS})
+                SELECT {EVENT_COLUMNS} FROM events
+                WHERE id >= ? AND id <= ? AND ts >= ? AND ts < ?
+            ''', (first_id, last_id, start, start + DAY_MS))
+        await db.execute('DELETE FROM events WHERE id <= ?', (last_id,))
+        await db.commit()
+        total += len(rows)
+    
+    await db.execute('DROP TABLE events')
+    await db.commit()
+    return total
+
+class DroppedPartition(NamedTuple):
+    name: str
+    rows: int
+    lock_ms: float  # time the write transaction was held
+
+async def drop_event_partitions(db: aiosqlite.Connection, before_ms: int) -> list[DroppedPartition]:
+    """Drop every partition that ends at or before ``before_ms``, oldest first
+
+    Each day goes with a single DROP TABLE, however many rows it holds, and
+    is committed on its own so the write lock is released between days.
+    """
+    dropped = []
+    for name in await list_event_partitions(db, end_ms=before_ms):
+        if partition_start(name) + DAY_MS > before_ms:
+            continue
+        # Rows only leave a partition with the partition, so ids are dense
+        async with db.execute(f'SELECT MAX(id) AS n FROM {name}') as cursor:
+            rows = (await cursor.fetchone())['n'] or 0
+        started = time.perf_counter()
+        await db.execute(f'DROP TABLE {name}')
+        await db.commit()
+        known_partitions.discard(name)
+        dropped.append(DroppedPartition(name, rows, (time.perf_counter() - started) * 1000))
+    return dropped
+
+async def count_site_events(db: aiosqlite.Connection, site_id: str, start_ms: int, end_ms: int,
+                            kind: str = 'pageview') -> int:
+    """Raw event count for a site in [start_ms, end_ms), reading only the partitions in range"""
+    async with db.execute('SELECT id FROM entity_keys WHERE uuid = ?', (site_id,)) as cursor:
+        row = await cursor.fetchone()
+    if row is None:
+        return 0
+    total = 0
+    for name in await list_event_partitions(db, start_ms, end_ms):
+        async with db.execute(f'''
+            SELECT COUNT(*) AS n FROM {name}
+            WHERE site_key = ? AND ts >= ? AND ts < ? AND kind = ?
+        ''', (row['id'], start_ms, end_ms, kind)) as cursor:
+            total += (await cursor.fetchone())['n']
+    return total
+
+def rollup_window_start() -> int:
+    """First hourly bucket of the last 24h: the current hour and the 23 before it"""
+    now = int(datetime.now(timezone.utc).timestamp())
+    return now // 3600 * 3600 - 23 * 3600
 
 async def get_24h_traffic_by_source(db: aiosqlite.Connection, site_id: str):
     """Get 24-hour traffic data by source for a site"""
     async with db.execute('''
-        SELECT 
-            strftime('%H', ts) as hour,
-            COALESCE(utm_source, 
-                CASE 
-                    WHEN referer LIKE '%twitter.com%' OR referer LIKE '%t.co%' THEN 'x'
-                    WHEN referer LIKE '%linkedin.com%' THEN 'linkedin'
-                    WHEN referer LIKE '%reddit.com%' THEN 'reddit'
-                    ELSE 'other'
-                END
-            ) as source,
-            COUNT(*) as visits
-        FROM events 
-        WHERE site_id = ? 
-            AND ts >= datetime('now', '-24 hours')
-            AND kind = 'pageview'
+        SELECT hour, source, SUM(count) as visits
+        FROM events_hourly
+        WHERE site_id = ? AND kind = 'pageview' AND hour >= ?
         GROUP BY hour, source
-        ORDER BY hour, source
-    ''', (site_id,)) as cursor:
+    ''', (site_id, rollup_window_start())) as cursor:
         results = []
         async for row in cursor:
             results.append({
-                'hour': row['hour'],
+                'hour': f"{row['hour'] // 3600 % 24:02d}",
                 'source': row['source'],
                 'visits': row['visits']
             })
+        results.sort(key=lambda r: (r['hour'], r['source']))
         return results
 
+async def get_unique_visitors(db: aiosqlite.Connection, site_id: str, start_ms: int, end_ms: int) -> int:
+    """Estimated distinct visitors to a site over the hours starting in [start_ms, end_ms)
+
+    Merges one stored sketch per hour, so memory stays at one sketch
+    however long the range; see app/hll.py for the error bound.
+    """
+    async with db.execute('''
+        SELECT sketch FROM visitors_hourly WHERE site_id = ? AND hour >= ? AND hour < ?
+    ''', (site_id, (start_ms + 999) // 1000, (end_ms + 999) // 1000)) as cursor:
+        merged = HyperLogLog(settings.HLL_PRECISION)
+        async for row in cursor:
+            merged.merge_bytes(row['sketch'])
+    return merged.count()
+
+async def get_24h_unique_visitors(db: aiosqlite.Connection, site_id: str):
+    """Estimated distinct visitors over the last 24h, in total and per hour"""
+    async with db.execute('''
+        SELECT hour, sketch FROM visitors_hourly WHERE site_id = ? AND hour >= ? ORDER BY hour
+    ''', (site_id, rollup_window_start())) as cursor:
+        rows = await cursor.fetchall()
+    return {
+        'total': merge_all((row['sketch'] for row in rows), settings.HLL_PRECISION).count(),
+        'by_hour': [{
+            'hour': f"{row['hour'] // 3600 % 24:02d}",
+            'visitors': HyperLogLog.from_bytes(row['sketch']).count()
+        } for row in rows],
+    }
+
 async def get_24h_clicks_by_link(db: aiosqlite.Connection, site_id: str):
     """Get 24-hour click data by tracked link for a site"""
     async with db.execute('''
         SELECT 
             tl.original_url,
             tl.source,
-            COUNT(e.id) as clicks_24h
+            COALESCE(h.clicks, 0) as clicks_24h
         FROM tracked_links tl
-        LEFT JOIN events e ON tl.id = e.tracked_link_id 
-            AND e.kind = 'click' 
-            AND e.ts >= datetime('now', '-24 hours')
+        LEFT JOIN (
+            SELECT tracked_link_id, SUM(count) as clicks
+            FROM events_hourly
+            WHERE site_id = ? AND kind = 'click' AND hour >= ?
+            GROUP BY tracked_link_id
+        ) h ON h.tracked_link_id = tl.id
         WHERE tl.site_id = ? AND tl.is_active = 1
-        GROUP BY tl.id, tl.original_url, tl.source
         ORDER BY clicks_24h DESC
-    ''', (site_id,)) as cursor:
+    ''', (site_id, rollup_window_start(), site_id)) as cursor:
         results = []
         async for row in cursor:
             results.append({
@@ -392,13 +1420,3 @@ async def get_24h_clicks_by_link(db: aiosqlite.Connection, site_id: str):
                 'clicks_24h': row['clicks_24h']
             })
         return results
-
-
-
-
-
-
-
-
-
-
@@ -0,0 +1,36 @@
+import hashlib
+from typing import Optional
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+# Browsers keep the body but must revalidate it on every request
+REVALIDATE = "private, no-cache"
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """True if an If-None-Match header value matches ``etag`` (weak comparison)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+
+
+def not_modified(request: Request, etag: str, cache_control: str = REVALIDATE) -> Optional[Response]:
+    """A 304 response if the client already has ``etag``, else None"""
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": cache_control})
+    return None
+
+
+def tagged_json(content, etag: str, cache_control: str = REVALIDATE) -> JSONResponse:
+    """JSON response carrying ``etag``"""
+    return JSONResponse(jsonable_encoder(content), headers={"ETag": etag, "Cache-Control": cache_control})
+
+
+def page_etag(kind: str, owner: str, version, *params) -> str:
+    """ETag for one page of a listing: the owner's data version plus the page's query"""
+    query = hashlib.sha1(repr(params).encode()).hexdigest()[:12]
+    return f'"{kind}-{owner}-{version}-{query}"'
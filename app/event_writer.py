@@ -0,0 +1,294 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import time
+from typing import Optional
+
+import aiosqlite
+
+from app.db import EventRow, connect, create_events, event_row, now_ms
+from app.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Queued after the last real event by stop() so the flush loop drains and exits
+_STOP = object()
+
+
+class EventWriter:
+    """Buffered event writer.
+
+    Events are queued in memory and written by a background task with
+    ``executemany`` in a single transaction, either when ``batch_size`` events
+    are waiting or ``flush_interval_ms`` after the first event of a batch
+    arrived, whichever comes first. The queue is bounded: when it is full new
+    events are dropped and counted instead of blocking the request.
+
+    A batch that fails with ``sqlite3.OperationalError`` (database busy or
+    locked) is retried up to ``EVENT_FLUSH_RETRIES`` times with exponential
+    backoff. If it still fails, or fails with any other error, the whole
+    batch is logged, counted in ``failed`` and discarded: events are
+    at-most-once, and anything still queued when the process is killed
+    without ``stop()`` is lost as well.
+    """
+
+    def __init__(
+        self,
+        db_path: Optional[str] = None,
+        batch_size: Optional[int] = None,
+        flush_interval_ms: Optional[int] = None,
+        max_queue_size: Optional[int] = None,
+        max_retries: Optional[int] = None,
+    ):
+        self.db_path = db_path
+        self.batch_size = batch_size or settings.EVENT_FLUSH_BATCH_SIZE
+        self.flush_interval = (flush_interval_ms or settings.EVENT_FLUSH_INTERVAL_MS) / 1000
+        self.max_queue_size = max_queue_size or settings.EVENT_QUEUE_MAX_SIZE
+        self.max_retries = settings.EVENT_FLUSH_RETRIES if max_retries is None else max_retries
+
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+        self._db: Optional[aiosqlite.Connection] = None
+        self._closing = False
+
+        # Counters
+        self.enqueued = 0
+        self.dropped = 0
+        self.flushed = 0
+        self.failed = 0
+        self.retries = 0
+        self.flush_count = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self.total_flush_ms = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def queue_depth(self) -> int:
+        """Number of events waiting to be written"""
+        return self._queue.qsize()
+
+    def enqueue(self, event_data: dict) -> bool:
+        """Queue an event for writing.
+
+        Returns False if the queue is full or the writer is shutting down.
+        """
+        if self._closing or self._queue.qsize() >= self.max_queue_size:
+            self.dropped += 1
+            return False
+
+        self._queue.put_nowait(event_row(event_data, now_ms()))
+        self.enqueued += 1
+        return True
+
+    def enqueue_rows(self, rows: list[EventRow]) -> int:
+        """Queue rows built elsewhere (see EventWriterService); returns how many were accepted"""
+        if self._closing:
+            self.dropped += len(rows)
+            return 0
+
+        room = max(0, self.max_queue_size - self._queue.qsize())
+        for row in rows[:room]:
+            self._queue.put_nowait(row)
+        accepted = min(room, len(rows))
+        self.enqueued += accepted
+        self.dropped += len(rows) - accepted
+        return accepted
+
+    def enqueue_many(self, events: list[dict]) -> int:
+        """Queue several events at once; returns how many were accepted"""
+        if self._closing:
+            self.dropped += len(events)
+            return 0
+
+        room = max(0, self.max_queue_size - self._queue.qsize())
+        accepted = events[:room]
+        now = now_ms()
+        for event_data in accepted:
+            self._queue.put_nowait(event_row(event_data, now))
+        self.enqueued += len(accepted)
+        self.dropped += len(events) - len(accepted)
+        return len(accepted)
+
+    async def start(self):
+        """Open the writer connection and start the flush loop"""
+        if self.running:
+            return
+        self._closing = False
+        await self._open()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Flush everything still queued and close the writer connection"""
+        if not self.running:
+            return
+        self._closing = True
+        self._queue.put_nowait(_STOP)
+        await self._task
+        self._task = None
+        await self._close()
+
+    async def _open(self):
+        self._db = await connect(self.db_path)
+
+    async def _close(self):
+        if self._db is not None:
+            await self._db.close()
+            self._db = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await self._queue.get()
+            if item is _STOP:
+                return
+
+            batch = [item]
+            stopping = False
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self._queue.get(), remaining)
+                    except asyncio.TimeoutError:
+                        break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            await self._flush(batch)
+            if stopping:
+                return
+
+    async def _flush(self, batch: list[EventRow]):
+        started = time.perf_counter()
+        attempt = 0
+        while True:
+            try:
+                await self._write(batch)
+                break
+            except Exception as e:
+                await self._rollback()
+                if isinstance(e, sqlite3.OperationalError) and attempt < self.max_retries:
+                    attempt += 1
+                    self.retries += 1
+                    await asyncio.sleep(0.05 * 2 ** (attempt - 1))
+                    continue
+                logger.exception("Failed to write %d events", len(batch))
+                self.failed += len(batch)
+                return
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self.flushed += len(batch)
+        self.flush_count += 1
+        self.last_flush_ms = elapsed_ms
+        self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+        self.total_flush_ms += elapsed_ms
+
+    async def _write(self, batch: list[EventRow]):
+        await create_events(self._db, batch)
+
+    async def _rollback(self):
+        if self._db is None:
+            return
+        try:
+            await self._db.rollback()
+        except Exception:
+            pass
+
+    def stats(self) -> dict:
+        """Queue depth and flush latency counters"""
+        return {
+            "queue_depth": self.queue_depth(),
+            "max_queue_size": self.max_queue_size,
+            "enqueued": self.enqueued,
+            "dropped": self.dropped,
+            "flushed": self.flushed,
+            "failed": self.failed,
+            "retries": self.retries,
+            "flush_count": self.flush_count,
+            "last_flush_ms": round(self.last_flush_ms, 3),
+            "max_flush_ms": round(self.max_flush_ms, 3),
+            "avg_flush_ms": round(self.total_flush_ms / self.flush_count, 3) if self.flush_count else 0.0,
+        }
+
+
+def encode_batch(rows: list[EventRow]) -> bytes:
+    """One batch of rows as a newline-terminated JSON frame"""
+    return json.dumps(rows, separators=(',', ':')).encode() + b'\n'
+
+
+def decode_batch(frame: bytes) -> list[EventRow]:
+    """Rows from a frame written by encode_batch; ValueError if malformed"""
+    try:
+        return [EventRow(*row) for row in json.loads(frame)]
+    except TypeError as e:
+        raise ValueError(f"Malformed event frame: {e}") from None
+
+
+class ForwardingEventWriter(EventWriter):
+    """EventWriter that hands its batches to the single writer process.
+
+    Batching, queue bounds and counters are the same as EventWriter, but a
+    flush writes the batch to ``socket_path`` (served by EventWriterService)
+    instead of to SQLite, so the worker never takes the database write lock.
+    If the writer process is unreachable the batch is written through a
+    local connection instead and counted in ``fallbacks``; the next batch
+    tries the socket again. A batch whose frame was fully sent just before
+    the socket failed may be written twice.
+    """
+
+    def __init__(self, socket_path: Optional[str] = None, db_path: Optional[str] = None, **kwargs):
+        super().__init__(db_path, **kwargs)
+        self.socket_path = socket_path or settings.EVENT_WRITER_SOCKET
+        self._stream: Optional[asyncio.StreamWriter] = None
+        self.forwarded = 0
+        self.fallbacks = 0
+
+    async def _open(self):
+        # Connected on first flush, so workers can start before the writer
+        pass
+
+    async def _close(self):
+        await self._disconnect()
+        await super()._close()
+
+    async def _disconnect(self):
+        stream, self._stream = self._stream, None
+        if stream is not None:
+            stream.close()
+            try:
+                await stream.wait_closed()
+            except OSError:
+                pass
+
+    async def _write(self, batch: list[EventRow]):
+        try:
+            if self._stream is None:
+                _, self._stream = await asyncio.open_unix_connection(self.socket_path)
+            self._stream.write(encode_batch(batch))
+            await self._stream.drain()
+            self.forwarded += len(batch)
+            return
+        except OSError:
+            await self._disconnect()
+        if self._db is None:
+            await super()._open()
+        await super()._write(batch)
+        self.fallbacks += len(batch)
+
+    def stats(self) -> dict:
+        return {**super().stats(), "socket": self.socket_path,
+                "forwarded": self.forwarded, "fallbacks": self.fallbacks}
+
+
+event_writer = ForwardingEventWriter() if settings.EVENT_WRITER_SOCKET else EventWriter()
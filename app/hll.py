@@ -0,0 +1,166 @@
+"""HyperLogLog sketches for unique-visitor estimates.
+
+A sketch with precision p keeps m = 2**p one-byte registers and estimates
+how many distinct values were added to it. The relative standard error is
+1.04 / sqrt(m): 1.6% at the default p = 12, so about 95% of estimates land
+within 3.3% of the true count. Small counts (below 2.5 m) use linear
+counting and are close to exact. Memory is m bytes however many values are
+added, and sketches merge losslessly: the merge of the sketches for a set
+of hours is exactly the sketch of all their visitors together, so visitors
+seen in several hours are counted once.
+
+Stored sketches are sparse (index/rank pairs) while few registers are set,
+which is most site-hours, and dense (the raw registers) after that.
+"""
+
+import hashlib
+import math
+import re
+import struct
+from typing import Iterable, Optional
+
+DENSE = 1
+SPARSE = 2
+
+MIN_PRECISION = 4
+MAX_PRECISION = 16
+
+# 2**-rank for every possible register value
+_POWERS = [2.0 ** -rank for rank in range(65)]
+
+# Non-zero registers, found by the regex engine rather than a Python loop
+_SET_REGISTER = re.compile(rb'[^\x00]')
+
+
+def hash64(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), 'big')
+
+
+class HyperLogLog:
+    """Mergeable distinct-count sketch; see the module docstring for error bounds"""
+
+    __slots__ = ('p', 'm', 'registers')
+
+    def __init__(self, p: int = 12, registers: Optional[bytearray] = None):
+        if not MIN_PRECISION <= p <= MAX_PRECISION:
+            raise ValueError(f"precision must be between {MIN_PRECISION} and {MAX_PRECISION}")
+        self.p = p
+        self.m = 1 << p
+        self.registers = registers if registers is not None else bytearray(self.m)
+
+    def add(self, value: str):
+        self.add_hash(hash64(value))
+
+    def add_hash(self, h: int):
+        """Add a uniformly distributed 64-bit hash"""
+        width = 64 - self.p
+        index = h >> width
+        rank = width - (h & ((1 << width) - 1)).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def update(self, values: Iterable[str]):
+        for value in values:
+            self.add(value)
+
+    def merge(self, other: 'HyperLogLog'):
+        """Fold ``other`` into this sketch (register-wise max).
+
+        Sketches of different precision merge at the lower of the two.
+        """
+        if other.p > self.p:
+            other = other.reduce(self.p)
+        elif other.p < self.p:
+            reduced = self.reduce(other.p)
+            self.p, self.m, self.registers = reduced.p, reduced.m, reduced.registers
+        self.registers = _register_max(self.registers, other.registers)
+
+    def merge_bytes(self, blob: bytes):
+        """merge(from_bytes(blob)), touching only the set registers of a sparse blob"""
+        if blob[0] != SPARSE or blob[1] != self.p:
+            self.merge(HyperLogLog.from_bytes(blob))
+            return
+        registers = self.registers
+        for index, rank in struct.iter_unpack('>HB', blob[2:]):
+            if rank > registers[index]:
+                registers[index] = rank
+
+    def reduce(self, p: int) -> 'HyperLogLog':
+        """The same sketch at a lower precision, as if built with ``p``"""
+        shift = self.p - p
+        reduced = HyperLogLog(p)
+        for index, rank in enumerate(self.registers):
+            if not rank:
+                continue
+            # The index bits dropped become the leading bits of the rest
+            dropped = index & ((1 << shift) - 1)
+            new_rank = shift - dropped.bit_length() + 1 if dropped else shift + rank
+            if new_rank > reduced.registers[index >> shift]:
+                reduced.registers[index >> shift] = new_rank
+        return reduced
+
+    def count(self) -> int:
+        m = self.m
+        harmonic = sum(map(_POWERS.__getitem__, self.registers))
+        estimate = _alpha(m) * m * m / harmonic
+        if estimate <= 2.5 * m:
+            zeros = self.registers.count(0)
+            if zeros:
+                estimate = m * math.log(m / zeros)
+        return round(estimate)
+
+    def to_bytes(self) -> bytes:
+        """Compact encoding: sparse pairs while that is smaller, else the registers"""
+        registers = self.registers
+        if (self.m - registers.count(0)) * 3 < self.m:
+            return struct.pack('BB', SPARSE, self.p) + b''.join(
+                struct.pack('>HB', match.start(), registers[match.start()])
+                for match in _SET_REGISTER.finditer(registers))
+        return struct.pack('BB', DENSE, self.p) + bytes(registers)
+
+    @classmethod
+    def from_bytes(cls, blob: bytes) -> 'HyperLogLog':
+        kind, p = blob[0], blob[1]
+        sketch = cls(p)
+        if kind == DENSE:
+            if len(blob) != 2 + sketch.m:
+                raise ValueError("truncated HyperLogLog sketch")
+            sketch.registers[:] = blob[2:]
+        elif kind == SPARSE:
+            for index, rank in struct.iter_unpack('>HB', blob[2:]):
+                sketch.registers[index] = rank
+        else:
+            raise ValueError(f"unknown HyperLogLog encoding {kind}")
+        return sketch
+
+
+def _register_max(a: bytearray, b: bytearray) -> bytearray:
+    """Register-wise max of two equal-length register arrays.
+
+    Registers are below 128, so both arrays are read as big integers and
+    compared in every byte lane at once: setting each lane's top bit in a
+    before subtracting b leaves that bit set exactly where a >= b.
+    """
+    n = len(a)
+    x, y = int.from_bytes(a, 'big'), int.from_bytes(b, 'big')
+    top = int.from_bytes(b'\x80' * n, 'big')
+    a_wins = ((((x | top) - y) & top) >> 7) * 0xFF
+    return bytearray(((x & a_wins) | (y & ~a_wins)).to_bytes(n, 'big'))
+
+
+def _alpha(m: int) -> float:
+    if m == 16:
+        return 0.673
+    if m == 32:
+        return 0.697
+    if m == 64:
+        return 0.709
+    return 0.7213 / (1 + 1.079 / m)
+
+
+def merge_all(blobs: Iterable[bytes], p: int) -> HyperLogLog:
+    """Merge stored sketches into one, holding a single sketch in memory"""
+    merged = HyperLogLog(p)
+    for blob in blobs:
+        merged.merge_bytes(blob)
+    return merged
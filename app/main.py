@@ -1,15 +1,21 @@
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, JSONResponse
 from datetime import datetime
 import uvicorn
 
 from app.routes import home, dashboard
 from app import auth
-from app.db import init_db
-from app.routes import sites, links
+from app.db import init_db, close_pools, db_pool, read_pool, link_cache, site_owner_cache, user_cache, PoolTimeout
+from app.event_writer import event_writer
+from app.passwords import PasswordBusy, password_executor
+from app.retention import retention_job
+from app.sessions import session_store
+from app.short_codes import short_code_allocator
+from app.static_assets import static_assets
+from app.templates import precompile_templates
+from app.routes import sites, links, redirect, ingest
 
 app = FastAPI(
     title="EngageMeter.co - Super-Simple Analytics for Indie Hackers",
@@ -26,8 +32,8 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Mount static files
-app.mount("/static", StaticFiles(directory="app/static"), name="static")
+# Static files, precompressed and fingerprinted (see app/static_assets.py)
+app.mount("/static", static_assets, name="static")
 
 # Include routers
 app.include_router(home.router)
@@ -35,6 +41,20 @@ app.include_router(auth.router)
 app.include_router(dashboard.router)
 app.include_router(sites.router)
 app.include_router(links.router)
+app.include_router(ingest.router)
+
+
+# Pool exhaustion is load shedding, not a server bug
+@app.exception_handler(PoolTimeout)
+async def pool_timeout_handler(request: Request, exc: PoolTimeout):
+    return JSONResponse(status_code=503, content={"detail": "Server busy, please retry"},
+                        headers={"Retry-After": "1"})
+
+# Too many logins already waiting for bcrypt on this worker
+@app.exception_handler(PasswordBusy)
+async def password_busy_handler(request: Request, exc: PasswordBusy):
+    return JSONResponse(status_code=503, content={"detail": "Too many sign-in attempts, please retry"},
+                        headers={"Retry-After": "1"})
 
 
 # Health check endpoint for production monitoring
@@ -42,10 +62,43 @@ app.include_router(links.router)
 async def health_check():
     return {"status": "healthy", "timestamp": datetime.utcnow()}
 
+# Internal counters for capacity monitoring
+@app.get("/metrics")
+async def metrics():
+    return {
+        "event_writer": event_writer.stats(),
+        "db_pool": db_pool.stats(),
+        "read_pool": read_pool.stats(),
+        "link_cache": link_cache.stats(),
+        "short_codes": short_code_allocator.stats(),
+        "site_owner_cache": site_owner_cache.stats(),
+        "session_cache": session_store.cache.stats(),
+        "user_cache": user_cache.stats(),
+        "passwords": password_executor.stats(),
+        "retention": retention_job.stats(),
+    }
+
+# Catch-all /{short_code} redirect; must stay after every other top-level route
+app.include_router(redirect.router)
+
 @app.on_event("startup")
 async def startup_event():
     # Initialize database and ensure app is ready
     await init_db()
+    await event_writer.start()
+    # Compile (or load from the bytecode cache) before the first request
+    precompile_templates()
+    static_assets.build()
+    retention_job.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    # Flush buffered events before the worker exits
+    await retention_job.stop()
+    await event_writer.stop()
+    await close_pools()
+    session_store.close()
+    password_executor.shutdown()
 
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
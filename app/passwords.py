@@ -0,0 +1,87 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+from app.settings import settings
+
+
+class PasswordBusy(Exception):
+    """Raised when the password queue is full; the request should be retried later"""
+
+
+class PasswordExecutor:
+    """Runs bcrypt hashing and verification on a small dedicated thread pool.
+
+    bcrypt releases the GIL, so moving it onto threads keeps the event loop
+    free for redirects and ingestion while a login is being checked. At most
+    ``max_workers`` hashes run at once and at most ``max_queue`` more wait;
+    beyond that ``run`` raises PasswordBusy straight away instead of letting
+    a login storm pile up behind the pool.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, max_queue: Optional[int] = None):
+        self.max_workers = max_workers or settings.PASSWORD_WORKERS
+        self.max_queue = settings.PASSWORD_MAX_QUEUE if max_queue is None else max_queue
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pending = 0
+
+        # Counters
+        self.completed = 0
+        self.rejected = 0
+        self.total_wait_ms = 0.0
+        self.max_wait_ms = 0.0
+        self.total_run_ms = 0.0
+
+    async def run(self, fn: Callable, *args):
+        """Run ``fn(*args)`` on the password pool and return its result"""
+        if self._pending >= self.max_workers + self.max_queue:
+            self.rejected += 1
+            raise PasswordBusy()
+
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix="password")
+        submitted = time.perf_counter()
+        timings = []
+
+        def timed():
+            timings.append(time.perf_counter())
+            try:
+                return fn(*args)
+            finally:
+                timings.append(time.perf_counter())
+
+        self._pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, timed)
+        finally:
+            self._pending -= 1
+            self.completed += 1
+            # Counters are only touched on the event loop thread
+            if len(timings) == 2:
+                wait_ms = (timings[0] - submitted) * 1000
+                self.total_wait_ms += wait_ms
+                self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+                self.total_run_ms += (timings[1] - timings[0]) * 1000
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def stats(self) -> dict:
+        """Queue depth, rejections and wait/run times"""
+        return {
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "in_flight": min(self._pending, self.max_workers),
+            "queued": max(0, self._pending - self.max_workers),
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "avg_wait_ms": round(self.total_wait_ms / self.completed, 3) if self.completed else 0.0,
+            "max_wait_ms": round(self.max_wait_ms, 3),
+            "avg_run_ms": round(self.total_run_ms / self.completed, 3) if self.completed else 0.0,
+        }
+
+
+password_executor = PasswordExecutor()
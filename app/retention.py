@@ -0,0 +1,165 @@
+import asyncio
+import logging
+import random
+import time
+from typing import NamedTuple, Optional
+
+import aiosqlite
+
+from app.db import DAY_MS, connect, drop_event_partitions, now_ms
+from app.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# PRAGMA auto_vacuum value for INCREMENTAL
+AUTO_VACUUM_INCREMENTAL = 2
+
+
+class RetentionReport(NamedTuple):
+    cutoff_ms: int
+    partitions_dropped: list[str]
+    rows_removed: int
+    pages_vacuumed: int
+    bytes_freed: int
+    vacuum_enabled: bool
+    transactions: int
+    lock_ms_total: float
+    lock_ms_max: float
+    duration_ms: float
+
+
+async def _pragma(db: aiosqlite.Connection, name: str) -> int:
+    async with db.execute(f'PRAGMA {name}') as cursor:
+        return (await cursor.fetchone())[0]
+
+
+async def incremental_vacuum(db: aiosqlite.Connection, pages_per_step: int) -> tuple[int, list[float]]:
+    """Return free pages to the filesystem ``pages_per_step`` at a time.
+
+    Each step is its own short write transaction. Returns the pages freed
+    and the lock time of each step in milliseconds.
+    """
+    freed, locks = 0, []
+    free = await _pragma(db, 'freelist_count')
+    while free:
+        started = time.perf_counter()
+        async with db.execute(f'PRAGMA incremental_vacuum({int(pages_per_step)})') as cursor:
+            await cursor.fetchall()
+        await db.commit()
+        locks.append((time.perf_counter() - started) * 1000)
+        remaining = await _pragma(db, 'freelist_count')
+        if remaining >= free:
+            break
+        freed += free - remaining
+        free = remaining
+    return freed, locks
+
+
+async def run_retention(db: aiosqlite.Connection, retention_days: Optional[int] = None,
+                        vacuum_pages: Optional[int] = None) -> RetentionReport:
+    """Drop raw events older than the retention window and compact the file.
+
+    Rollups are written in the same transaction as the events they count,
+    so every partitioned event is already in events_hourly; the rollups
+    themselves are kept. Whole expired days are dropped one transaction at
+    a time, then freed pages are vacuumed in ``vacuum_pages`` steps, so no
+    single write lock is held for long. Rows still waiting in events_legacy
+    or an unpartitioned events table are left for their migrations.
+    """
+    started = time.perf_counter()
+    days = settings.EVENT_RETENTION_DAYS if retention_days is None else retention_days
+    cutoff = now_ms() - days * DAY_MS
+    page_size = await _pragma(db, 'page_size')
+    pages_before = await _pragma(db, 'page_count')
+
+    dropped = await drop_event_partitions(db, cutoff)
+    locks = [d.lock_ms for d in dropped]
+    vacuum_enabled = await _pragma(db, 'auto_vacuum') == AUTO_VACUUM_INCREMENTAL
+    vacuumed = 0
+    if vacuum_enabled:
+        vacuumed, vacuum_locks = await incremental_vacuum(db, vacuum_pages or settings.RETENTION_VACUUM_PAGES)
+        locks += vacuum_locks
+
+    return RetentionReport(
+        cutoff_ms=cutoff,
+        partitions_dropped=[d.name for d in dropped],
+        rows_removed=sum(d.rows for d in dropped),
+        pages_vacuumed=vacuumed,
+        bytes_freed=(pages_before - await _pragma(db, 'page_count')) * page_size,
+        vacuum_enabled=vacuum_enabled,
+        transactions=len(locks),
+        lock_ms_total=round(sum(locks), 3),
+        lock_ms_max=round(max(locks, default=0.0), 3),
+        duration_ms=round((time.perf_counter() - started) * 1000, 3),
+    )
+
+
+class RetentionJob:
+    """Runs run_retention every ``interval`` seconds in the background.
+
+    Every worker runs its own job; a run that finds nothing to drop costs a
+    sqlite_master read, so overlapping schedules are harmless. The first
+    run is delayed by a random fraction of the interval to spread workers
+    out. Each run opens and closes its own connection.
+    """
+
+    def __init__(self, db_path: Optional[str] = None, interval: Optional[float] = None):
+        self.db_path = db_path
+        self.interval = settings.RETENTION_INTERVAL if interval is None else interval
+        self._task: Optional[asyncio.Task] = None
+        self.runs = 0
+        self.failures = 0
+        self.last_report: Optional[RetentionReport] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        if self.running or self.interval <= 0:
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if not self.running:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def run_once(self) -> RetentionReport:
+        db = await connect(self.db_path)
+        try:
+            report = await run_retention(db)
+        finally:
+            await db.close()
+        self.runs += 1
+        self.last_report = report
+        if report.partitions_dropped:
+            logger.info("Retention dropped %d events in %d partitions, freed %d bytes (max lock %.1f ms)",
+                        report.rows_removed, len(report.partitions_dropped), report.bytes_freed,
+                        report.lock_ms_max)
+        return report
+
+    async def _run(self):
+        await asyncio.sleep(random.uniform(0, self.interval))
+        while True:
+            try:
+                await self.run_once()
+            except Exception:
+                self.failures += 1
+                logger.exception("Retention run failed")
+            await asyncio.sleep(self.interval)
+
+    def stats(self) -> dict:
+        return {
+            "runs": self.runs,
+            "failures": self.failures,
+            "last_report": self.last_report._asdict() if self.last_report else None,
+        }
+
+
+retention_job = RetentionJob()
@@ -1,8 +1,13 @@
+import asyncio
 from fastapi import APIRouter, Request, Depends, HTTPException
 from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse
 from datetime import datetime
 from app.auth import get_current_user
 from app.models import User
+from app.db import (read, get_site_owner, site_owner_cache, current_data_version, site_scope,
+                    get_24h_traffic_by_source, get_24h_clicks_by_link, get_24h_unique_visitors,
+                    rollup_window_start)
+from app.etags import not_modified, tagged_json
 from app.templates import get_templates
 
 router = APIRouter(prefix="/dashboard", tags=["dashboard"])
@@ -15,7 +20,7 @@ async def dashboard_page(request: Request, current_user: User = Depends(get_curr
         return RedirectResponse(url="/auth/login", status_code=302)
     
     template = templates.get_template("dashboard.html")
-    return HTMLResponse(template.render(
+    return HTMLResponse(await template.render_async(
         request=request,
         current_user=current_user,
         now=datetime.now()
@@ -29,3 +34,31 @@ async def get_links_api(current_user: User = Depends(get_current_user)):
     
     # TODO: Implement link tracking functionality
     return {"message": "Link tracking coming soon", "links": []}
+
+@router.get("/api/sites/{site_id}/traffic", response_class=JSONResponse)
+async def site_traffic_api(request: Request, site_id: str, current_user: User = Depends(get_current_user)):
+    """Last-24h traffic by source, clicks by link and unique visitors for one site (polled by the dashboard)"""
+    if not current_user:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    
+    # Owner and version both come from per-worker caches, so an unchanged
+    # site answers 304 without a query. The window start is part of the tag
+    # because the 24h window moves on the hour even without new events.
+    found, owner = site_owner_cache.lookup(site_id)
+    if not found:
+        owner = await read(get_site_owner, site_id)
+    if owner != current_user.id:
+        raise HTTPException(status_code=404, detail="Site not found or access denied")
+    
+    version = await current_data_version(site_scope(site_id))
+    etag = f'"traffic-{site_id}-{version}-{rollup_window_start()}"'
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    
+    # Independent queries, so each runs on its own reader at the same time
+    traffic, clicks, visitors = await asyncio.gather(read(get_24h_traffic_by_source, site_id),
+                                                     read(get_24h_clicks_by_link, site_id),
+                                                     read(get_24h_unique_visitors, site_id))
+    return tagged_json({"traffic_by_source": traffic, "clicks_by_link": clicks,
+                        "unique_visitors": visitors}, etag)
@@ -13,7 +13,7 @@ async def index(request: Request, current_user: User = Depends(get_current_user)
     """Display home page with authentication-aware content"""
     template = templates.get_template("index.html")
     
-    return HTMLResponse(template.render(
+    return HTMLResponse(await template.render_async(
         request=request, 
         current_user=current_user
     ))
@@ -0,0 +1,98 @@
+import json
+from fastapi import APIRouter, Request, HTTPException, Response
+from app.db import read_pool, get_site_owner, site_owner_cache
+from app.event_writer import event_writer
+from app.models import EventKind
+from app.settings import settings
+from app.tracking import client_ip, hash_value
+
+router = APIRouter(prefix="/v1", tags=["tracking"])
+
+EVENT_KINDS = {kind.value for kind in EventKind}
+
+# Optional client-supplied fields and their maximum lengths
+OPTIONAL_FIELDS = {
+    'path': 2048,
+    'referer': 2048,
+    'utm_source': 256,
+    'utm_medium': 256,
+    'utm_campaign': 256,
+    'session_id': 128,
+}
+
+def validate_event(item) -> dict:
+    """Check one raw event and return the fields we keep.
+
+    A plain-dict fast path instead of a pydantic model per event: beacon
+    batches are small and hot, and we only need type and length checks.
+    """
+    if not isinstance(item, dict):
+        raise ValueError("event must be an object")
+
+    site_id = item.get('site_id')
+    if not isinstance(site_id, str) or not site_id or len(site_id) > 64:
+        raise ValueError("site_id is required")
+
+    kind = item.get('kind', 'pageview')
+    if kind not in EVENT_KINDS:
+        raise ValueError("invalid kind")
+
+    event = {'site_id': site_id, 'kind': kind}
+    for field, max_length in OPTIONAL_FIELDS.items():
+        value = item.get(field)
+        if value is None:
+            continue
+        if not isinstance(value, str) or len(value) > max_length:
+            raise ValueError(f"invalid {field}")
+        event[field] = value
+    return event
+
+@router.post("/ingest", status_code=204)
+async def ingest(request: Request):
+    """Record a pageview, or a batch of them from a beacon flush"""
+    if int(request.headers.get('content-length') or 0) > settings.INGEST_MAX_BODY_BYTES:
+        raise HTTPException(status_code=413, detail="Payload too large")
+    body = await request.body()
+    if len(body) > settings.INGEST_MAX_BODY_BYTES:
+        raise HTTPException(status_code=413, detail="Payload too large")
+
+    # sendBeacon posts text/plain, so parse the body whatever the content type
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid JSON")
+
+    items = payload if isinstance(payload, list) else [payload]
+    if not items:
+        return Response(status_code=204)
+    if len(items) > settings.INGEST_MAX_EVENTS:
+        raise HTTPException(status_code=413, detail=f"At most {settings.INGEST_MAX_EVENTS} events per request")
+
+    try:
+        events = [validate_event(item) for item in items]
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # Resolve site owners; events for unknown or deleted sites are dropped
+    owners = {}
+    for site_id in {event['site_id'] for event in events}:
+        found, owner = site_owner_cache.lookup(site_id)
+        if not found:
+            async with read_pool.acquire() as db:
+                owner = await get_site_owner(db, site_id)
+        owners[site_id] = owner
+
+    ip_hash = hash_value(client_ip(request))
+    ua_hash = hash_value(request.headers.get('user-agent'))
+    accepted = []
+    for event in events:
+        user_id = owners[event['site_id']]
+        if user_id is None:
+            continue
+        event['user_id'] = user_id
+        event['ip_hash'] = ip_hash
+        event['ua_hash'] = ua_hash
+        accepted.append(event)
+
+    event_writer.enqueue_many(accepted)
+    return Response(status_code=204)
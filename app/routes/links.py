@@ -1,41 +1,64 @@
-from fastapi import APIRouter, Request, Depends, HTTPException, Form
-from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse
+from fastapi import APIRouter, Request, Depends, HTTPException, Form, Query, UploadFile, File
+from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse, Response
 from typing import Optional
 from datetime import datetime
+import codecs
+import sqlite3
 from app.auth import get_current_user
 from app.models import User, TrackedLink, TrackedLinkCreate, SourceType
-from app.db import get_db, create_tracked_link, get_user_tracked_links, delete_tracked_link, get_site_by_id, get_user_sites
-from app.templates import get_templates
-import secrets
-import string
+from app.db import db_pool, read_pool, PoolTimeout, create_tracked_link, get_tracked_links_page, delete_tracked_link, get_site_by_id, get_user_sites, current_data_version, user_scope
+from app.etags import not_modified, page_etag, tagged_json
+from app.link_import import ImportReport, import_links
+from app.settings import settings
+from app.short_codes import CODE_ATTEMPTS, short_code_allocator
+from app.templates import get_templates, stream_template
 
 router = APIRouter(prefix="/links", tags=["links"])
 templates = get_templates()
 
-def generate_short_code(length: int = 6) -> str:
-    """Generate a random short code for URLs"""
-    characters = string.ascii_letters + string.digits
-    return ''.join(secrets.choice(characters) for _ in range(length))
-
 @router.get("/", response_class=HTMLResponse)
-async def links_page(request: Request, current_user: User = Depends(get_current_user)):
+async def links_page(request: Request, site_id: Optional[str] = None, current_user: User = Depends(get_current_user)):
     """Display link management page"""
     if not current_user:
         return RedirectResponse(url="/auth/login", status_code=302)
     
-    # Get user's sites and links
-    db = await get_db()
-    sites = await get_user_sites(db, current_user.id)
-    links = await get_user_tracked_links(db, current_user.id)
-    await db.close()
+    # Get user's sites and the first page of links; the rest load on scroll
+    async with read_pool.acquire() as db:
+        sites = await get_user_sites(db, current_user.id)
+        page = await get_tracked_links_page(db, current_user.id, settings.LIST_PAGE_SIZE, site_id=site_id)
     
-    template = templates.get_template("links.html")
-    return HTMLResponse(template.render(
+    return stream_template(
+        "links.html",
         request=request,
         current_user=current_user,
         sites=sites,
-        links=links,
+        links=page.items,
+        next_cursor=page.next_cursor,
+        site_id=site_id,
         now=datetime.now()
+    )
+
+@router.get("/rows", response_class=HTMLResponse)
+async def link_rows(
+    cursor: str,
+    site_id: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
+    """Next page of link table rows, for the links page's infinite scroll"""
+    if not current_user:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    
+    try:
+        async with read_pool.acquire() as db:
+            page = await get_tracked_links_page(db, current_user.id, settings.LIST_PAGE_SIZE, cursor, site_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    template = templates.get_template("partials/link_rows.html")
+    return HTMLResponse(await template.render_async(
+        links=page.items,
+        next_cursor=page.next_cursor,
+        site_id=site_id
     ))
 
 @router.post("/", response_class=HTMLResponse)
@@ -61,47 +84,100 @@ async def create_link_route(
         raise HTTPException(status_code=400, detail="Invalid source")
     
     # Validate that user owns the site
-    db = await get_db()
-    site = await get_site_by_id(db, site_id, current_user.id)
-    if not site:
-        await db.close()
-        raise HTTPException(status_code=400, detail="Site not found or access denied")
-    
-    # Basic URL validation
-    original_url = original_url.strip()
-    if not original_url.startswith(('http://', 'https://')):
-        original_url = 'https://' + original_url
-    
-    # Validate that URL belongs to the site
-    from urllib.parse import urlparse
-    parsed_url = urlparse(original_url)
-    if not parsed_url.netloc.endswith(site.domain) and parsed_url.netloc != site.domain:
-        await db.close()
-        raise HTTPException(status_code=400, detail="URL must belong to the selected site")
-    
-    try:
-        # Generate short code
-        short_code = generate_short_code()
-        
-        # Set UTM parameters
-        utm_source = source
-        utm_medium = "social"
-        utm_campaign = campaign or "link_tracking"
+    async with db_pool.acquire() as db:
+        site = await get_site_by_id(db, site_id, current_user.id)
+        if not site:
+            raise HTTPException(status_code=400, detail="Site not found or access denied")
         
-        # Create tracked link
-        new_link = await create_tracked_link(
-            db, current_user.id, site_id, original_url, 
-            source, short_code, utm_source, utm_medium, utm_campaign
-        )
+        # Basic URL validation
+        original_url = original_url.strip()
+        if not original_url.startswith(('http://', 'https://')):
+            original_url = 'https://' + original_url
         
-        await db.close()
+        # Validate that URL belongs to the site
+        from urllib.parse import urlparse
+        parsed_url = urlparse(original_url)
+        if not parsed_url.netloc.endswith(site.domain) and parsed_url.netloc != site.domain:
+            raise HTTPException(status_code=400, detail="URL must belong to the selected site")
         
-        # Redirect back to links page with success message
-        return RedirectResponse(url=f"/links?success=created&short_code={short_code}", status_code=302)
-        
-    except Exception as e:
-        await db.close()
-        raise HTTPException(status_code=500, detail=f"Failed to create link: {str(e)}")
+        try:
+            # Set UTM parameters
+            utm_source = source
+            utm_medium = "social"
+            utm_campaign = campaign or "link_tracking"
+            
+            # Create tracked link; allocated codes never collide with each
+            # other, only with a code from the old random generator
+            for attempt in range(CODE_ATTEMPTS):
+                short_code, = await short_code_allocator.allocate(db)
+                try:
+                    new_link = await create_tracked_link(
+                        db, current_user.id, site_id, original_url, 
+                        source, short_code, utm_source, utm_medium, utm_campaign
+                    )
+                    break
+                except sqlite3.IntegrityError:
+                    if attempt == CODE_ATTEMPTS - 1:
+                        raise
+            
+            # Redirect back to links page with success message
+            return RedirectResponse(url=f"/links?success=created&short_code={short_code}", status_code=302)
+            
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Failed to create link: {str(e)}")
+
+SAMPLE_CSV = """url,source,campaign
+https://example.com/blog/launch,x,launch_week
+https://example.com/blog/launch,linkedin,launch_week
+https://example.com/pricing,reddit,
+"""
+
+async def import_upload(file: UploadFile, current_user: Optional[User]) -> ImportReport:
+    """Run a bulk link CSV upload; a file that can't be imported is a 400"""
+    if not current_user:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    
+    try:
+        async with db_pool.acquire() as db:
+            return await import_links(db, current_user.id, codecs.iterdecode(file.file, "utf-8-sig"))
+    except ValueError as e:  # includes undecodable bytes
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/upload", response_class=HTMLResponse)
+async def upload_page(request: Request, current_user: User = Depends(get_current_user)):
+    """Display the bulk link upload page"""
+    if not current_user:
+        return RedirectResponse(url="/auth/login", status_code=302)
+    
+    template = templates.get_template("upload.html")
+    return HTMLResponse(await template.render_async(
+        request=request,
+        current_user=current_user,
+        max_rows=settings.BULK_LINKS_MAX_ROWS
+    ))
+
+@router.get("/upload/sample")
+async def upload_sample():
+    """Sample CSV for the bulk link upload"""
+    return Response(SAMPLE_CSV, media_type="text/csv",
+                    headers={"Content-Disposition": 'attachment; filename="links-sample.csv"'})
+
+@router.post("/upload", response_class=HTMLResponse)
+async def upload_links(file: UploadFile = File(...), current_user: User = Depends(get_current_user)):
+    """Create links from an uploaded CSV; returns the report for the upload page"""
+    report = await import_upload(file, current_user)
+    template = templates.get_template("partials/upload_result.html")
+    return HTMLResponse(await template.render_async(report=report))
+
+@router.post("/api/bulk", response_class=JSONResponse)
+async def bulk_links_api(file: UploadFile = File(...), current_user: User = Depends(get_current_user)):
+    """API endpoint for creating links from a CSV of url, source, campaign rows"""
+    report = await import_upload(file, current_user)
+    return {
+        "created": [{"line": line, "id": link.id, "short_code": link.short_code, "original_url": link.original_url}
+                    for line, link in zip(report.lines, report.links)],
+        "errors": [error._asdict() for error in report.errors],
+    }
 
 @router.delete("/{link_id}", response_class=JSONResponse)
 async def delete_link_route(
@@ -113,49 +189,70 @@ async def delete_link_route(
         raise HTTPException(status_code=401, detail="Not authenticated")
     
     try:
-        db = await get_db()
-        success = await delete_tracked_link(db, link_id, current_user.id)
-        await db.close()
+        async with db_pool.acquire() as db:
+            success = await delete_tracked_link(db, link_id, current_user.id)
         
         if not success:
             raise HTTPException(status_code=404, detail="Link not found or access denied")
         
         return {"success": True, "message": "Link deleted successfully"}
         
+    except (HTTPException, PoolTimeout):
+        raise
     except Exception as e:
-        await db.close()
         raise HTTPException(status_code=500, detail=f"Failed to delete link: {str(e)}")
 
 @router.get("/api/list", response_class=JSONResponse)
-async def list_links_api(current_user: User = Depends(get_current_user)):
-    """API endpoint for getting user's tracked links"""
+async def list_links_api(
+    request: Request,
+    limit: int = Query(settings.LIST_PAGE_SIZE, ge=1, le=settings.LIST_PAGE_MAX_SIZE),
+    cursor: Optional[str] = None,
+    site_id: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
+    """API endpoint for getting a page of user's tracked links; pass next_cursor back for the next"""
     if not current_user:
         raise HTTPException(status_code=401, detail="Not authenticated")
     
     try:
-        db = await get_db()
-        links = await get_user_tracked_links(db, current_user.id)
-        await db.close()
+        # Version first: a write landing after it only makes the ETag stale
+        version = await current_data_version(user_scope(current_user.id))
+        etag = page_etag("links", current_user.id, version, limit, cursor, site_id)
+        cached = not_modified(request, etag)
+        if cached:
+            return cached
+        
+        async with read_pool.acquire() as db:
+            page = await get_tracked_links_page(db, current_user.id, limit, cursor, site_id)
         
-        return {"links": [link.dict() for link in links]}
+        return tagged_json({"links": [link.dict() for link in page.items], "next_cursor": page.next_cursor}, etag)
         
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except PoolTimeout:
+        raise
     except Exception as e:
-        await db.close()
         raise HTTPException(status_code=500, detail=f"Failed to fetch links: {str(e)}")
 
 @router.get("/api/sites", response_class=JSONResponse)
-async def list_sites_api(current_user: User = Depends(get_current_user)):
+async def list_sites_api(request: Request, current_user: User = Depends(get_current_user)):
     """API endpoint for getting user's sites for link creation"""
     if not current_user:
         raise HTTPException(status_code=401, detail="Not authenticated")
     
     try:
-        db = await get_db()
-        sites = await get_user_sites(db, current_user.id)
-        await db.close()
+        version = await current_data_version(user_scope(current_user.id))
+        etag = f'"sites-{current_user.id}-{version}"'
+        cached = not_modified(request, etag)
+        if cached:
+            return cached
+        
+        async with read_pool.acquire() as db:
+            sites = await get_user_sites(db, current_user.id)
         
-        return {"sites": [site.dict() for site in sites]}
+        return tagged_json({"sites": [site.dict() for site in sites]}, etag)
         
+    except PoolTimeout:
+        raise
     except Exception as e:
-        await db.close()
         raise HTTPException(status_code=500, detail=f"Failed to fetch sites: {str(e)}")
@@ -0,0 +1,52 @@
+import re
+from fastapi import APIRouter, Request, HTTPException
+from fastapi.responses import RedirectResponse
+from starlette.background import BackgroundTask
+from app.db import read_pool, link_cache, load_short_code, ResolvedLink
+from app.event_writer import event_writer
+from app.tracking import client_ip, hash_value
+
+router = APIRouter(tags=["tracking"])
+
+# Short codes are base62; anything else (favicon.ico, robots.txt, ...) is a 404
+# without a cache or database lookup
+SHORT_CODE_RE = re.compile(r'^[A-Za-z0-9]{4,16}$')
+
+# Router prefixes this catch-all would otherwise shadow; send them on to the
+# trailing-slash URL as Starlette's redirect_slashes would
+RESERVED_PATHS = {'auth', 'dashboard', 'sites', 'links', 'static', 'v1'}
+
+def record_click(link: ResolvedLink, ip: str | None, user_agent: str | None, referer: str | None):
+    """Queue the click event; runs after the redirect has been sent"""
+    event_writer.enqueue({
+        'tracked_link_id': link.link_id,
+        'site_id': link.site_id,
+        'user_id': link.user_id,
+        'kind': 'click',
+        'ip_hash': hash_value(ip),
+        'ua_hash': hash_value(user_agent),
+        'referer': referer,
+        'utm_source': link.utm_source,
+        'utm_medium': link.utm_medium,
+        'utm_campaign': link.utm_campaign,
+    })
+
+@router.get("/{short_code}")
+async def redirect_short_code(short_code: str, request: Request):
+    """Redirect a short link to its target and record the click"""
+    if short_code in RESERVED_PATHS:
+        return RedirectResponse(url=str(request.url.replace(path=f"/{short_code}/")), status_code=307)
+    if not SHORT_CODE_RE.match(short_code):
+        raise HTTPException(status_code=404, detail="Link not found")
+    
+    found, link = link_cache.lookup(short_code)
+    if not found:
+        async with read_pool.acquire() as db:
+            link = await load_short_code(db, short_code)
+    if link is None:
+        raise HTTPException(status_code=404, detail="Link not found")
+    
+    click = BackgroundTask(record_click, link, client_ip(request),
+                           request.headers.get('user-agent'), request.headers.get('referer'))
+    return RedirectResponse(url=link.redirect_url, status_code=302,
+                            headers={"Cache-Control": "no-store"}, background=click)
@@ -1,10 +1,12 @@
-from fastapi import APIRouter, Request, Depends, HTTPException, Form
+from fastapi import APIRouter, Request, Depends, HTTPException, Form, Query
 from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse
 from typing import Optional
 from datetime import datetime
 from app.auth import get_current_user
 from app.models import User, Site, SiteCreate
-from app.db import get_db, create_site, get_user_sites, get_site_by_id, update_site, delete_site
+from app.db import db_pool, read_pool, PoolTimeout, create_site, get_user_sites, get_sites_page, get_site_by_id, update_site, delete_site, current_data_version, user_scope
+from app.etags import not_modified, page_etag, tagged_json
+from app.settings import settings
 from app.templates import get_templates
 
 router = APIRouter(prefix="/sites", tags=["sites"])
@@ -17,12 +19,11 @@ async def sites_page(request: Request, current_user: User = Depends(get_current_
         return RedirectResponse(url="/auth/login", status_code=302)
     
     # Get user's sites
-    db = await get_db()
-    sites = await get_user_sites(db, current_user.id)
-    await db.close()
+    async with read_pool.acquire() as db:
+        sites = await get_user_sites(db, current_user.id)
     
     template = templates.get_template("sites.html")
-    return HTMLResponse(template.render(
+    return HTMLResponse(await template.render_async(
         request=request,
         current_user=current_user,
         sites=sites,
@@ -48,15 +49,15 @@ async def create_site_route(
         raise HTTPException(status_code=400, detail="Invalid domain format")
     
     try:
-        db = await get_db()
-        new_site = await create_site(db, current_user.id, domain)
-        await db.close()
+        async with db_pool.acquire() as db:
+            new_site = await create_site(db, current_user.id, domain)
         
         # Redirect back to sites page with success message
         return RedirectResponse(url="/sites?success=created", status_code=302)
         
+    except PoolTimeout:
+        raise
     except Exception as e:
-        await db.close()
         raise HTTPException(status_code=500, detail=f"Failed to create site: {str(e)}")
 
 @router.put("/{site_id}", response_class=JSONResponse)
@@ -78,17 +79,17 @@ async def update_site_route(
         raise HTTPException(status_code=400, detail="Invalid domain format")
     
     try:
-        db = await get_db()
-        updated_site = await update_site(db, site_id, current_user.id, domain)
-        await db.close()
+        async with db_pool.acquire() as db:
+            updated_site = await update_site(db, site_id, current_user.id, domain)
         
         if not updated_site:
             raise HTTPException(status_code=404, detail="Site not found or access denied")
         
         return {"success": True, "site": updated_site.dict()}
         
+    except (HTTPException, PoolTimeout):
+        raise
     except Exception as e:
-        await db.close()
         raise HTTPException(status_code=500, detail=f"Failed to update site: {str(e)}")
 
 @router.delete("/{site_id}", response_class=JSONResponse)
@@ -101,32 +102,46 @@ async def delete_site_route(
         raise HTTPException(status_code=401, detail="Not authenticated")
     
     try:
-        db = await get_db()
-        success = await delete_site(db, site_id, current_user.id)
-        await db.close()
+        async with db_pool.acquire() as db:
+            success = await delete_site(db, site_id, current_user.id)
         
         if not success:
             raise HTTPException(status_code=404, detail="Site not found or access denied")
         
         return {"success": True, "message": "Site deleted successfully"}
         
+    except (HTTPException, PoolTimeout):
+        raise
     except Exception as e:
-        await db.close()
         raise HTTPException(status_code=500, detail=f"Failed to delete site: {str(e)}")
 
 @router.get("/api/list", response_class=JSONResponse)
-async def list_sites_api(current_user: User = Depends(get_current_user)):
-    """API endpoint for getting user's sites"""
+async def list_sites_api(
+    request: Request,
+    limit: int = Query(settings.LIST_PAGE_SIZE, ge=1, le=settings.LIST_PAGE_MAX_SIZE),
+    cursor: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
+    """API endpoint for getting a page of user's sites; pass next_cursor back for the next"""
     if not current_user:
         raise HTTPException(status_code=401, detail="Not authenticated")
     
     try:
-        db = await get_db()
-        sites = await get_user_sites(db, current_user.id)
-        await db.close()
+        # Version first: a write landing after it only makes the ETag stale
+        version = await current_data_version(user_scope(current_user.id))
+        etag = page_etag("sites", current_user.id, version, limit, cursor)
+        cached = not_modified(request, etag)
+        if cached:
+            return cached
+        
+        async with read_pool.acquire() as db:
+            page = await get_sites_page(db, current_user.id, limit, cursor)
         
-        return {"sites": [site.dict() for site in sites]}
+        return tagged_json({"sites": [site.dict() for site in page.items], "next_cursor": page.next_cursor}, etag)
         
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except PoolTimeout:
+        raise
     except Exception as e:
-        await db.close()
         raise HTTPException(status_code=500, detail=f"Failed to fetch sites: {str(e)}")
@@ -0,0 +1,145 @@
+import secrets
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from app.cache import TTLCache
+from app.models import SessionData
+from app.settings import settings
+
+SESSIONS_TABLE_SQL = '''
+    CREATE TABLE IF NOT EXISTS sessions (
+        id TEXT PRIMARY KEY,
+        user_id TEXT NOT NULL,
+        email TEXT NOT NULL,
+        username TEXT NOT NULL,
+        created_at INTEGER NOT NULL,
+        expires_at INTEGER NOT NULL
+    ) WITHOUT ROWID
+'''
+
+SESSIONS_INDEX_SQL = 'CREATE INDEX IF NOT EXISTS idx_sessions_expires_at ON sessions(expires_at)'
+
+
+class SessionStore:
+    """Login sessions in a SQLite table shared by every worker process.
+
+    Lookups go through a small per-worker cache first, so an authenticated
+    request normally costs a dict lookup. Cached entries live at most
+    ``SESSION_CACHE_TTL`` seconds, which bounds how long a session deleted
+    by another worker (logout there) keeps working here. Sessions expire
+    ``SESSION_TTL`` seconds after login, matching the cookie max_age;
+    expired rows are deleted in bulk at most every
+    ``SESSION_SWEEP_INTERVAL`` seconds, piggybacking on new logins.
+
+    The methods are synchronous: reads are primary-key lookups on a local
+    file and only login and logout write. Async code must run ``create``
+    and ``delete`` in a thread, because the write can wait on a lock held
+    by an aiosqlite connection that needs the event loop to commit.
+    """
+
+    def __init__(
+        self,
+        db_path: Optional[str] = None,
+        ttl: Optional[int] = None,
+        cache_size: Optional[int] = None,
+        cache_ttl: Optional[float] = None,
+        sweep_interval: Optional[float] = None,
+    ):
+        self.db_path = db_path
+        self.ttl = ttl or settings.SESSION_TTL
+        self.sweep_interval = settings.SESSION_SWEEP_INTERVAL if sweep_interval is None else sweep_interval
+        self.cache = TTLCache(cache_size or settings.SESSION_CACHE_SIZE,
+                              settings.SESSION_CACHE_TTL if cache_ttl is None else cache_ttl)
+        self._path: Optional[str] = None
+        # Separate connections so a read never queues behind a write that
+        # is waiting for another process's lock
+        self._writer: Optional[sqlite3.Connection] = None
+        self._reader: Optional[sqlite3.Connection] = None
+        self._write_lock = threading.Lock()
+        self._read_lock = threading.Lock()
+        self._open_lock = threading.Lock()
+        self._last_sweep = time.monotonic()
+
+    def _open(self, path: str) -> sqlite3.Connection:
+        conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        conn.execute('PRAGMA busy_timeout = 5000')
+        conn.execute(SESSIONS_TABLE_SQL)
+        conn.execute(SESSIONS_INDEX_SQL)
+        return conn
+
+    def _connections(self) -> tuple[sqlite3.Connection, sqlite3.Connection]:
+        path = self.db_path or settings.DATABASE_PATH
+        with self._open_lock:
+            if self._path != path:
+                self._close_connections()
+                self._writer, self._reader, self._path = self._open(path), self._open(path), path
+            return self._writer, self._reader
+
+    def _close_connections(self):
+        for conn in (self._writer, self._reader):
+            if conn is not None:
+                conn.close()
+        self._writer = self._reader = self._path = None
+
+    def create(self, data: SessionData) -> str:
+        """Store a new session and return its id"""
+        session_id = secrets.token_urlsafe(32)
+        now = int(time.time())
+        with self._write_lock:
+            self._connections()[0].execute('''
+                INSERT INTO sessions (id, user_id, email, username, created_at, expires_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (session_id, data.user_id, data.email, data.username, now, now + self.ttl))
+            if time.monotonic() - self._last_sweep >= self.sweep_interval:
+                self._sweep()
+        self.cache.set(session_id, (data, now + self.ttl))
+        return session_id
+
+    def get(self, session_id: str) -> Optional[SessionData]:
+        """Session data for an unexpired session, or None"""
+        now = time.time()
+        found, entry = self.cache.lookup(session_id)
+        if found:
+            data, expires_at = entry
+            if expires_at > now:
+                return data
+            self.cache.invalidate(session_id)
+            return None
+
+        with self._read_lock:
+            row = self._connections()[1].execute('''
+                SELECT user_id, email, username, expires_at FROM sessions
+                WHERE id = ? AND expires_at > ?
+            ''', (session_id, int(now))).fetchone()
+        if row is None:
+            return None
+        data = SessionData(user_id=row[0], email=row[1], username=row[2])
+        self.cache.set(session_id, (data, row[3]), min(self.cache.ttl, row[3] - now))
+        return data
+
+    def delete(self, session_id: str):
+        """Remove a session everywhere; other workers drop it within the cache TTL"""
+        self.cache.invalidate(session_id)
+        with self._write_lock:
+            self._connections()[0].execute('DELETE FROM sessions WHERE id = ?', (session_id,))
+
+    def sweep(self) -> int:
+        """Delete every expired session; returns how many were removed"""
+        with self._write_lock:
+            return self._sweep()
+
+    def _sweep(self) -> int:
+        self._last_sweep = time.monotonic()
+        cursor = self._connections()[0].execute('DELETE FROM sessions WHERE expires_at <= ?',
+                                                (int(time.time()),))
+        return cursor.rowcount
+
+    def close(self):
+        with self._open_lock:
+            self._close_connections()
+        self.cache.clear()
+
+
+session_store = SessionStore()
@@ -4,6 +4,22 @@ class Settings(BaseSettings):
     STRIPE_API_KEY: str = ""
     SECRET_KEY: str = "supersecret"
     DATABASE_URL: str = "sqlite:///./app.db"
+    DATABASE_PATH: str = "engagemeter.db"
+    # Connection roles (per worker). SQLite takes one writer at a time, so
+    # extra writer connections would only queue on busy_timeout; readers run
+    # concurrently under WAL. cache_size is per connection.
+    DATABASE_POOL_SIZE: int = 1
+    DATABASE_READ_POOL_SIZE: int = 4
+    DATABASE_POOL_TIMEOUT: float = 5.0
+    DATABASE_BUSY_TIMEOUT_MS: int = 5000
+    DATABASE_CACHE_SIZE_KB: int = 16384
+    DATABASE_MMAP_SIZE: int = 268435456  # 256 MiB
+
+    # Link and site listings are paged by cursor; ?limit= is capped here
+    LIST_PAGE_SIZE: int = 50
+    LIST_PAGE_MAX_SIZE: int = 200
+    # Rows accepted per bulk link CSV upload (all inserted in one transaction)
+    BULK_LINKS_MAX_ROWS: int = 10000
     
     # Session settings
     SESSION_SECRET_KEY: str = "your-session-secret-key-here"
@@ -11,6 +27,72 @@ class Settings(BaseSettings):
     SESSION_COOKIE_SECURE: bool = False  # Set to True in production with HTTPS
     SESSION_COOKIE_HTTPONLY: bool = True
     SESSION_COOKIE_SAMESITE: str = "lax"
+    SESSION_TTL: int = 3600 * 24 * 7  # 7 days, also the cookie max_age
+    SESSION_CACHE_SIZE: int = 10000
+    SESSION_CACHE_TTL: float = 30
+    SESSION_SWEEP_INTERVAL: float = 3600
+    USER_CACHE_SIZE: int = 10000
+    USER_CACHE_TTL: float = 60
+
+    # bcrypt thread pool (per worker); logins beyond workers + queue get a 503
+    PASSWORD_WORKERS: int = 2
+    PASSWORD_MAX_QUEUE: int = 16
+
+    # Jinja2: bytecode cache dir defaults to the system temp dir; turn
+    # auto_reload on only in development
+    TEMPLATE_AUTO_RELOAD: bool = False
+    TEMPLATE_BYTECODE_CACHE: bool = True
+    TEMPLATE_BYTECODE_CACHE_DIR: str = ""
+
+    # Static files: cache lifetime for plain (non-fingerprinted) URLs such as
+    # the customer tracking snippet
+    STATIC_MAX_AGE: int = 3600
+
+    # Short codes: length of new codes (62**length of them; changing it
+    # starts a fresh sequence) and counter values each worker reserves per
+    # database write
+    SHORT_CODE_LENGTH: int = 6
+    SHORT_CODE_BLOCK_SIZE: int = 1000
+
+    # Unique-visitor sketches: 2**HLL_PRECISION registers each, relative
+    # standard error 1.04 / sqrt(2**p) (1.6% at 12). A change applies to new
+    # sketches; sketches of different precision merge at the lower one
+    HLL_PRECISION: int = 12
+
+    # Short-code resolution cache (per worker)
+    LINK_CACHE_SIZE: int = 10000
+    LINK_CACHE_TTL: float = 300
+    LINK_CACHE_NEGATIVE_TTL: float = 30
+    ENTITY_KEY_CACHE_SIZE: int = 50000
+
+    # Data versions behind list/dashboard ETags (per worker); bounds how long
+    # another worker's write can go unnoticed by a conditional GET here
+    DATA_VERSION_CACHE_SIZE: int = 10000
+    DATA_VERSION_CACHE_TTL: float = 2
+
+    # Event ingestion settings
+    EVENT_QUEUE_MAX_SIZE: int = 10000
+    EVENT_FLUSH_BATCH_SIZE: int = 500
+    EVENT_FLUSH_INTERVAL_MS: int = 250
+    EVENT_FLUSH_RETRIES: int = 2
+    INGEST_MAX_EVENTS: int = 100
+    INGEST_MAX_BODY_BYTES: int = 65536
+
+    # Optional single writer: when EVENT_WRITER_SOCKET is set, workers send
+    # their batches over this Unix socket to `python -m app.writer_service`,
+    # which owns the only event write connection and commits up to
+    # EVENT_WRITER_SERVICE_BATCH_SIZE rows per transaction
+    EVENT_WRITER_SOCKET: str = ""
+    EVENT_WRITER_SERVICE_BATCH_SIZE: int = 5000
+    EVENT_WRITER_SERVICE_QUEUE_SIZE: int = 100000
+
+    # Retention: raw events older than this many days are dropped (rollups
+    # are kept). The job runs every RETENTION_INTERVAL seconds in each
+    # worker (0 disables it; scripts/retention.py runs it from cron) and
+    # vacuums at most RETENTION_VACUUM_PAGES pages per write transaction.
+    EVENT_RETENTION_DAYS: int = 90
+    RETENTION_INTERVAL: float = 3600
+    RETENTION_VACUUM_PAGES: int = 1000
 
     model_config = {"env_file": ".env"}
 
@@ -0,0 +1,131 @@
+"""Short codes for tracked links, unique without looking them up.
+
+Each code length has a counter in short_code_counters. A worker reserves a
+block of counter values at a time (one write per SHORT_CODE_BLOCK_SIZE
+codes) and turns each value into a code with a keyed permutation of the
+whole code space, so codes are distinct by construction but don't reveal
+the sequence. Values left in a worker's block when it exits are skipped,
+never reused.
+
+Codes from the old random generator can still collide with a permuted
+one; the insert then fails on the UNIQUE constraint and callers retry with
+the next code (see CODE_ATTEMPTS).
+"""
+
+import hashlib
+import secrets
+import string
+from typing import Optional
+
+import aiosqlite
+
+from app.db import reserve_short_code_block
+from app.settings import settings
+
+ALPHABET = string.ascii_letters + string.digits
+BASE = len(ALPHABET)
+
+# Feistel rounds; even, so the halves end up in their original order
+ROUNDS = 4
+
+# Attempts at creating a link before a UNIQUE violation on short_code is
+# given up on; only codes made before this allocator can collide
+CODE_ATTEMPTS = 3
+
+
+class ShortCodesExhausted(Exception):
+    """Raised when every code of the configured length has been handed out"""
+
+
+def encode(value: int, length: int) -> str:
+    """``value`` in base 62, padded to ``length`` characters"""
+    chars = []
+    for _ in range(length):
+        value, digit = divmod(value, BASE)
+        chars.append(ALPHABET[digit])
+    return ''.join(reversed(chars))
+
+
+class Permutation:
+    """Keyed bijection on [0, 62**length).
+
+    A Feistel network over the value split into a high and a low half of
+    base-62 digits. Each round adds a keyed hash of one half to the other
+    modulo that half's size, which stays invertible for uneven halves
+    (odd lengths) because the two moduli swap with the halves.
+    """
+
+    def __init__(self, length: int, key: bytes):
+        self.length = length
+        self._sizes = (BASE ** (length // 2), BASE ** (length - length // 2))
+        # Keyed hash state per round, copied for each value
+        self._rounds = [hashlib.blake2b(key=key, digest_size=8, person=round_.to_bytes(16, 'big'))
+                        for round_ in range(ROUNDS)]
+
+    def __call__(self, value: int) -> int:
+        high_size, low_size = self._sizes
+        high, low = divmod(value, low_size)
+        for round_hash in self._rounds:
+            digest = round_hash.copy()
+            digest.update(low.to_bytes(8, 'big'))
+            high, low = low, (high + int.from_bytes(digest.digest(), 'big')) % high_size
+            high_size, low_size = low_size, high_size
+        return high * low_size + low
+
+    def code(self, value: int) -> str:
+        return encode(self(value), self.length)
+
+
+class ShortCodeAllocator:
+    """Hands out unique ``length``-character codes from reserved counter blocks.
+
+    One per worker. Several coroutines may allocate at once: values are
+    taken from the current block without awaiting, and a coroutine that
+    finds it empty reserves a fresh block of its own.
+    """
+
+    def __init__(self, length: Optional[int] = None, block_size: Optional[int] = None):
+        self.length = length or settings.SHORT_CODE_LENGTH
+        self.block_size = block_size or settings.SHORT_CODE_BLOCK_SIZE
+        self.capacity = BASE ** self.length
+        self._next = 0
+        self._end = 0
+        self._permutation: Optional[Permutation] = None
+        self.blocks = 0
+        self.allocated = 0
+
+    async def allocate(self, db: aiosqlite.Connection, count: int = 1) -> list[str]:
+        """``count`` new codes; may commit ``db`` to reserve a block"""
+        values = []
+        while len(values) < count:
+            if self._next >= self._end:
+                size = max(self.block_size, count - len(values))
+                start, key = await reserve_short_code_block(db, self.length, size, secrets.token_hex(16))
+                if start + size > self.capacity:
+                    raise ShortCodesExhausted(f"No {self.length}-character short codes left")
+                if self._permutation is None:
+                    self._permutation = Permutation(self.length, bytes.fromhex(key))
+                self._next, self._end = start, start + size
+                self.blocks += 1
+                continue
+            take = min(count - len(values), self._end - self._next)
+            values.extend(range(self._next, self._next + take))
+            self._next += take
+        self.allocated += count
+        return [self._permutation.code(value) for value in values]
+
+    def reset(self):
+        """Forget the reserved block, e.g. after switching databases"""
+        self._next = self._end = 0
+        self._permutation = None
+
+    def stats(self) -> dict:
+        return {
+            "length": self.length,
+            "blocks_reserved": self.blocks,
+            "allocated": self.allocated,
+            "left_in_block": self._end - self._next,
+        }
+
+
+short_code_allocator = ShortCodeAllocator()
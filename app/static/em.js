@@ -0,0 +1,41 @@
+/* EngageMeter tracking snippet: <script defer src=".../static/em.js" data-site="SITE_ID"></script> */
+!(function (d, w) {
+  var s = d.currentScript;
+  if (!s || !s.dataset.site) return;
+  var endpoint = new URL("/v1/ingest", s.src).href;
+
+  function sid() {
+    try {
+      var v = sessionStorage.getItem("em_sid");
+      if (!v) {
+        v = crypto.randomUUID();
+        sessionStorage.setItem("em_sid", v);
+      }
+      return v;
+    } catch (e) {
+      return Math.random().toString(36).slice(2);
+    }
+  }
+
+  function send() {
+    var q = new URLSearchParams(location.search);
+    var b = {
+      site_id: s.dataset.site,
+      kind: "pageview",
+      path: location.pathname + location.search,
+      referer: d.referrer || undefined,
+      utm_source: q.get("utm_source") || undefined,
+      utm_medium: q.get("utm_medium") || undefined,
+      utm_campaign: q.get("utm_campaign") || undefined,
+      session_id: sid(),
+    };
+    var body = JSON.stringify(b);
+    // text/plain keeps sendBeacon a simple (preflight-free) request
+    if (!(navigator.sendBeacon && navigator.sendBeacon(endpoint, body))) {
+      fetch(endpoint, { method: "POST", body: body, keepalive: true }).catch(function () {});
+    }
+  }
+
+  if (d.readyState === "complete") send();
+  else w.addEventListener("load", send);
+})(document, window);
@@ -0,0 +1,151 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+from typing import NamedTuple, Optional
+
+from starlette.datastructures import Headers
+from starlette.responses import PlainTextResponse, Response
+
+from app.etags import etag_matches
+from app.settings import settings
+
+try:
+    import brotli
+except ImportError:  # optional: without it only gzip variants are built
+    brotli = None
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+
+# Fingerprinted URLs never change content, so browsers may keep them forever
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+# Encodings in order of preference when the client accepts several
+ENCODINGS = ("br", "gzip")
+
+
+class Asset(NamedTuple):
+    media_type: str
+    etag: str
+    variants: dict  # content-coding ("identity", "gzip", "br") -> bytes
+
+
+def accepted_encodings(header: str) -> set:
+    """Content-codings the client accepts, honouring q=0"""
+    accepted = set()
+    for part in header.split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = params.strip()
+        if q.startswith("q="):
+            try:
+                if float(q[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(coding)
+    if "*" in accepted:
+        accepted.update(ENCODINGS)
+    return accepted
+
+
+class StaticAssets:
+    """In-memory, precompressed static files with fingerprinted URLs.
+
+    ``build`` reads every file under ``directory`` once and keeps its bytes
+    plus gzip and (when the optional ``brotli`` package is installed)
+    brotli variants, only where they are smaller. Each file is served both
+    as ``name.ext`` and as ``name.<hash>.ext``; templates link the
+    fingerprinted URL through ``static_url`` and get
+    ``Cache-Control: immutable``, while plain names (such as the customer
+    tracking snippet, whose URL is pasted into other sites) are cached
+    for ``STATIC_MAX_AGE`` seconds and revalidated with an ETag.
+    """
+
+    def __init__(self, directory: str = STATIC_DIR):
+        self.directory = directory
+        self.assets: dict[str, Asset] = {}
+        self.urls: dict[str, str] = {}
+        self.fingerprinted: set = set()
+        self.built = False
+
+    def build(self) -> int:
+        """(Re)load and compress every file; returns how many were loaded"""
+        assets, urls, fingerprinted = {}, {}, set()
+        for root, _, files in os.walk(self.directory):
+            for filename in files:
+                path = os.path.join(root, filename)
+                name = os.path.relpath(path, self.directory).replace(os.sep, "/")
+                with open(path, "rb") as f:
+                    content = f.read()
+                digest = hashlib.sha256(content).hexdigest()[:12]
+                variants = {"identity": content}
+                compressed = {"gzip": gzip.compress(content, 9, mtime=0)}
+                if brotli is not None:
+                    compressed["br"] = brotli.compress(content, quality=11)
+                for coding, data in compressed.items():
+                    if len(data) < len(content):
+                        variants[coding] = data
+                media_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+                asset = Asset(media_type, digest, variants)
+
+                stem, ext = os.path.splitext(name)
+                hashed = f"{stem}.{digest}{ext}"
+                assets[name] = assets[hashed] = asset
+                urls[name] = f"/static/{hashed}"
+                fingerprinted.add(hashed)
+        self.assets, self.urls, self.fingerprinted = assets, urls, fingerprinted
+        self.built = True
+        return len(urls)
+
+    def url(self, name: str) -> str:
+        """Fingerprinted URL for a static file (the plain URL if unknown)"""
+        if not self.built:
+            self.build()
+        return self.urls.get(name, f"/static/{name}")
+
+    def response(self, name: str, method: str, headers) -> Response:
+        if not self.built:
+            self.build()
+        if method not in ("GET", "HEAD"):
+            return PlainTextResponse("Method Not Allowed", status_code=405)
+        asset: Optional[Asset] = self.assets.get(name)
+        if asset is None:
+            return PlainTextResponse("Not Found", status_code=404)
+
+        accepted = accepted_encodings(headers.get("accept-encoding", ""))
+        coding = next((c for c in ENCODINGS if c in accepted and c in asset.variants), "identity")
+        etag = f'"{asset.etag}"' if coding == "identity" else f'"{asset.etag}-{coding}"'
+        response_headers = {
+            "ETag": etag,
+            "Cache-Control": IMMUTABLE if name in self.fingerprinted
+            else f"public, max-age={settings.STATIC_MAX_AGE}",
+        }
+        if len(asset.variants) > 1:
+            response_headers["Vary"] = "Accept-Encoding"
+        if coding != "identity":
+            response_headers["Content-Encoding"] = coding
+
+        if etag_matches(headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=response_headers)
+
+        body = asset.variants[coding]
+        if method == "HEAD":
+            response = Response(status_code=200, headers=response_headers, media_type=asset.media_type)
+            response.headers["Content-Length"] = str(len(body))
+            return response
+        return Response(body, headers=response_headers, media_type=asset.media_type)
+
+    async def __call__(self, scope, receive, send):
+        """ASGI entry point, mounted at /static"""
+        path = scope["path"]
+        root_path = scope.get("root_path", "")
+        if root_path and path.startswith(root_path):
+            path = path[len(root_path):]
+        response = self.response(path.lstrip("/"), scope["method"], Headers(scope=scope))
+        await response(scope, receive, send)
+
+
+static_assets = StaticAssets()
@@ -1,5 +1,67 @@
-from jinja2 import Environment, FileSystemLoader
+import os
+from functools import lru_cache
+from typing import AsyncIterator
 
-def get_templates():
-    """Get Jinja2 templates environment"""
-    return Environment(loader=FileSystemLoader("app/templates"))
+from fastapi.responses import StreamingResponse
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
+
+from app.settings import settings
+from app.static_assets import static_assets
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates")
+
+# Bytes of rendered HTML sent per chunk when streaming a template
+STREAM_CHUNK_SIZE = 16384
+
+
+@lru_cache(maxsize=None)
+def get_templates() -> Environment:
+    """The process-wide Jinja2 environment.
+
+    Every router shares it, so each template is compiled once per worker.
+    Compiled code is also kept in an on-disk bytecode cache, which lets a new
+    worker skip the Jinja compiler entirely. Templates render with
+    ``render_async``; ``auto_reload`` (stat the file on every lookup) is off
+    unless ``TEMPLATE_AUTO_RELOAD`` is set for development.
+    """
+    bytecode_cache = None
+    if settings.TEMPLATE_BYTECODE_CACHE:
+        cache_dir = settings.TEMPLATE_BYTECODE_CACHE_DIR or None
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+        bytecode_cache = FileSystemBytecodeCache(cache_dir)
+    env = Environment(
+        loader=FileSystemLoader(TEMPLATE_DIR),
+        bytecode_cache=bytecode_cache,
+        auto_reload=settings.TEMPLATE_AUTO_RELOAD,
+        enable_async=True,
+    )
+    env.globals["static_url"] = static_assets.url
+    return env
+
+
+def precompile_templates() -> int:
+    """Load every template into the environment cache; returns how many"""
+    env = get_templates()
+    names = env.list_templates(extensions=["html"])
+    for name in names:
+        env.get_template(name)
+    return len(names)
+
+
+async def _chunks(template, context: dict) -> AsyncIterator[str]:
+    buffer, size = [], 0
+    async for piece in template.generate_async(**context):
+        buffer.append(piece)
+        size += len(piece)
+        if size >= STREAM_CHUNK_SIZE:
+            yield "".join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield "".join(buffer)
+
+
+def stream_template(name: str, **context) -> StreamingResponse:
+    """Stream a large page in chunks, yielding to the event loop between them"""
+    template = get_templates().get_template(name)
+    return StreamingResponse(_chunks(template, context), media_type="text/html")
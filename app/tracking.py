@@ -0,0 +1,85 @@
+import hashlib
+from functools import lru_cache
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from fastapi import Request
+
+
+def add_utm_params(url: str, utm_source: str, utm_medium: str, utm_campaign: str) -> str:
+    """Append UTM parameters to a URL without overwriting existing query parameters"""
+    parts = urlsplit(url)
+    query = parse_qsl(parts.query, keep_blank_values=True)
+    existing = {key for key, _ in query}
+    for key, value in (('utm_source', utm_source), ('utm_medium', utm_medium), ('utm_campaign', utm_campaign)):
+        if key not in existing:
+            query.append((key, value))
+    return urlunsplit((parts.scheme, parts.netloc, parts.path, urlencode(query), parts.fragment))
+
+
+# Referer host suffix -> SourceType value. Matched on whole labels, so
+# "old.reddit.com" hits "reddit.com" but "notreddit.com" does not.
+SOURCE_HOSTS = {
+    'twitter.com': 'x',
+    'x.com': 'x',
+    't.co': 'x',
+    'linkedin.com': 'linkedin',
+    'lnkd.in': 'linkedin',
+    'reddit.com': 'reddit',
+    'redd.it': 'reddit',
+}
+
+# Lower-cased utm_source value -> SourceType value
+UTM_SOURCE_ALIASES = {
+    'x': 'x',
+    'twitter': 'x',
+    'tw': 'x',
+    'linkedin': 'linkedin',
+    'li': 'linkedin',
+    'reddit': 'reddit',
+}
+
+
+@lru_cache(maxsize=4096)
+def classify_host(host: str) -> str:
+    """SourceType value for a referer hostname"""
+    labels = host.lower().rstrip('.').split('.')
+    for i in range(len(labels) - 1):
+        source = SOURCE_HOSTS.get('.'.join(labels[i:]))
+        if source:
+            return source
+    return 'other'
+
+
+def classify_source(utm_source: str | None, referer: str | None) -> str:
+    """Normalized traffic source (a SourceType value) for an event.
+
+    The UTM source wins when it names a known network; otherwise the referer
+    host decides.
+    """
+    if utm_source:
+        source = UTM_SOURCE_ALIASES.get(utm_source.strip().lower())
+        if source:
+            return source
+    if referer:
+        try:
+            host = urlsplit(referer).hostname
+        except ValueError:
+            host = None
+        if host:
+            return classify_host(host)
+    return 'other'
+
+
+def hash_value(value: str | None) -> str | None:
+    """SHA-256 a visitor identifier so no raw PII is stored"""
+    if not value:
+        return None
+    return hashlib.sha256(value.encode('utf-8')).hexdigest()
+
+
+def client_ip(request: Request) -> str | None:
+    """Visitor IP, preferring the address set by the nginx proxy"""
+    ip = request.headers.get('x-real-ip')
+    if ip:
+        return ip
+    return request.client.host if request.client else None
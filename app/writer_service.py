@@ -0,0 +1,129 @@
+"""Single event writer process for multi-worker deployments.
+
+Run one per database file next to gunicorn, with the same
+EVENT_WRITER_SOCKET in both environments:
+
+    EVENT_WRITER_SOCKET=/run/engagemeter/writer.sock python -m app.writer_service
+
+Every worker then forwards its event batches here (ForwardingEventWriter)
+and this process is the only one writing events, so workers stop competing
+for the SQLite write lock and rows are committed in large transactions.
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import signal
+from typing import Optional
+
+from app.db import init_db
+from app.event_writer import EventWriter, decode_batch
+from app.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Seconds stop() waits for connected workers to hang up before cutting them off
+DRAIN_TIMEOUT = 5.0
+
+
+class EventWriterService:
+    """Unix socket server feeding one EventWriter.
+
+    Each connection carries newline-terminated frames from encode_batch.
+    Frames are queued as they arrive and the writer commits up to
+    ``batch_size`` rows per transaction. A malformed frame is logged,
+    counted and skipped; the connection stays open.
+    """
+
+    def __init__(self, socket_path: Optional[str] = None, db_path: Optional[str] = None,
+                 batch_size: Optional[int] = None, max_queue_size: Optional[int] = None):
+        self.socket_path = socket_path or settings.EVENT_WRITER_SOCKET
+        self.writer = EventWriter(
+            db_path,
+            batch_size=batch_size or settings.EVENT_WRITER_SERVICE_BATCH_SIZE,
+            max_queue_size=max_queue_size or settings.EVENT_WRITER_SERVICE_QUEUE_SIZE,
+        )
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._handlers: set = set()
+        self.connections = 0
+        self.frames = 0
+        self.bad_frames = 0
+
+    async def start(self):
+        """Start the writer, then listen on the socket (replacing a stale one)"""
+        await self.writer.start()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        # A frame is a whole batch, well past the default 64 KiB line limit
+        self._server = await asyncio.start_unix_server(self._handle, self.socket_path, limit=2 ** 24)
+
+    async def stop(self):
+        """Stop accepting, drain open connections, then flush the writer"""
+        if self._server is not None:
+            self._server.close()
+            if self._handlers:
+                # Workers normally disconnect first; don't wait forever for one that hasn't
+                _, pending = await asyncio.wait(self._handlers, timeout=DRAIN_TIMEOUT)
+                for task in pending:
+                    task.cancel()
+                await asyncio.gather(*pending, return_exceptions=True)
+            await self._server.wait_closed()
+            self._server = None
+        await self.writer.stop()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._handlers.add(asyncio.current_task())
+        self.connections += 1
+        try:
+            while frame := await reader.readline():
+                try:
+                    rows = decode_batch(frame)
+                except ValueError:
+                    self.bad_frames += 1
+                    logger.warning("Skipping malformed event frame (%d bytes)", len(frame))
+                    continue
+                self.frames += 1
+                self.writer.enqueue_rows(rows)
+        except (ConnectionError, ValueError):  # ValueError: frame over the line limit
+            logger.warning("Event writer connection dropped", exc_info=True)
+        finally:
+            self._handlers.discard(asyncio.current_task())
+            writer.close()
+
+    def stats(self) -> dict:
+        return {
+            "socket": self.socket_path,
+            "connections": self.connections,
+            "frames": self.frames,
+            "bad_frames": self.bad_frames,
+            "writer": self.writer.stats(),
+        }
+
+
+async def serve(socket_path: Optional[str] = None):
+    """Run the service until SIGINT or SIGTERM"""
+    await init_db()
+    service = EventWriterService(socket_path)
+    await service.start()
+    logger.info("Event writer listening on %s", service.socket_path)
+
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stopping.set)
+    await stopping.wait()
+    await service.stop()
+    logger.info("Event writer stopped: %s", service.stats())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Single event writer process")
+    parser.add_argument("--socket", default=None, help="Unix socket path (default: EVENT_WRITER_SOCKET)")
+    args = parser.parse_args()
+    if not (args.socket or settings.EVENT_WRITER_SOCKET):
+        parser.error("set EVENT_WRITER_SOCKET or pass --socket")
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(serve(args.socket))
@@ -0,0 +1,118 @@
+"""Shared helpers for the benchmark scripts.
+
+Benchmarks run fully in-process against a throwaway SQLite file, so they work
+offline on a single box: ``python -m benchmarks.<name> --help``.
+"""
+
+import asyncio
+import os
+import tempfile
+import time
+
+from app.db import connect, create_site, create_tracked_link, create_user, init_db
+from app.models import UserCreate
+from app.settings import settings
+
+
+def use_temp_database() -> str:
+    """Point the app at a fresh database file and return its path"""
+    path = os.path.join(tempfile.mkdtemp(prefix="engagemeter-bench-"), "bench.db")
+    settings.DATABASE_PATH = path
+    return path
+
+
+def percentile(sorted_values: list[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+def summarize(latencies_ms: list[float], elapsed_s: float, errors: int = 0) -> dict:
+    """Throughput and latency percentiles for one workload"""
+    ordered = sorted(latencies_ms)
+    return {
+        "requests": len(ordered),
+        "errors": errors,
+        "elapsed_s": round(elapsed_s, 3),
+        "throughput_rps": round(len(ordered) / elapsed_s, 1) if elapsed_s else 0.0,
+        "p50_ms": round(percentile(ordered, 50), 3),
+        "p95_ms": round(percentile(ordered, 95), 3),
+        "p99_ms": round(percentile(ordered, 99), 3),
+        "max_ms": round(ordered[-1], 3) if ordered else 0.0,
+    }
+
+
+async def run_closed_loop(request, total: int, concurrency: int) -> tuple[list[float], float, int]:
+    """Run ``total`` calls of ``request()`` from ``concurrency`` workers.
+
+    ``request`` returns True on success. Returns per-call latencies in ms,
+    wall time in seconds and the number of failed calls.
+    """
+    latencies: list[float] = []
+    errors = 0
+    remaining = total
+
+    async def worker():
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            started = time.perf_counter()
+            ok = await request()
+            latencies.append((time.perf_counter() - started) * 1000)
+            if not ok:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, time.perf_counter() - started, errors
+
+
+async def run_open_loop(request, total: int, rate: float) -> tuple[list[float], float, int]:
+    """Start ``total`` calls of ``request()`` at a fixed ``rate`` per second.
+
+    Arrivals do not wait for earlier calls to finish, and each latency is
+    measured from the call's scheduled start, so a stalled server shows up
+    as queueing delay rather than as fewer requests (no coordinated
+    omission). Returns the same tuple as run_closed_loop.
+    """
+    latencies: list[float] = []
+    errors = 0
+
+    async def call(scheduled: float):
+        nonlocal errors
+        ok = await request()
+        latencies.append((time.perf_counter() - scheduled) * 1000)
+        if not ok:
+            errors += 1
+
+    started = time.perf_counter()
+    tasks = []
+    for i in range(total):
+        scheduled = started + i / rate
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(call(scheduled)))
+    await asyncio.gather(*tasks)
+    return latencies, time.perf_counter() - started, errors
+
+
+async def seed_database(sites: int = 5, links_per_site: int = 20) -> dict:
+    """Create one user with some sites and tracked links"""
+    await init_db()
+    db = await connect()
+    user = await create_user(db, UserCreate(email="bench@example.com", username="bench",
+                                            password="benchmark"), "not-a-real-hash")
+    site_ids, short_codes = [], []
+    for s in range(sites):
+        site = await create_site(db, user.id, f"site{s}.example.com")
+        site_ids.append(site.id)
+        for n in range(links_per_site):
+            code = f"b{s:02d}{n:04d}"
+            await create_tracked_link(db, user.id, site.id, f"https://site{s}.example.com/p/{n}",
+                                      "x", code, "x")
+            short_codes.append(code)
+    await db.close()
+    return {"user": user, "site_ids": site_ids, "short_codes": short_codes}
@@ -0,0 +1,79 @@
+"""Creating ``--links`` tracked links: one at a time vs one CSV import.
+
+``single`` does what create_link_route does per link (site ownership
+query, short code, INSERT, commit). ``bulk`` feeds the same rows as CSV
+lines to import_links: one sites query, short codes checked in one
+query, one executemany transaction. Each mode runs on a fresh database.
+
+    python -m benchmarks.bench_bulk_links
+    python -m benchmarks.bench_bulk_links --links 20000
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+from benchmarks._common import use_temp_database
+
+
+async def fresh_user(db):
+    from app.db import create_site, create_user
+    from app.models import UserCreate
+
+    user = await create_user(db, UserCreate(email="bench@example.com", username="bench",
+                                            password="benchmark"), "hash")
+    site = await create_site(db, user.id, "example.com")
+    return user, site
+
+
+async def single(db, user, site, count: int):
+    from app.db import create_tracked_link, get_site_by_id
+    from app.short_codes import short_code_allocator
+
+    for i in range(count):
+        await get_site_by_id(db, site.id, user.id)
+        short_code, = await short_code_allocator.allocate(db)
+        await create_tracked_link(db, user.id, site.id, f"https://example.com/post/{i}", "x",
+                                  short_code, "x", "social", "bench")
+
+
+async def bulk(db, user, site, count: int):
+    from app.link_import import import_links
+
+    lines = ["url,source,campaign\n"] + [f"https://example.com/post/{i},x,bench\n" for i in range(count)]
+    report = await import_links(db, user.id, lines, max_rows=count)
+    assert len(report.links) == count and not report.errors
+
+
+async def run_mode(mode: str, count: int) -> dict:
+    from app.db import connect, init_db
+    from app.short_codes import short_code_allocator
+
+    use_temp_database()
+    await init_db()
+    short_code_allocator.reset()
+    db = await connect()
+    try:
+        user, site = await fresh_user(db)
+        started = time.perf_counter()
+        await (single if mode == "single" else bulk)(db, user, site, count)
+        elapsed = time.perf_counter() - started
+    finally:
+        await db.close()
+    return {
+        "mode": mode,
+        "links": count,
+        "elapsed_s": round(elapsed, 3),
+        "links_per_s": round(count / elapsed, 1),
+    }
+
+
+async def main(args) -> list[dict]:
+    return [await run_mode(mode, args.links) for mode in ("single", "bulk")]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--links", type=int, default=5000)
+    print(json.dumps(asyncio.run(main(parser.parse_args())), indent=2))
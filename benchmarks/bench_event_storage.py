@@ -0,0 +1,166 @@
+"""Event storage benchmark: legacy UUID/ISO rows vs the compact format.
+
+Builds a database in the old events layout (TEXT UUID primary key, ISO-8601
+timestamps, UUID foreign keys), measures it, runs the online migration and
+measures again. Reported per layout: file size after VACUUM, bytes per table
+and index from ``dbstat``, and the time of a 24h traffic-by-source query run
+against the raw events of every site (for the compact format, over the day
+partitions the window touches).
+
+    python -m benchmarks.bench_event_storage --events 200000
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sqlite3
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from benchmarks._common import percentile, use_temp_database
+
+LEGACY_SCHEMA = (
+    '''
+    CREATE TABLE events (
+        id TEXT PRIMARY KEY,
+        tracked_link_id TEXT,
+        site_id TEXT NOT NULL,
+        user_id TEXT NOT NULL,
+        kind TEXT NOT NULL CHECK (kind IN ('click', 'pageview')),
+        ts TEXT NOT NULL,
+        ip_hash TEXT,
+        ua_hash TEXT,
+        referer TEXT,
+        utm_source TEXT,
+        utm_medium TEXT,
+        utm_campaign TEXT,
+        country TEXT,
+        path TEXT,
+        session_id TEXT,
+        source TEXT
+    )
+    ''',
+    'CREATE INDEX idx_events_ts ON events(ts)',
+    'CREATE INDEX idx_events_site_id ON events(site_id)',
+    'CREATE INDEX idx_events_tracked_link_id ON events(tracked_link_id)',
+)
+
+LEGACY_QUERY = '''
+    SELECT strftime('%H', ts) AS hour, source, COUNT(*)
+    FROM events
+    WHERE site_id = ? AND kind = 'pageview' AND ts >= ?
+    GROUP BY hour, source
+'''
+
+COMPACT_QUERY = '''
+    SELECT ts / 3600000 % 24 AS hour, source, COUNT(*)
+    FROM {table}
+    WHERE site_key = (SELECT id FROM entity_keys WHERE uuid = ?) AND kind = 'pageview' AND ts >= ?
+    GROUP BY hour, source
+'''
+
+EVENT_TABLES = "name = 'events' OR name GLOB 'events_[0-9]*'"
+
+REFERERS = ["https://t.co/abc", "https://www.reddit.com/r/python/", "https://www.linkedin.com/feed/",
+            "https://news.ycombinator.com/", None]
+
+
+def build_legacy_database(path: str, events: int, sites: int, links_per_site: int, days: int) -> list[str]:
+    """Write ``events`` rows in the legacy layout; returns the site ids"""
+    rng = random.Random(42)
+    user_id = str(uuid.uuid4())
+    site_ids = [str(uuid.uuid4()) for _ in range(sites)]
+    link_ids = {site: [str(uuid.uuid4()) for _ in range(links_per_site)] for site in site_ids}
+    now = datetime.now(timezone.utc)
+    hashes = [uuid.uuid4().hex * 2 for _ in range(1000)]
+
+    def rows():
+        for _ in range(events):
+            site = rng.choice(site_ids)
+            click = rng.random() < 0.2
+            referer = rng.choice(REFERERS)
+            ts = now - timedelta(seconds=rng.randrange(days * 86400))
+            yield (str(uuid.uuid4()), rng.choice(link_ids[site]) if click else None, site, user_id,
+                   "click" if click else "pageview", ts.isoformat(), rng.choice(hashes),
+                   rng.choice(hashes), referer, None, None, None, None,
+                   f"/posts/{rng.randrange(500)}", None,
+                   {"https://t.co/abc": "x", "https://www.reddit.com/r/python/": "reddit",
+                    "https://www.linkedin.com/feed/": "linkedin"}.get(referer, "other"))
+
+    with sqlite3.connect(path) as conn:
+        for statement in LEGACY_SCHEMA:
+            conn.execute(statement)
+        conn.executemany('INSERT INTO events VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', rows())
+    return site_ids
+
+
+def measure(path: str, queries: list[str], site_ids: list[str], since, repeat: int) -> dict:
+    """File size, per-object sizes and query latency for the events table(s)"""
+    with sqlite3.connect(path) as conn:
+        conn.execute('VACUUM')
+        conn.execute('ANALYZE')
+        tables = {name for name, in conn.execute(f"SELECT name FROM sqlite_master WHERE {EVENT_TABLES}")}
+        sizes = dict(conn.execute(f'''
+            SELECT name, SUM(pgsize) FROM dbstat
+            WHERE {EVENT_TABLES} OR name LIKE 'idx_events%' OR name LIKE 'sqlite_autoindex_events%'
+            GROUP BY name ORDER BY name
+        '''))
+        latencies = []
+        for _ in range(repeat):
+            for site in site_ids:
+                started = time.perf_counter()
+                for query in queries:
+                    conn.execute(query, (site, since)).fetchall()
+                latencies.append((time.perf_counter() - started) * 1000)
+    latencies.sort()
+    return {
+        "file_bytes": os.path.getsize(path),
+        "table_bytes": sum(sizes.pop(name, 0) for name in tables),
+        "index_bytes": sum(sizes.values()),
+        "indexes": sizes,
+        "query_p50_ms": round(percentile(latencies, 50), 3),
+        "query_p95_ms": round(percentile(latencies, 95), 3),
+    }
+
+
+async def main(args) -> dict:
+    path = use_temp_database()
+    site_ids = build_legacy_database(path, args.events, args.sites, args.links_per_site, args.days)
+    since = datetime.now(timezone.utc) - timedelta(hours=24)
+    before = measure(path, [LEGACY_QUERY], site_ids, since.isoformat(), args.repeat)
+
+    from app.db import connect, init_db, list_event_partitions, migrate_legacy_events
+
+    await init_db()
+    db = await connect()
+    started = time.perf_counter()
+    moved = await migrate_legacy_events(db)
+    migration_s = time.perf_counter() - started
+    since_ms = int(since.timestamp() * 1000)
+    partitions = await list_event_partitions(db, since_ms)
+    await db.close()
+
+    queries = [COMPACT_QUERY.format(table=name) for name in partitions]
+    after = measure(path, queries, site_ids, since_ms, args.repeat)
+    return {
+        "events": args.events,
+        "migrated": moved,
+        "migration_s": round(migration_s, 3),
+        "legacy": before,
+        "compact": after,
+        "file_ratio": round(after["file_bytes"] / before["file_bytes"], 3),
+        "index_ratio": round(after["index_bytes"] / before["index_bytes"], 3),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--events", type=int, default=100000)
+    parser.add_argument("--sites", type=int, default=10)
+    parser.add_argument("--links-per-site", type=int, default=20)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--repeat", type=int, default=20)
+    print(json.dumps(asyncio.run(main(parser.parse_args())), indent=2))
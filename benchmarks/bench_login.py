@@ -0,0 +1,111 @@
+"""Redirect latency during a login storm.
+
+Measures GET /{short_code} latency at concurrency 1 for ``--seconds`` each:
+with no logins, while ``--logins`` clients hammer POST /auth/login with
+bcrypt run inline on the event loop (the old behaviour), and with bcrypt on
+the password pool. Offloaded, redirect p99 should stay near the baseline and
+excess logins should come back as fast 503s instead of queueing.
+
+``--simulated-hash-ms`` swaps bcrypt for a sleep of that length, which
+like bcrypt releases the GIL; use it where passlib and bcrypt disagree.
+
+    python -m benchmarks.bench_login --logins 32
+    python -m benchmarks.bench_login --simulated-hash-ms 80
+"""
+
+import argparse
+import asyncio
+import collections
+import json
+import random
+import time
+
+import httpx
+
+from benchmarks._common import seed_database, summarize, use_temp_database
+
+PASSWORD = "benchmark"
+
+
+async def measure(client, codes, seconds: float, logins: int) -> dict:
+    """Redirect latency for ``seconds`` while ``logins`` clients log in back to back"""
+    statuses = collections.Counter()
+    stop = asyncio.Event()
+
+    async def login_client():
+        while not stop.is_set():
+            response = await client.post("/auth/login", data={"email": "bench@example.com",
+                                                              "password": PASSWORD})
+            statuses[response.status_code] += 1
+
+    storm = [asyncio.create_task(login_client()) for _ in range(logins)]
+    latencies, errors = [], 0
+    started = time.perf_counter()
+    while time.perf_counter() - started < seconds:
+        sent = time.perf_counter()
+        response = await client.get(f"/{random.choice(codes)}")
+        latencies.append((time.perf_counter() - sent) * 1000)
+        errors += response.status_code != 302
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await asyncio.gather(*storm)
+    result = summarize(latencies, elapsed, errors)
+    result["login_statuses"] = dict(statuses)
+    return result
+
+
+async def main(args) -> dict:
+    use_temp_database()
+    seeded = await seed_database()
+
+    from app import auth
+    from app.db import close_pools, db_pool
+    from app.event_writer import event_writer
+    from app.main import app
+    from app.passwords import password_executor
+
+    if args.simulated_hash_ms:
+        def verify(plain_password, hashed_password):
+            time.sleep(args.simulated_hash_ms / 1000)
+            return plain_password == PASSWORD
+        auth.verify_password = verify
+    else:
+        async with db_pool.acquire() as db:
+            await db.execute("UPDATE users SET hashed_password = ?", (auth.hash_password(PASSWORD),))
+            await db.commit()
+
+    offloaded = auth.verify_password_async
+
+    async def inline(plain_password, hashed_password):
+        return auth.verify_password(plain_password, hashed_password)
+
+    codes = seeded["short_codes"]
+    await event_writer.start()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for code in codes:
+            await client.get(f"/{code}")
+        baseline = await measure(client, codes, args.seconds, 0)
+        auth.verify_password_async = inline
+        blocking = await measure(client, codes, args.seconds, args.logins)
+        auth.verify_password_async = offloaded
+        pooled = await measure(client, codes, args.seconds, args.logins)
+    await event_writer.stop()
+    await close_pools()
+    password_executor.shutdown()
+
+    return {
+        "logins": args.logins,
+        "baseline": baseline,
+        "bcrypt_on_event_loop": blocking,
+        "bcrypt_on_password_pool": pooled,
+        "password_pool": password_executor.stats(),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=3)
+    parser.add_argument("--logins", type=int, default=32)
+    parser.add_argument("--simulated-hash-ms", type=float, default=0)
+    print(json.dumps(asyncio.run(main(parser.parse_args())), indent=2))
@@ -0,0 +1,78 @@
+"""Redirect latency benchmark for GET /{short_code}.
+
+Drives the redirect route in-process through httpx's ASGI transport with the
+event writer running, so click recording is part of the measured work. The
+target is a p99 under REDIRECT_P99_TARGET_MS with a warm link cache at
+concurrency 1, i.e. per-request service time on one worker; the script exits
+non-zero when it is missed. At higher concurrency the in-process client and
+server share one event loop, so latency grows with queueing and throughput
+is the number to watch.
+
+``--write-delay-ms`` slows every batch write down to simulate a busy disk.
+Redirect latency should not move, because clicks are queued after the
+response is sent and written by the background flush loop.
+
+    python -m benchmarks.bench_redirect --requests 20000
+    python -m benchmarks.bench_redirect --write-delay-ms 200
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+
+import httpx
+
+from benchmarks._common import run_closed_loop, seed_database, summarize, use_temp_database
+
+REDIRECT_P99_TARGET_MS = 5.0
+
+
+async def main(args) -> dict:
+    use_temp_database()
+    seeded = await seed_database()
+
+    from app import event_writer as writer_module
+    from app.db import close_pools
+    from app.main import app
+
+    if args.write_delay_ms:
+        real_create_events = writer_module.create_events
+
+        async def slow_create_events(db, rows):
+            await asyncio.sleep(args.write_delay_ms / 1000)
+            return await real_create_events(db, rows)
+
+        writer_module.create_events = slow_create_events
+
+    codes = seeded["short_codes"]
+    transport = httpx.ASGITransport(app=app)
+    await writer_module.event_writer.start()
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def request():
+            response = await client.get(f"/{random.choice(codes)}")
+            return response.status_code == 302
+
+        # Warm the link cache, then measure
+        for code in codes:
+            await client.get(f"/{code}")
+        latencies, elapsed, errors = await run_closed_loop(request, args.requests, args.concurrency)
+    await writer_module.event_writer.stop()
+    await close_pools()
+
+    result = summarize(latencies, elapsed, errors)
+    result["write_delay_ms"] = args.write_delay_ms
+    result["clicks_written"] = writer_module.event_writer.stats()["flushed"]
+    result["p99_target_ms"] = REDIRECT_P99_TARGET_MS
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--write-delay-ms", type=float, default=0)
+    result = asyncio.run(main(parser.parse_args()))
+    print(json.dumps(result, indent=2))
+    sys.exit(0 if result["p99_ms"] <= REDIRECT_P99_TARGET_MS and not result["errors"] else 1)
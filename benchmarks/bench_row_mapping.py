@@ -0,0 +1,155 @@
+"""Row-to-model mapping cost per 10k rows.
+
+For users, sites and tracked links, turns ``--rows`` real SQLite rows into
+models three ways: validated pydantic construction from named columns (how
+app/db.py used to map rows), ``model_construct``, and the RowMapper the
+query functions use now. A second section times get_user_tracked_links
+end to end for a user with ``--rows`` links, against the same query mapped
+the old way (``async for`` plus validation per row).
+
+    python -m benchmarks.bench_row_mapping
+    python -m benchmarks.bench_row_mapping --rows 50000 --repeat 10
+"""
+
+import argparse
+import asyncio
+import json
+import sqlite3
+import time
+from datetime import datetime
+
+from benchmarks._common import use_temp_database
+
+PER_ROWS = 10_000
+
+
+def named_values(model, row) -> dict:
+    """Field values looked up by column name, converted to field types"""
+    from app.models import SourceType
+
+    values = {name: row[name] for name in model.model_fields}
+    values["created_at"] = datetime.fromisoformat(values["created_at"])
+    values["is_active"] = bool(values["is_active"])
+    if "source" in values:
+        values["source"] = SourceType(values["source"])
+    return values
+
+
+def validated(model):
+    return lambda row: model(**named_values(model, row))
+
+
+def constructed(model):
+    return lambda row: model.model_construct(**named_values(model, row))
+
+
+def time_ms(fn, repeat: int) -> float:
+    """Best-of-``repeat`` wall time of fn() in milliseconds"""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, (time.perf_counter() - started) * 1000)
+    return best
+
+
+def mapping_costs(rows: int, repeat: int) -> dict:
+    from app.db import SITE_ROWS, TRACKED_LINK_ROWS, USER_ROWS
+
+    created = "2025-03-01T12:00:00+00:00"
+    samples = {
+        USER_ROWS: ("user-id", "bench@example.com", "bench", "hash", created, 1),
+        SITE_ROWS: ("site-id", "user-id", "example.com", created, 1),
+        TRACKED_LINK_ROWS: ("link-id", "user-id", "site-id", "https://example.com/post", "x", "abc123",
+                            "x", "social", "link_tracking", created, 1),
+    }
+    conn = sqlite3.connect(":memory:")
+    conn.row_factory = sqlite3.Row
+    results = {}
+    for mapper, sample in samples.items():
+        table = mapper.model.__name__.lower()
+        conn.execute(f"CREATE TABLE {table} ({mapper.select})")
+        conn.executemany(f"INSERT INTO {table} VALUES ({', '.join('?' * len(sample))})", [sample] * rows)
+        fetched = conn.execute(f"SELECT {mapper.select} FROM {table}").fetchall()
+
+        ways = {
+            "validated": validated(mapper.model),
+            "model_construct": constructed(mapper.model),
+            "row_mapper": mapper,
+        }
+        costs = {name: time_ms(lambda: [build(row) for row in fetched], repeat) * PER_ROWS / rows
+                 for name, build in ways.items()}
+        results[mapper.model.__name__] = {
+            **{f"{name}_ms_per_10k": round(ms, 2) for name, ms in costs.items()},
+            "speedup_vs_validated": round(costs["validated"] / costs["row_mapper"], 2),
+        }
+    return results
+
+
+async def query_costs(rows: int, repeat: int) -> dict:
+    from app.db import (TRACKED_LINK_ROWS, connect, create_site, create_user, get_user_tracked_links,
+                        init_db)
+    from app.models import TrackedLink, UserCreate
+
+    use_temp_database()
+    await init_db()
+    db = await connect()
+    try:
+        user = await create_user(db, UserCreate(email="bench@example.com", username="bench",
+                                                password="benchmark"), "hash")
+        site = await create_site(db, user.id, "example.com")
+        now = datetime.now().isoformat()
+        await db.executemany('''
+            INSERT INTO tracked_links (id, user_id, site_id, original_url, source, short_code,
+                                       utm_source, utm_medium, utm_campaign, created_at, is_active)
+            VALUES (?, ?, ?, ?, 'x', ?, 'x', 'social', 'link_tracking', ?, 1)
+        ''', [(f"link-{i}", user.id, site.id, f"https://example.com/{i}", f"c{i:07d}", now)
+              for i in range(rows)])
+        await db.commit()
+
+        build = validated(TrackedLink)
+
+        async def old_way():
+            links = []
+            async with db.execute(f'''
+                SELECT {TRACKED_LINK_ROWS.select} FROM tracked_links WHERE user_id = ? AND is_active = 1
+                ORDER BY created_at DESC
+            ''', (user.id,)) as cursor:
+                async for row in cursor:
+                    links.append(build(row))
+            return links
+
+        async def timed(fn) -> float:
+            best = float("inf")
+            for _ in range(repeat):
+                started = time.perf_counter()
+                await fn()
+                best = min(best, (time.perf_counter() - started) * 1000)
+            return best * PER_ROWS / rows
+
+        before = await timed(old_way)
+        after = await timed(lambda: get_user_tracked_links(db, user.id))
+    finally:
+        await db.close()
+    return {
+        "get_user_tracked_links": {
+            "validated_async_for_ms_per_10k": round(before, 2),
+            "row_mapper_fetchall_ms_per_10k": round(after, 2),
+            "speedup": round(before / after, 2),
+        }
+    }
+
+
+async def main(args) -> dict:
+    return {
+        "rows": args.rows,
+        "mapping": mapping_costs(args.rows, args.repeat),
+        "query": await query_costs(args.rows, args.repeat),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=PER_ROWS)
+    parser.add_argument("--repeat", type=int, default=5)
+    print(json.dumps(asyncio.run(main(parser.parse_args())), indent=2))
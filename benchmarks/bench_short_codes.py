@@ -0,0 +1,120 @@
+"""Short-code allocation throughput with millions of codes already taken.
+
+Seeds ``--existing`` tracked links, then times three ways of getting
+``--codes`` new unique codes:
+
+* ``random_lookup``: a random 6-character code plus a lookup per code,
+  redrawn on a hit (what a collision-checked random generator costs)
+* ``allocator_single``: ShortCodeAllocator.allocate(db) one code at a time,
+  as create_link_route does
+* ``allocator_batch``: one allocate(db, count) call, as the CSV import does
+
+The allocator rows also report how many counter blocks (database writes)
+they reserved.
+
+    python -m benchmarks.bench_short_codes
+    python -m benchmarks.bench_short_codes --existing 5000000 --codes 200000
+"""
+
+import argparse
+import asyncio
+import json
+import secrets
+import sqlite3
+import time
+
+from benchmarks._common import use_temp_database
+
+
+def seed(db_path: str, existing: int):
+    """``existing`` links whose codes come from the allocator's own sequence"""
+    from app.short_codes import Permutation
+
+    key = secrets.token_hex(16)
+    permutation = Permutation(6, bytes.fromhex(key))
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("INSERT INTO short_code_counters (length, next, perm_key) VALUES (6, ?, ?)",
+                     (existing, key))
+        for start in range(0, existing, 100_000):
+            conn.executemany('''
+                INSERT INTO tracked_links (id, user_id, site_id, original_url, source, short_code,
+                                           utm_source, created_at)
+                VALUES (?, 'user', 'site', 'https://example.com/', 'x', ?, 'x', '2025-01-01T00:00:00')
+            ''', [(f"link-{i}", permutation.code(i)) for i in range(start, min(start + 100_000, existing))])
+
+
+async def random_lookup(db, count: int) -> list[str]:
+    from app.short_codes import ALPHABET
+
+    codes = []
+    while len(codes) < count:
+        code = ''.join(secrets.choice(ALPHABET) for _ in range(6))
+        async with db.execute("SELECT 1 FROM tracked_links WHERE short_code = ?", (code,)) as cursor:
+            if await cursor.fetchone() is None:
+                codes.append(code)
+    return codes
+
+
+async def allocator_single(db, count: int) -> list[str]:
+    from app.short_codes import short_code_allocator
+
+    codes = []
+    for _ in range(count):
+        codes += await short_code_allocator.allocate(db)
+    return codes
+
+
+async def allocator_batch(db, count: int) -> list[str]:
+    from app.short_codes import short_code_allocator
+
+    return await short_code_allocator.allocate(db, count)
+
+
+async def main(args) -> dict:
+    from app.db import connect, init_db
+    from app.short_codes import short_code_allocator
+
+    db_path = use_temp_database()
+    await init_db()
+    started = time.perf_counter()
+    seed(db_path, args.existing)
+    seed_s = time.perf_counter() - started
+
+    db = await connect()
+    results = {}
+    try:
+        for name, fn in (("random_lookup", random_lookup), ("allocator_single", allocator_single),
+                         ("allocator_batch", allocator_batch)):
+            short_code_allocator.reset()
+            blocks = short_code_allocator.blocks
+            started = time.perf_counter()
+            codes = await fn(db, args.codes)
+            elapsed = time.perf_counter() - started
+            assert len(set(codes)) == args.codes
+            results[name] = {
+                "elapsed_s": round(elapsed, 3),
+                "codes_per_s": round(args.codes / elapsed, 1),
+                "us_per_code": round(elapsed / args.codes * 1e6, 2),
+            }
+            if name != "random_lookup":
+                results[name]["blocks_reserved"] = short_code_allocator.blocks - blocks
+        async with db.execute(f'''
+            SELECT COUNT(*) FROM tracked_links WHERE short_code IN ({','.join('?' * len(codes))})
+        ''', codes) as cursor:
+            taken = (await cursor.fetchone())[0]
+    finally:
+        await db.close()
+    return {
+        "existing": args.existing,
+        "codes": args.codes,
+        "seed_s": round(seed_s, 1),
+        "results": results,
+        "batch_codes_already_taken": taken,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--existing", type=int, default=2_000_000)
+    parser.add_argument("--codes", type=int, default=20_000)
+    print(json.dumps(asyncio.run(main(parser.parse_args())), indent=2))
@@ -0,0 +1,125 @@
+"""Event write throughput: per-worker writers vs one writer process.
+
+Starts N worker processes against one SQLite file, as gunicorn would. Each
+worker pushes ``--events`` events through its event writer as fast as its
+queue allows. In ``per-worker`` mode every worker commits its own batches
+and they compete for the write lock. In ``single`` mode they forward the
+batches over a Unix socket to an EventWriterService (running in this
+process), which is the only writer. Time runs from the moment every worker
+is ready until the last row is committed. Rows are counted afterwards, so
+dropped or failed events show up as a shortfall.
+
+    python -m benchmarks.bench_single_writer
+    python -m benchmarks.bench_single_writer --workers 1 4 8 --events 50000
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import sqlite3
+import time
+
+from benchmarks._common import use_temp_database
+
+MODES = ("per-worker", "single")
+
+
+def worker_process(mode: str, db_path: str, socket_path: str, events: int, ready, go, results):
+    from app.event_writer import EventWriter, ForwardingEventWriter
+    from app.settings import settings
+
+    settings.DATABASE_PATH = db_path
+
+    async def run():
+        writer = ForwardingEventWriter(socket_path) if mode == "single" else EventWriter()
+        await writer.start()
+        ready.put(os.getpid())
+        await asyncio.to_thread(go.wait)
+
+        chunk = [{"site_id": f"site-{os.getpid() % 5}", "user_id": "user-1", "kind": "pageview",
+                  "path": f"/p/{i}", "referer": "https://t.co/x"} for i in range(100)]
+        sent = 0
+        while sent < events:
+            n = min(len(chunk), events - sent)
+            if writer.queue_depth() + n > writer.max_queue_size:
+                await asyncio.sleep(0.001)
+                continue
+            sent += writer.enqueue_many(chunk[:n])
+            await asyncio.sleep(0)
+        await writer.stop()
+        results.put(writer.stats())
+
+    asyncio.run(run())
+
+
+def count_events(db_path: str) -> int:
+    from app.db import EVENT_PARTITION_GLOB
+
+    with sqlite3.connect(db_path) as conn:
+        partitions = [r[0] for r in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name GLOB ?", (EVENT_PARTITION_GLOB,))]
+        return sum(conn.execute(f"SELECT COUNT(*) FROM {name}").fetchone()[0] for name in partitions)
+
+
+async def run_config(mode: str, workers: int, events: int) -> dict:
+    from app.db import init_db
+    from app.writer_service import EventWriterService
+
+    db_path = use_temp_database()
+    socket_path = os.path.join(os.path.dirname(db_path), "writer.sock")
+    await init_db()
+
+    service = None
+    if mode == "single":
+        service = EventWriterService(socket_path)
+        await service.start()
+
+    ctx = multiprocessing.get_context("spawn")
+    ready, results, go = ctx.Queue(), ctx.Queue(), ctx.Event()
+    procs = [ctx.Process(target=worker_process, args=(mode, db_path, socket_path, events, ready, go, results))
+             for _ in range(workers)]
+    for p in procs:
+        p.start()
+    for _ in procs:
+        await asyncio.to_thread(ready.get)
+
+    started = time.perf_counter()
+    go.set()
+    stats = [await asyncio.to_thread(results.get) for _ in procs]
+    for p in procs:
+        await asyncio.to_thread(p.join)
+    if service is not None:
+        await service.stop()
+    elapsed = time.perf_counter() - started
+
+    written = count_events(db_path)
+    writer_stats = [service.stats()["writer"]] if service else stats
+    return {
+        "mode": mode,
+        "workers": workers,
+        "events": events * workers,
+        "written": written,
+        "elapsed_s": round(elapsed, 3),
+        "events_per_s": round(written / elapsed, 1) if elapsed else 0.0,
+        "transactions": sum(s["flush_count"] for s in writer_stats),
+        "busy_retries": sum(s["retries"] for s in stats + writer_stats),
+        "failed": sum(s["failed"] for s in stats + writer_stats),
+        "dropped": sum(s["dropped"] for s in stats + writer_stats),
+        "max_flush_ms": max(s["max_flush_ms"] for s in writer_stats),
+        "fallbacks": sum(s.get("fallbacks", 0) for s in stats),
+    }
+
+
+async def main(args) -> list[dict]:
+    return [await run_config(mode, workers, args.events)
+            for workers in args.workers for mode in args.modes]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--events", type=int, default=20000, help="events per worker")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    print(json.dumps(asyncio.run(main(parser.parse_args())), indent=2))
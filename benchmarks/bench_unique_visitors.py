@@ -0,0 +1,129 @@
+"""Unique visitors: exact COUNT(DISTINCT) over raw events vs merged sketches.
+
+Ingests ``--pageviews`` pageviews from ``--visitors`` distinct visitors,
+spread over ``--days`` days, through create_events in batches of
+``--batch`` (reporting how much of each batch's write is spent updating
+visitors_hourly), then answers "unique visitors in the last 24h / 7d / all
+days" two ways: an exact DISTINCT over the raw event partitions in range,
+and get_unique_visitors merging one stored sketch per hour. Each window
+reports both counts, the estimate's error and best-of-``--repeat`` times.
+
+    python -m benchmarks.bench_unique_visitors
+    python -m benchmarks.bench_unique_visitors --pageviews 1000000 --visitors 200000
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from benchmarks._common import use_temp_database
+
+HOUR_MS = 3_600_000
+
+
+async def timed_ms(fn, repeat: int) -> tuple[float, object]:
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = await fn()
+        best = min(best, (time.perf_counter() - started) * 1000)
+    return best, result
+
+
+async def exact_visitors(db, site_id: str, start_ms: int, end_ms: int) -> int:
+    """COUNT(DISTINCT) of (ip_hash, ua_hash) over the raw partitions in range"""
+    from app.db import list_event_partitions
+
+    async with db.execute('SELECT id FROM entity_keys WHERE uuid = ?', (site_id,)) as cursor:
+        site_key = (await cursor.fetchone())['id']
+    partitions = await list_event_partitions(db, start_ms, end_ms)
+    union = " UNION ".join(f'''
+        SELECT ip_hash, ua_hash FROM {name}
+        WHERE site_key = ? AND ts >= ? AND ts < ? AND kind = 'pageview'
+    ''' for name in partitions)
+    async with db.execute(f"SELECT COUNT(*) AS n FROM ({union})",
+                          [site_key, start_ms, end_ms] * len(partitions)) as cursor:
+        return (await cursor.fetchone())['n']
+
+
+async def main(args) -> dict:
+    import app.db as app_db
+    from app.db import connect, create_events, create_site, event_row, get_unique_visitors, init_db, now_ms
+
+    use_temp_database()
+    await init_db()
+    db = await connect()
+    try:
+        site = await create_site(db, "bench-user", "example.com")
+        rng = random.Random(1)
+        # Whole hours, so the sketch windows cover exactly the same events
+        end = now_ms() // HOUR_MS * HOUR_MS
+        start = end - args.days * 24 * HOUR_MS
+        rows = sorted((event_row({"site_id": site.id, "user_id": "bench-user", "kind": "pageview",
+                                  "ip_hash": f"ip{visitor}", "ua_hash": f"ua{visitor % 40}"},
+                                 rng.randrange(start, end))
+                       for visitor in (rng.randrange(args.visitors) for _ in range(args.pageviews))),
+                      key=lambda row: row.ts)
+
+        sketch_ms = 0.0
+        update_visitor_sketches = app_db.update_visitor_sketches
+
+        async def timed_update(db, batch):
+            nonlocal sketch_ms
+            started = time.perf_counter()
+            await update_visitor_sketches(db, batch)
+            sketch_ms += (time.perf_counter() - started) * 1000
+
+        app_db.update_visitor_sketches = timed_update
+        started = time.perf_counter()
+        try:
+            for i in range(0, len(rows), args.batch):
+                await create_events(db, rows[i:i + args.batch])
+        finally:
+            app_db.update_visitor_sketches = update_visitor_sketches
+        ingest_ms = (time.perf_counter() - started) * 1000
+        batches = -(-len(rows) // args.batch)
+
+        async with db.execute('SELECT COUNT(*) AS n, SUM(LENGTH(sketch)) AS size FROM visitors_hourly') as cursor:
+            stored = await cursor.fetchone()
+
+        windows = {}
+        for label, hours in (("24h", 24), ("7d", 7 * 24), (f"{args.days}d", args.days * 24)):
+            window_start = end - hours * HOUR_MS
+            exact_ms, exact = await timed_ms(lambda: exact_visitors(db, site.id, window_start, end), args.repeat)
+            sketch_query_ms, estimate = await timed_ms(
+                lambda: get_unique_visitors(db, site.id, window_start, end), args.repeat)
+            windows[label] = {
+                "exact": exact,
+                "estimate": estimate,
+                "error_pct": round((estimate - exact) / exact * 100, 2) if exact else 0.0,
+                "exact_distinct_ms": round(exact_ms, 2),
+                "sketch_merge_ms": round(sketch_query_ms, 2),
+                "speedup": round(exact_ms / sketch_query_ms, 1),
+            }
+    finally:
+        await db.close()
+    return {
+        "pageviews": args.pageviews,
+        "visitors": args.visitors,
+        "ingest": {
+            "batches": batches,
+            "ms_per_batch": round(ingest_ms / batches, 3),
+            "sketch_update_ms_per_batch": round(sketch_ms / batches, 3),
+            "sketch_share_pct": round(sketch_ms / ingest_ms * 100, 1),
+        },
+        "storage": {"sketches": stored["n"], "sketch_bytes": stored["size"]},
+        "windows": windows,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pageviews", type=int, default=200_000)
+    parser.add_argument("--visitors", type=int, default=50_000)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--batch", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=3)
+    print(json.dumps(asyncio.run(main(parser.parse_args())), indent=2))
@@ -0,0 +1,264 @@
+"""End-to-end load test for the redirect, ingest and dashboard paths.
+
+Seeds a throwaway database (one user, sites, tracked links and a day of
+events), then drives each workload in turn and reports throughput and
+p50/p95/p99 latency:
+
+* ``redirect``: GET /{short_code} for random seeded codes
+* ``ingest``: POST /v1/ingest beacon batches of ``--burst`` pageviews
+* ``dashboard``: a logged-in user polling the traffic API of random sites,
+  sending If-None-Match like the browser does (``--no-etags`` makes every
+  poll run the queries)
+
+By default the app runs in-process behind httpx's ASGI transport, where
+client and server share one event loop. ``--server`` starts uvicorn on
+localhost instead (``--server-workers`` processes), so requests go over
+real sockets. Load is closed-loop (``--concurrency`` clients, each sending
+its next request when the last one returns) or, with ``--rate``, open-loop
+at a fixed number of requests per second.
+
+Results are written as JSON (``--output``, by default
+benchmarks/results/loadtest-<commit>.json) with the commit and settings,
+so runs can be diffed; ``--compare OLD NEW`` prints the change per metric.
+Everything runs offline on one machine.
+
+    python -m benchmarks.loadtest
+    python -m benchmarks.loadtest --workloads redirect --concurrency 32
+    python -m benchmarks.loadtest --server --server-workers 4 --rate 500
+    python -m benchmarks.loadtest --compare old.json new.json
+"""
+
+import argparse
+import asyncio
+import collections
+import contextlib
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+import httpx
+
+from benchmarks._common import run_closed_loop, run_open_loop, seed_database, summarize, use_temp_database
+
+WORKLOADS = ("redirect", "ingest", "dashboard")
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+# Metrics shown by --compare, and whether a higher value is better
+COMPARED = {"throughput_rps": True, "p50_ms": False, "p95_ms": False, "p99_ms": False, "errors": False}
+
+
+async def seed(events: int) -> dict:
+    """Seed the temp database, including ``events`` pageviews over the last 24 hours"""
+    from app.db import connect, create_events, event_row, now_ms
+
+    seeded = await seed_database()
+    db = await connect()
+    try:
+        now = now_ms()
+        referers = ["https://t.co/x", "https://www.reddit.com/r/x", "https://www.linkedin.com/", None]
+        for start in range(0, events, 5000):
+            await create_events(db, [event_row({
+                "site_id": random.choice(seeded["site_ids"]),
+                "user_id": seeded["user"].id,
+                "kind": "pageview",
+                "path": f"/p/{random.randrange(500)}",
+                "referer": random.choice(referers),
+            }, now - random.randrange(86_400_000)) for _ in range(min(5000, events - start))])
+    finally:
+        await db.close()
+    return seeded
+
+
+def requests_for(workload: str, client: httpx.AsyncClient, seeded: dict, counts: collections.Counter, args):
+    """The request coroutine for one workload; returns True on success"""
+    if workload == "redirect":
+        codes = seeded["short_codes"]
+
+        async def redirect():
+            response = await client.get(f"/{random.choice(codes)}")
+            return response.status_code == 302
+        return redirect
+
+    if workload == "ingest":
+        async def ingest():
+            body = [{"site_id": random.choice(seeded["site_ids"]), "path": f"/p/{random.randrange(500)}",
+                     "referer": "https://t.co/x"} for _ in range(args.burst)]
+            response = await client.post("/v1/ingest", content=json.dumps(body),
+                                          headers={"Content-Type": "text/plain"})
+            return response.status_code == 204
+        return ingest
+
+    etags = {}
+
+    async def dashboard():
+        site_id = random.choice(seeded["site_ids"])
+        headers = {"If-None-Match": etags[site_id]} if site_id in etags and not args.no_etags else {}
+        response = await client.get(f"/dashboard/api/sites/{site_id}/traffic", headers=headers)
+        if "etag" in response.headers:
+            etags[site_id] = response.headers["etag"]
+        counts["not_modified"] += response.status_code == 304
+        return response.status_code in (200, 304)
+    return dashboard
+
+
+async def drive(client: httpx.AsyncClient, seeded: dict, args) -> dict:
+    results = {}
+    for workload in args.workloads:
+        counts = collections.Counter()
+        request = requests_for(workload, client, seeded, counts, args)
+        for _ in range(min(args.warmup, args.requests)):
+            await request()
+        counts.clear()
+        if args.rate:
+            latencies, elapsed, errors = await run_open_loop(request, args.requests, args.rate)
+        else:
+            latencies, elapsed, errors = await run_closed_loop(request, args.requests, args.concurrency)
+        result = summarize(latencies, elapsed, errors)
+        if workload == "ingest":
+            result["events_per_s"] = round(result["throughput_rps"] * args.burst, 1)
+        if workload == "dashboard":
+            result["not_modified"] = counts["not_modified"]
+        results[workload] = result
+    return results
+
+
+async def run_in_process(seeded: dict, cookies: dict, args) -> dict:
+    from app.db import close_pools
+    from app.event_writer import event_writer
+    from app.main import app
+
+    await event_writer.start()
+    transport = httpx.ASGITransport(app=app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", cookies=cookies) as client:
+            return await drive(client, seeded, args)
+    finally:
+        await event_writer.stop()
+        await close_pools()
+
+
+def free_port() -> int:
+    with contextlib.closing(socket.socket()) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def run_server(db_path: str, seeded: dict, cookies: dict, args) -> dict:
+    port = free_port()
+    env = {**os.environ, "DATABASE_PATH": db_path}
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(args.server_workers), "--log-level", "warning", "--no-access-log"],
+        env=env,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    limits = httpx.Limits(max_connections=max(args.concurrency, 100))
+    try:
+        async with httpx.AsyncClient(base_url=base_url, cookies=cookies, limits=limits) as client:
+            deadline = time.monotonic() + 30
+            while True:
+                try:
+                    if (await client.get("/health")).status_code == 200:
+                        break
+                except httpx.TransportError:
+                    pass
+                if server.poll() is not None or time.monotonic() > deadline:
+                    raise RuntimeError("uvicorn did not start")
+                await asyncio.sleep(0.2)
+            return await drive(client, seeded, args)
+    finally:
+        server.terminate()
+        server.wait(30)
+
+
+def git_commit() -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"],
+                                    capture_output=True, text=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": None, "dirty": None}
+    return {"commit": commit, "dirty": dirty}
+
+
+async def main(args) -> dict:
+    from app.auth import create_session
+    from app.settings import settings
+
+    db_path = use_temp_database()
+    seeded = await seed(args.seed_events)
+    cookies = {settings.SESSION_COOKIE_NAME: create_session(seeded["user"])}
+
+    if args.server:
+        results = await run_server(db_path, seeded, cookies, args)
+    else:
+        results = await run_in_process(seeded, cookies, args)
+
+    config = {k: v for k, v in vars(args).items() if k not in ("output", "compare")}
+    return {
+        **git_commit(),
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "config": config,
+        "results": results,
+    }
+
+
+def compare(old_path: str, new_path: str) -> list[str]:
+    """One line per workload and metric: old, new and the relative change"""
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    lines = [f"{old.get('commit')} -> {new.get('commit')}"]
+    if old.get("config") != new.get("config"):
+        lines.append("warning: runs used different settings")
+    for workload in WORKLOADS:
+        if workload not in old["results"] or workload not in new["results"]:
+            continue
+        for metric, higher_is_better in COMPARED.items():
+            before, after = old["results"][workload][metric], new["results"][workload][metric]
+            change = (after - before) / before * 100 if before else 0.0
+            worse = change < 0 if higher_is_better else change > 0
+            flag = " (worse)" if worse and abs(change) >= 5 else ""
+            lines.append(f"{workload:10} {metric:15} {before:>10} {after:>10} {change:+7.1f}%{flag}")
+    return lines
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workloads", nargs="+", choices=WORKLOADS, default=list(WORKLOADS))
+    parser.add_argument("--requests", type=int, default=2000, help="requests per workload")
+    parser.add_argument("--concurrency", type=int, default=8, help="closed-loop clients")
+    parser.add_argument("--rate", type=float, default=0, help="open-loop requests per second")
+    parser.add_argument("--warmup", type=int, default=100, help="unmeasured requests per workload")
+    parser.add_argument("--burst", type=int, default=20, help="events per ingest request")
+    parser.add_argument("--no-etags", action="store_true", help="dashboard polls without If-None-Match")
+    parser.add_argument("--seed-events", type=int, default=50000)
+    parser.add_argument("--server", action="store_true", help="run uvicorn on localhost")
+    parser.add_argument("--server-workers", type=int, default=1)
+    parser.add_argument("--output", help="results file (default: benchmarks/results/loadtest-<commit>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"))
+    args = parser.parse_args()
+
+    if args.compare:
+        print("\n".join(compare(*args.compare)))
+        sys.exit(0)
+
+    report = asyncio.run(main(args))
+    output = args.output or os.path.join(RESULTS_DIR, f"loadtest-{report['commit'] or 'unknown'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(json.dumps(report["results"], indent=2))
+    print(f"Results written to {output}", file=sys.stderr)
+    sys.exit(1 if any(r["errors"] for r in report["results"].values()) else 0)
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Backfill derived data for EngageMeter.co from the raw events table.
+
+Usage:
+    python scripts/backfill.py events     # move events_legacy / the single events table into day partitions
+    python scripts/backfill.py sources    # classify events stored without a source
+    python scripts/backfill.py rollups    # rebuild events_hourly from events
+    python scripts/backfill.py visitors   # rebuild the visitors_hourly sketches from events
+
+Run ``sources`` before ``rollups`` on databases that predate ingest-time
+source classification. ``events`` is safe to run while the app is serving and
+picks up where it left off if interrupted; run it before ``rollups`` and
+``visitors``.
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.db import (backfill_event_sources, connect, init_db, migrate_legacy_events,
+                    partition_events, rebuild_hourly_rollup, rebuild_visitor_sketches)
+
+
+async def backfill_rollups():
+    """Recompute the hourly rollup table from every stored event"""
+    await init_db()
+    db = await connect()
+    try:
+        total = await rebuild_hourly_rollup(db)
+    finally:
+        await db.close()
+    print(f"✓ Rolled up {total} events into events_hourly")
+
+
+async def backfill_visitors():
+    """Recompute the unique-visitor sketches from every stored pageview"""
+    await init_db()
+    db = await connect()
+    try:
+        total = await rebuild_visitor_sketches(db)
+    finally:
+        await db.close()
+    print(f"✓ Sketched the visitors of {total} pageviews into visitors_hourly")
+
+
+async def backfill_events():
+    """Move events from older schemas into the day-partitioned tables"""
+    await init_db()
+    db = await connect()
+    try:
+        legacy = await migrate_legacy_events(db)
+        single = await partition_events(db)
+    finally:
+        await db.close()
+    print(f"✓ Migrated {legacy} events to the compact format")
+    print(f"✓ Moved {single} events into day partitions")
+
+
+async def backfill_sources():
+    """Fill the source column for events written before it existed"""
+    await init_db()
+    db = await connect()
+    try:
+        total = await backfill_event_sources(db)
+    finally:
+        await db.close()
+    print(f"✓ Classified the source of {total} events")
+
+
+COMMANDS = {
+    "events": backfill_events,
+    "sources": backfill_sources,
+    "rollups": backfill_rollups,
+    "visitors": backfill_visitors,
+}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill derived event data")
+    parser.add_argument("command", choices=sorted(COMMANDS))
+    args = parser.parse_args()
+
+    print("🚀 EngageMeter.co Backfill")
+    print("=" * 40)
+
+    try:
+        asyncio.run(COMMANDS[args.command]())
+    except Exception as e:
+        print(f"\n❌ Backfill failed: {e}")
+        exit(1)
@@ -3,4 +3,11 @@
 # Run production server with gunicorn
 
 source .venv/bin/activate
+
+# Optional single event writer shared by all workers (see docs/DEPLOYMENT.md)
+if [ -n "$EVENT_WRITER_SOCKET" ]; then
+    python -m app.writer_service &
+    trap 'kill $!' EXIT
+fi
+
 gunicorn -w 4 -k uvicorn.workers.UvicornWorker app.main:app -b 0.0.0.0:8000
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Expire old raw events and compact the EngageMeter.co database.
+
+Usage:
+    python scripts/retention.py                # drop events older than EVENT_RETENTION_DAYS
+    python scripts/retention.py --days 30      # override the retention window
+    python scripts/retention.py --convert      # one-off: switch an existing file to incremental vacuum
+
+The app runs the same job every RETENTION_INTERVAL seconds; use this from
+cron when that is disabled. ``--convert`` runs a full VACUUM, which locks the
+database for its whole duration: run it during a maintenance window.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.db import connect, init_db
+from app.retention import AUTO_VACUUM_INCREMENTAL, run_retention
+
+
+async def convert():
+    """Enable incremental auto-vacuum on a database created without it"""
+    await init_db()
+    db = await connect()
+    try:
+        async with db.execute('PRAGMA auto_vacuum') as cursor:
+            mode = (await cursor.fetchone())[0]
+        if mode == AUTO_VACUUM_INCREMENTAL:
+            print("✓ Incremental vacuum is already enabled")
+            return
+        await db.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        await db.execute('VACUUM')
+    finally:
+        await db.close()
+    print("✓ Incremental vacuum enabled")
+
+
+async def retention(days):
+    """Drop expired event partitions and vacuum the space they used"""
+    await init_db()
+    db = await connect()
+    try:
+        report = await run_retention(db, days)
+    finally:
+        await db.close()
+    print(json.dumps(report._asdict(), indent=2))
+    print(f"✓ Removed {report.rows_removed} events, freed {report.bytes_freed} bytes")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Expire old events and compact the database")
+    parser.add_argument("--days", type=int, default=None)
+    parser.add_argument("--convert", action="store_true")
+    args = parser.parse_args()
+
+    print("🚀 EngageMeter.co Retention")
+    print("=" * 40)
+
+    try:
+        asyncio.run(convert() if args.convert else retention(args.days))
+    except Exception as e:
+        print(f"\n❌ Retention failed: {e}")
+        exit(1)
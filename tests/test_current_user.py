@@ -0,0 +1,88 @@
+import asyncio
+
+import pytest
+from starlette.requests import Request
+
+from app import auth
+from app.db import close_pools, init_db, user_cache
+from app.models import User
+from app.settings import settings
+
+
+@pytest.fixture
+def user_lookups(tmp_path, monkeypatch):
+    """Count get_user_by_id calls against a fresh database"""
+    monkeypatch.setattr(settings, "DATABASE_PATH", str(tmp_path / "users.db"))
+    asyncio.run(init_db())
+    user_cache.clear()
+    calls = []
+
+    async def get_user_by_id(db, user_id):
+        calls.append(user_id)
+        return User(id=user_id, email="a@example.com", username="alice", hashed_password="x")
+
+    monkeypatch.setattr(auth, "get_user_by_id", get_user_by_id)
+    yield calls
+    user_cache.clear()
+
+
+def make_request(session_id=None):
+    headers = []
+    if session_id:
+        headers.append((b"cookie", f"{settings.SESSION_COOKIE_NAME}={session_id}".encode()))
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": headers})
+
+
+def test_dependencies_in_one_request_share_a_lookup(user_lookups):
+    session_id = auth.create_session(User(id="user-1", email="a@example.com", username="alice",
+                                          hashed_password="x"))
+
+    async def run():
+        request = make_request(session_id)
+        first = await auth.get_current_user(request)
+        user_cache.clear()
+        second = await auth.get_current_user(request)
+        await close_pools()
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert first is second
+    assert user_lookups == ["user-1"]
+
+
+def test_later_requests_skip_the_database(user_lookups):
+    session_id = auth.create_session(User(id="user-1", email="a@example.com", username="alice",
+                                          hashed_password="x"))
+
+    async def run():
+        users = [await auth.get_current_user(make_request(session_id)) for _ in range(5)]
+        await close_pools()
+        return users
+
+    users = asyncio.run(run())
+    assert all(user.id == "user-1" for user in users)
+    assert user_lookups == ["user-1"]
+
+
+def test_logout_invalidates_the_cached_user(user_lookups):
+    user = User(id="user-1", email="a@example.com", username="alice", hashed_password="x")
+    session_id = auth.create_session(user)
+
+    async def run():
+        await auth.get_current_user(make_request(session_id))
+        await auth.logout(make_request(session_id))
+        after_logout = await auth.get_current_user(make_request(session_id))
+        await close_pools()
+        return after_logout
+
+    assert asyncio.run(run()) is None
+    assert user_cache.lookup("user-1") == (False, None)
+
+
+def test_anonymous_requests_do_not_touch_the_database(user_lookups):
+    async def run():
+        return [await auth.get_current_user(make_request()),
+                await auth.get_current_user(make_request("unknown-session"))]
+
+    assert asyncio.run(run()) == [None, None]
+    assert user_lookups == []
@@ -0,0 +1,130 @@
+import asyncio
+import sqlite3
+from contextlib import asynccontextmanager
+
+import httpx
+import pytest
+
+from app.auth import get_current_user
+from app.db import (close_pools, connect, create_events, create_site, create_tracked_link, data_version_cache,
+                    delete_site, event_row, get_data_version, init_db, now_ms, read_pool, site_scope, user_scope)
+from app.main import app
+from app.models import User
+from app.settings import settings
+
+USER = User(id="user-1", email="a@example.com", username="alice", hashed_password="x")
+
+
+@pytest.fixture
+def client_app(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "DATABASE_PATH", str(tmp_path / "versions.db"))
+    asyncio.run(init_db())
+    app.dependency_overrides[get_current_user] = lambda: USER
+    yield app
+    app.dependency_overrides.clear()
+
+
+async def get(path, etag=None):
+    headers = {"if-none-match": etag} if etag else {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        return await client.get(path, headers=headers)
+
+
+def pageview(site_id, referer=None):
+    return event_row({"site_id": site_id, "user_id": USER.id, "kind": "pageview", "referer": referer}, now_ms())
+
+
+@asynccontextmanager
+async def no_database():
+    raise AssertionError("the database was queried")
+    yield
+
+
+def test_writes_bump_user_and_site_versions(client_app):
+    async def run():
+        db = await connect()
+        try:
+            site = await create_site(db, USER.id, "example.com")
+            after_site = await get_data_version(db, user_scope(USER.id))
+            await create_tracked_link(db, USER.id, site.id, "https://example.com/a", "x", "abc123", "x")
+            after_link = (await get_data_version(db, user_scope(USER.id)),
+                          await get_data_version(db, site_scope(site.id)))
+            await create_events(db, [pageview(site.id)] * 3)
+            after_events = await get_data_version(db, site_scope(site.id))
+            await delete_site(db, site.id, USER.id)
+            after_delete = await get_data_version(db, user_scope(USER.id))
+        finally:
+            await db.close()
+        return after_site, after_link, after_events, after_delete
+
+    assert asyncio.run(run()) == (1, (2, 1), 2, 3)
+
+
+def test_unchanged_list_is_a_304_without_a_query(client_app, monkeypatch):
+    async def run():
+        first = await get("/sites/api/list")
+        with monkeypatch.context() as m:
+            m.setattr(read_pool, "acquire", no_database)
+            again = await get("/sites/api/list", first.headers["etag"])
+
+        db = await connect()
+        await create_site(db, USER.id, "example.com")
+        await db.close()
+        changed = await get("/sites/api/list", first.headers["etag"])
+        await close_pools()
+        return first, again, changed
+
+    first, again, changed = asyncio.run(run())
+    assert first.status_code == 200 and first.json() == {"sites": [], "next_cursor": None}
+    assert again.status_code == 304
+    assert again.headers["etag"] == first.headers["etag"]
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != first.headers["etag"]
+    assert len(changed.json()["sites"]) == 1
+
+
+def test_other_workers_writes_show_up_after_the_cache_ttl(client_app):
+    async def run():
+        first = await get("/links/api/list")
+        # Another worker's write: the row changes but this worker's cache doesn't
+        with sqlite3.connect(settings.DATABASE_PATH) as conn:
+            conn.execute("INSERT INTO data_versions VALUES (?, 1)", (user_scope(USER.id),))
+        cached = await get("/links/api/list", first.headers["etag"])
+        data_version_cache.clear()
+        expired = await get("/links/api/list", first.headers["etag"])
+        await close_pools()
+        return cached, expired
+
+    cached, expired = asyncio.run(run())
+    assert cached.status_code == 304
+    assert expired.status_code == 200
+
+
+def test_dashboard_traffic_revalidates_on_new_events(client_app, monkeypatch):
+    async def run():
+        db = await connect()
+        try:
+            site = await create_site(db, USER.id, "example.com")
+            other = await create_site(db, "user-2", "other.com")
+            path = f"/dashboard/api/sites/{site.id}/traffic"
+
+            first = await get(path)
+            with monkeypatch.context() as m:
+                m.setattr(read_pool, "acquire", no_database)
+                again = await get(path, first.headers["etag"])
+            await create_events(db, [pageview(site.id, "https://t.co/x")])
+            changed = await get(path, first.headers["etag"])
+            forbidden = await get(f"/dashboard/api/sites/{other.id}/traffic")
+        finally:
+            await db.close()
+            await close_pools()
+        return first, again, changed, forbidden
+
+    first, again, changed, forbidden = asyncio.run(run())
+    assert first.status_code == 200
+    assert first.json()["unique_visitors"] == {"total": 0, "by_hour": []}
+    assert again.status_code == 304
+    assert changed.status_code == 200
+    assert changed.json()["traffic_by_source"][0]["source"] == "x"
+    assert forbidden.status_code == 404
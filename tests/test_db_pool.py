@@ -0,0 +1,284 @@
+import asyncio
+
+import pytest
+
+from app.db import ConnectionPool, PoolTimeout, get_db
+
+
+def test_connections_are_reused(tmp_path):
+    """Releasing a connection hands the same one to the next caller"""
+    async def run():
+        pool = ConnectionPool(str(tmp_path / "pool.db"), size=2)
+        async with pool.acquire() as first:
+            pass
+        async with pool.acquire() as second:
+            pass
+        stats = pool.stats()
+        await pool.close()
+        return first is second, stats
+
+    reused, stats = asyncio.run(run())
+    assert reused
+    assert stats["open"] == 1
+    assert stats["acquired"] == 2
+    assert stats["in_use"] == 0
+
+
+def test_pragmas_applied_on_open(tmp_path):
+    """Connections come out of the pool already configured"""
+    async def run():
+        pool = ConnectionPool(str(tmp_path / "pool.db"), size=1)
+        async with pool.acquire() as db:
+            async with db.execute("PRAGMA busy_timeout") as cursor:
+                row = await cursor.fetchone()
+        await pool.close()
+        return row[0]
+
+    assert asyncio.run(run()) == 5000
+
+
+def test_waits_when_pool_is_exhausted(tmp_path):
+    """Callers beyond the pool size queue up instead of opening connections"""
+    async def run():
+        pool = ConnectionPool(str(tmp_path / "pool.db"), size=1)
+        seen = []
+
+        async def worker():
+            async with pool.acquire() as db:
+                seen.append(pool.stats()["waiters"])
+                await asyncio.sleep(0.01)
+
+        await asyncio.gather(*(worker() for _ in range(3)))
+        stats = pool.stats()
+        await pool.close()
+        return seen, stats
+
+    seen, stats = asyncio.run(run())
+    assert seen[0] == 2
+    assert stats["open"] == 1
+    assert stats["acquired"] == 3
+    assert stats["max_wait_ms"] > 0
+
+
+def test_open_transaction_rolled_back_on_release(tmp_path):
+    """Uncommitted work never leaks into the next borrower"""
+    async def run():
+        pool = ConnectionPool(str(tmp_path / "pool.db"), size=1)
+        async with pool.acquire() as db:
+            await db.execute("CREATE TABLE t (x INTEGER)")
+            await db.commit()
+            await db.execute("INSERT INTO t VALUES (1)")
+        async with pool.acquire() as db:
+            async with db.execute("SELECT COUNT(*) FROM t") as cursor:
+                row = await cursor.fetchone()
+        await pool.close()
+        return row[0]
+
+    assert asyncio.run(run()) == 0
+
+
+def test_get_db_dependency_releases_connection(tmp_path, monkeypatch):
+    """The FastAPI dependency returns its connection when the request ends"""
+    from app import db as db_module
+
+    pool = ConnectionPool(str(tmp_path / "pool.db"), size=1)
+    monkeypatch.setattr(db_module, "db_pool", pool)
+
+    async def run():
+        dependency = get_db()
+        await dependency.__anext__()
+        in_use = pool.stats()["in_use"]
+        await dependency.aclose()
+        stats = pool.stats()
+        await pool.close()
+        return in_use, stats["in_use"]
+
+    assert asyncio.run(run()) == (1, 0)
+
+
+def test_acquire_times_out_instead_of_waiting_forever(tmp_path):
+    """An exhausted pool fails fast with PoolTimeout"""
+    async def run():
+        pool = ConnectionPool(str(tmp_path / "pool.db"), size=1, timeout=0.05)
+        async with pool.acquire():
+            with pytest.raises(PoolTimeout):
+                async with pool.acquire():
+                    pass
+        stats = pool.stats()
+        await pool.close()
+        return stats
+
+    stats = asyncio.run(run())
+    assert stats["timeouts"] == 1
+    assert stats["waiters"] == 0
+
+
+def test_broken_connection_frees_its_slot(tmp_path):
+    """A waiter gets a fresh connection when the one it waited for is discarded"""
+    async def run():
+        pool = ConnectionPool(str(tmp_path / "pool.db"), size=1, timeout=1)
+        results = []
+
+        async def breaker():
+            async with pool.acquire() as db:
+                await asyncio.sleep(0.01)
+                await db.close()
+
+        async def waiter():
+            await asyncio.sleep(0)
+            async with pool.acquire() as db:
+                async with db.execute("SELECT 1") as cursor:
+                    results.append((await cursor.fetchone())[0])
+
+        await asyncio.gather(breaker(), waiter())
+        stats = pool.stats()
+        await pool.close()
+        return results, stats
+
+    results, stats = asyncio.run(run())
+    assert results == [1]
+    assert stats["open"] == 1
+
+
+def test_close_closes_borrowed_connections(tmp_path):
+    """close() waits for borrowers and leaves no connection threads behind"""
+    async def run():
+        pool = ConnectionPool(str(tmp_path / "pool.db"), size=2, timeout=1)
+        borrowed = []
+
+        async def borrower():
+            async with pool.acquire() as db:
+                borrowed.append(db)
+                await asyncio.sleep(0.05)
+
+        task = asyncio.create_task(borrower())
+        await asyncio.sleep(0.01)
+        await pool.close()
+        await task
+        borrowed[0]._thread.join(1)
+        return pool.stats(), borrowed[0]._thread.is_alive()
+
+    stats, thread_alive = asyncio.run(run())
+    assert stats["open"] == 0
+    assert not thread_alive
+
+
+def test_concurrent_requests_beyond_pool_size(tmp_path, monkeypatch):
+    """Authenticated routes use one connection at a time and never deadlock"""
+    import httpx
+    from app.auth import create_session
+    from app.db import close_pools, connect, create_user, init_db, read_pool
+    from app.main import app
+    from app.models import UserCreate
+    from app.settings import settings
+
+    monkeypatch.setattr(settings, "DATABASE_PATH", str(tmp_path / "app.db"))
+    monkeypatch.setattr(read_pool, "size", 2)
+    monkeypatch.setattr(read_pool, "timeout", 5)
+
+    async def run():
+        await init_db()
+        db = await connect()
+        user = await create_user(db, UserCreate(email="a@b.co", username="a", password="x" * 8), "hash")
+        await db.close()
+
+        transport = httpx.ASGITransport(app=app)
+        cookies = {settings.SESSION_COOKIE_NAME: create_session(user)}
+        async with httpx.AsyncClient(transport=transport, base_url="http://test", cookies=cookies) as client:
+            responses = await asyncio.wait_for(
+                asyncio.gather(*(client.get("/sites/api/list") for _ in range(10))), 10)
+        await close_pools()
+        return [r.status_code for r in responses]
+
+    assert asyncio.run(run()) == [200] * 10
+
+
+def test_database_uses_wal_and_reader_connections_are_read_only(tmp_path, monkeypatch):
+    """init_db switches the file to WAL; readers are configured but cannot write"""
+    import sqlite3
+    from app.db import init_db
+    from app.settings import settings
+
+    monkeypatch.setattr(settings, "DATABASE_PATH", str(tmp_path / "app.db"))
+
+    async def run():
+        await init_db()
+        writer = ConnectionPool(size=1)
+        readers = ConnectionPool(size=1, readonly=True)
+        pragmas = {}
+        try:
+            async with readers.acquire() as db:
+                for name in ("journal_mode", "synchronous", "query_only", "mmap_size", "cache_size"):
+                    async with db.execute(f"PRAGMA {name}") as cursor:
+                        pragmas[name] = (await cursor.fetchone())[0]
+                with pytest.raises(sqlite3.OperationalError):
+                    await db.execute("DELETE FROM users")
+            async with writer.acquire() as db:
+                async with db.execute("PRAGMA query_only") as cursor:
+                    pragmas["writer_query_only"] = (await cursor.fetchone())[0]
+        finally:
+            await writer.close()
+            await readers.close()
+        return pragmas
+
+    pragmas = asyncio.run(run())
+    assert pragmas["journal_mode"] == "wal"
+    assert pragmas["synchronous"] == 1  # NORMAL
+    assert pragmas["query_only"] == 1 and pragmas["writer_query_only"] == 0
+    assert pragmas["mmap_size"] == settings.DATABASE_MMAP_SIZE
+    assert pragmas["cache_size"] == -settings.DATABASE_CACHE_SIZE_KB
+
+
+def test_readers_are_not_blocked_by_an_open_write(tmp_path, monkeypatch):
+    """Under WAL a reader sees the last commit while the writer holds its lock"""
+    from app.db import init_db
+    from app.settings import settings
+
+    monkeypatch.setattr(settings, "DATABASE_PATH", str(tmp_path / "app.db"))
+
+    async def run():
+        await init_db()
+        writer = ConnectionPool(size=1)
+        readers = ConnectionPool(size=1, readonly=True, timeout=1)
+        try:
+            async with writer.acquire() as w:
+                await w.execute("BEGIN IMMEDIATE")
+                await w.execute("INSERT INTO data_versions (scope, version) VALUES ('x', 1)")
+                async with readers.acquire() as r:
+                    async with r.execute("SELECT COUNT(*) FROM data_versions") as cursor:
+                        during = (await cursor.fetchone())[0]
+                await w.commit()
+            async with readers.acquire() as r:
+                async with r.execute("SELECT COUNT(*) FROM data_versions") as cursor:
+                    after = (await cursor.fetchone())[0]
+        finally:
+            await writer.close()
+            await readers.close()
+        return during, after
+
+    assert asyncio.run(run()) == (0, 1)
+
+
+def test_independent_reads_run_on_separate_readers(tmp_path, monkeypatch):
+    """read() gives each concurrent query its own reader connection"""
+    from app import db as db_module
+
+    pool = ConnectionPool(str(tmp_path / "pool.db"), size=2, readonly=True)
+    monkeypatch.setattr(db_module, "read_pool", pool)
+
+    async def query(db, seen):
+        seen.append(db)
+        await asyncio.sleep(0.01)
+        return len(seen)
+
+    async def run():
+        seen = []
+        try:
+            await asyncio.gather(db_module.read(query, seen), db_module.read(query, seen))
+            return seen, pool.stats()
+        finally:
+            await pool.close()
+
+    seen, stats = asyncio.run(run())
+    assert seen[0] is not seen[1]
+    assert stats["open"] == 2 and stats["waiters"] == 0
@@ -0,0 +1,146 @@
+import asyncio
+import sqlite3
+
+import pytest
+
+from app.db import (connect, create_events, event_row, init_db, iso_to_ms, list_event_partitions,
+                    migrate_legacy_events, partition_events, rebuild_hourly_rollup)
+from app.settings import settings
+
+# The events table as it was before the compact format
+LEGACY_EVENTS_SQL = '''
+    CREATE TABLE events (
+        id TEXT PRIMARY KEY,
+        tracked_link_id TEXT,
+        site_id TEXT NOT NULL,
+        user_id TEXT NOT NULL,
+        kind TEXT NOT NULL CHECK (kind IN ('click', 'pageview')),
+        ts TEXT NOT NULL,
+        ip_hash TEXT,
+        ua_hash TEXT,
+        referer TEXT,
+        utm_source TEXT,
+        utm_medium TEXT,
+        utm_campaign TEXT,
+        country TEXT,
+        path TEXT,
+        session_id TEXT
+    )
+'''
+
+LEGACY_ROWS = [
+    ("e1", None, "site-a", "user-1", "pageview", "2025-01-01T10:15:00+00:00", "https://t.co/x", None),
+    ("e2", None, "site-a", "user-1", "pageview", "2025-01-01T10:45:00+00:00", None, "reddit"),
+    ("e3", "link-1", "site-a", "user-1", "click", "2025-01-01T11:00:00.250000+00:00", None, None),
+    ("e4", None, "site-b", "user-1", "pageview", "2025-01-01T12:00:00", "https://lnkd.in/q", None),
+    ("e5", "link-1", "site-a", "user-1", "click", "2025-01-01T13:30:00+00:00", None, None),
+]
+
+
+@pytest.fixture
+def legacy_db(tmp_path, monkeypatch):
+    """A database whose events table still uses UUID ids and ISO timestamps"""
+    path = str(tmp_path / "legacy.db")
+    monkeypatch.setattr(settings, "DATABASE_PATH", path)
+    with sqlite3.connect(path) as conn:
+        conn.execute(LEGACY_EVENTS_SQL)
+        conn.execute("CREATE INDEX idx_events_ts ON events(ts)")
+        conn.executemany('''
+            INSERT INTO events (id, tracked_link_id, site_id, user_id, kind, ts, referer, utm_source)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', LEGACY_ROWS)
+    return path
+
+
+def table_names(path):
+    with sqlite3.connect(path) as conn:
+        return {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+
+
+def test_init_db_sets_legacy_events_aside(legacy_db):
+    asyncio.run(init_db())
+    assert {"events_legacy", "entity_keys"} <= table_names(legacy_db)
+    assert "events" not in table_names(legacy_db)
+    with sqlite3.connect(legacy_db) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM events_legacy").fetchone()[0] == 5
+
+    # Running init_db again leaves both tables alone
+    asyncio.run(init_db())
+    with sqlite3.connect(legacy_db) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM events_legacy").fetchone()[0] == 5
+
+
+def test_migration_copies_rows_alongside_new_writes(legacy_db):
+    async def run():
+        await init_db()
+        db = await connect()
+        # A write that lands while the migration is in progress
+        await create_events(db, [event_row({"site_id": "site-a", "user_id": "user-1",
+                                            "kind": "pageview"}, iso_to_ms("2025-01-02T09:00:00+00:00"))])
+        moved = await migrate_legacy_events(db, batch_size=2)
+        again = await migrate_legacy_events(db)
+        partitions = await list_event_partitions(db)
+        union = " UNION ALL ".join(f"SELECT * FROM {name}" for name in partitions)
+        async with db.execute(f'''
+            SELECT e.ts, s.uuid AS site, l.uuid AS link, e.kind, e.source
+            FROM ({union}) e
+            JOIN entity_keys s ON s.id = e.site_key
+            LEFT JOIN entity_keys l ON l.id = e.link_key
+            ORDER BY e.ts
+        ''') as cursor:
+            rows = [tuple(r) for r in await cursor.fetchall()]
+        counted = await rebuild_hourly_rollup(db)
+        await db.close()
+        return moved, again, rows, counted
+
+    moved, again, rows, counted = asyncio.run(run())
+    assert (moved, again, counted) == (5, 0, 6)
+    assert "events_legacy" not in table_names(legacy_db)
+    assert {"events_20250101", "events_20250102"} <= table_names(legacy_db)
+    assert rows == [
+        (1735726500000, "site-a", None, "pageview", "x"),
+        (1735728300000, "site-a", None, "pageview", "reddit"),
+        (1735729200250, "site-a", "link-1", "click", "other"),
+        (1735732800000, "site-b", None, "pageview", "linkedin"),
+        (1735738200000, "site-a", "link-1", "click", "other"),
+        (1735808400000, "site-a", None, "pageview", "other"),
+    ]
+
+
+# The single compact events table used before day partitions
+UNPARTITIONED_EVENTS_SQL = '''
+    CREATE TABLE events (
+        id INTEGER PRIMARY KEY, ts INTEGER NOT NULL, site_key INTEGER NOT NULL,
+        user_key INTEGER NOT NULL, link_key INTEGER, kind TEXT NOT NULL, source TEXT,
+        ip_hash TEXT, ua_hash TEXT, referer TEXT, utm_source TEXT, utm_medium TEXT,
+        utm_campaign TEXT, country TEXT, path TEXT, session_id TEXT
+    )
+'''
+
+
+def test_partition_events_splits_the_single_table_by_day(tmp_path, monkeypatch):
+    path = str(tmp_path / "unpartitioned.db")
+    monkeypatch.setattr(settings, "DATABASE_PATH", path)
+    day = iso_to_ms("2025-01-01T00:00:00+00:00")
+    stamps = [day + 1, day + 86_399_999, day + 86_400_000, day + 3 * 86_400_000 + 5]
+    with sqlite3.connect(path) as conn:
+        conn.execute(UNPARTITIONED_EVENTS_SQL)
+        conn.executemany("INSERT INTO events (ts, site_key, user_key, kind, source) VALUES (?, 1, 2, 'pageview', 'x')",
+                         [(ts,) for ts in stamps])
+
+    async def run():
+        await init_db()
+        db = await connect()
+        moved = await partition_events(db, batch_size=3)
+        again = await partition_events(db)
+        counts = {}
+        for name in await list_event_partitions(db):
+            async with db.execute(f"SELECT COUNT(*) FROM {name}") as cursor:
+                counts[name] = (await cursor.fetchone())[0]
+        await db.close()
+        return moved, again, counts
+
+    moved, again, counts = asyncio.run(run())
+    assert (moved, again) == (4, 0)
+    assert counts == {"events_20250101": 2, "events_20250102": 1, "events_20250104": 1}
+    assert "events" not in table_names(path)
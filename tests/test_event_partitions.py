@@ -0,0 +1,111 @@
+import asyncio
+
+import pytest
+
+from app.db import (DAY_MS, connect, count_site_events, create_events, drop_event_partitions, event_partition,
+                    event_row, init_db, iso_to_ms, known_partitions, list_event_partitions,
+                    rebuild_hourly_rollup)
+from app.settings import settings
+
+DAY = iso_to_ms("2025-03-10T00:00:00+00:00")
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "DATABASE_PATH", str(tmp_path / "partitions.db"))
+    asyncio.run(init_db())
+
+
+def pageview(ts, site_id="site-a"):
+    return event_row({"site_id": site_id, "user_id": "user-1", "kind": "pageview"}, ts)
+
+
+def test_partition_names_follow_utc_days():
+    assert event_partition(DAY) == "events_20250310"
+    assert event_partition(DAY - 1) == "events_20250309"
+    assert event_partition(DAY + DAY_MS - 1) == "events_20250310"
+
+
+def test_writes_land_in_their_day(db_path):
+    async def run():
+        db = await connect()
+        await create_events(db, [pageview(DAY + i * DAY_MS // 2) for i in range(5)])
+        partitions = await list_event_partitions(db)
+        in_range = await list_event_partitions(db, DAY + DAY_MS, DAY + DAY_MS + 1)
+        await db.close()
+        return partitions, in_range
+
+    partitions, in_range = asyncio.run(run())
+    assert partitions == ["events_20250310", "events_20250311", "events_20250312"]
+    assert in_range == ["events_20250311"]
+
+
+def test_range_count_reads_only_the_partitions_it_needs(db_path):
+    async def run():
+        db = await connect()
+        await create_events(db, [pageview(DAY + day * DAY_MS + 1000) for day in range(10)]
+                                + [pageview(DAY + 1000, "site-b")])
+        statements = []
+        await db.set_trace_callback(statements.append)
+        count = await count_site_events(db, "site-a", DAY + 2 * DAY_MS, DAY + 4 * DAY_MS)
+        await db.set_trace_callback(None)
+        missing = await count_site_events(db, "no-such-site", DAY, DAY + 10 * DAY_MS)
+        await db.close()
+        return count, missing, statements
+
+    count, missing, statements = asyncio.run(run())
+    assert (count, missing) == (2, 0)
+    touched = {word for sql in statements for word in sql.split() if word.startswith("events_2")}
+    assert touched == {"events_20250312", "events_20250313"}
+
+
+def test_dropping_old_days_leaves_newer_ones_writable(db_path):
+    async def run():
+        db = await connect()
+        await create_events(db, [pageview(DAY + day * DAY_MS) for day in range(4)])
+        dropped = await drop_event_partitions(db, DAY + 2 * DAY_MS + 1)
+        remaining = await list_event_partitions(db)
+        # A late event for a dropped day recreates its partition
+        await create_events(db, [pageview(DAY)])
+        counted = await rebuild_hourly_rollup(db)
+        await db.close()
+        return dropped, remaining, counted
+
+    dropped, remaining, counted = asyncio.run(run())
+    assert [(d.name, d.rows) for d in dropped] == [("events_20250310", 1), ("events_20250311", 1)]
+    assert remaining == ["events_20250312", "events_20250313"]
+    assert counted == 3
+
+
+def test_writes_recover_when_another_worker_dropped_the_partition(db_path):
+    async def run():
+        db = await connect()
+        await create_events(db, [pageview(DAY)])
+        other = await connect()
+        await other.execute("DROP TABLE events_20250310")
+        await other.commit()
+        await other.close()
+        assert "events_20250310" in known_partitions
+        await create_events(db, [pageview(DAY + 1)])
+        count = await count_site_events(db, "site-a", DAY, DAY + DAY_MS)
+        await db.close()
+        return count
+
+    assert asyncio.run(run()) == 1
+
+
+def test_rebuild_since_only_recomputes_recent_days(db_path):
+    async def run():
+        db = await connect()
+        await create_events(db, [pageview(DAY + day * DAY_MS) for day in range(3)])
+        await db.execute("UPDATE events_hourly SET count = 100")
+        await db.commit()
+        counted = await rebuild_hourly_rollup(db, since_ms=DAY + 2 * DAY_MS + 5)
+        async with db.execute("SELECT hour, count FROM events_hourly ORDER BY hour") as cursor:
+            rows = [tuple(r) for r in await cursor.fetchall()]
+        await db.close()
+        return counted, rows
+
+    counted, rows = asyncio.run(run())
+    assert counted == 1
+    assert [count for _, count in rows] == [100, 100, 1]
@@ -0,0 +1,183 @@
+import asyncio
+import sqlite3
+
+import pytest
+
+from app.db import EVENT_PARTITION_GLOB, init_db
+from app.event_writer import EventWriter
+from app.settings import settings
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    """Point the app at a fresh database file"""
+    path = str(tmp_path / "events.db")
+    monkeypatch.setattr(settings, "DATABASE_PATH", path)
+    asyncio.run(init_db())
+    return path
+
+
+def sample_event(i=0):
+    return {
+        "site_id": "site-1",
+        "user_id": "user-1",
+        "kind": "pageview",
+        "path": f"/page/{i}",
+        "referer": "https://t.co/abc",
+    }
+
+
+def count_events(path):
+    with sqlite3.connect(path) as conn:
+        partitions = [r[0] for r in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name GLOB ?", (EVENT_PARTITION_GLOB,))]
+        return sum(conn.execute(f"SELECT COUNT(*) FROM {name}").fetchone()[0] for name in partitions)
+
+
+def test_flushes_when_batch_is_full(db_path):
+    """A full batch is written without waiting for the interval"""
+    async def run():
+        writer = EventWriter(db_path, batch_size=10, flush_interval_ms=60_000)
+        await writer.start()
+        for i in range(25):
+            assert writer.enqueue(sample_event(i))
+        await asyncio.sleep(0.2)
+        stats = writer.stats()
+        await writer.stop()
+        return stats
+
+    stats = asyncio.run(run())
+    assert stats["flushed"] == 20
+    assert stats["flush_count"] == 2
+    assert count_events(db_path) == 25
+
+
+def test_flushes_after_interval(db_path):
+    """A partial batch is written once the flush interval passes"""
+    async def run():
+        writer = EventWriter(db_path, batch_size=1000, flush_interval_ms=20)
+        await writer.start()
+        writer.enqueue(sample_event())
+        await asyncio.sleep(0.2)
+        written = count_events(db_path)
+        await writer.stop()
+        return written
+
+    assert asyncio.run(run()) == 1
+
+
+def test_drops_events_when_queue_is_full(db_path):
+    """The queue is bounded and overflow is counted, not blocked on"""
+    async def run():
+        writer = EventWriter(db_path, max_queue_size=5)
+        results = [writer.enqueue(sample_event(i)) for i in range(8)]
+        stats = writer.stats()
+        await writer.start()
+        await writer.stop()
+        return results, stats
+
+    results, stats = asyncio.run(run())
+    assert sum(1 for r in results if r) == 5
+    assert stats["dropped"] == 3
+    assert stats["queue_depth"] == 5
+    assert count_events(db_path) == 5
+
+
+def test_stop_rejects_new_events(db_path):
+    """Events arriving during shutdown are dropped instead of lost silently"""
+    async def run():
+        writer = EventWriter(db_path)
+        await writer.start()
+        await writer.stop()
+        return writer.enqueue(sample_event()), writer.stats()["dropped"]
+
+    assert asyncio.run(run()) == (False, 1)
+
+
+def test_create_event_is_batched_while_writer_runs(db_path, monkeypatch):
+    """create_event goes through the writer instead of committing per event"""
+    from app import event_writer as writer_module
+    from app.db import create_event
+
+    writer = EventWriter(db_path, batch_size=50, flush_interval_ms=20)
+    monkeypatch.setattr(writer_module, "event_writer", writer)
+
+    async def run():
+        await writer.start()
+        queued = [await create_event(None, sample_event(i)) for i in range(30)]
+        await writer.stop()
+        return queued, writer.stats()
+
+    queued, stats = asyncio.run(run())
+    assert all(queued)
+    assert stats["flushed"] == 30
+    assert stats["flush_count"] == 1
+    assert count_events(db_path) == 30
+
+
+def test_busy_batch_is_retried(db_path, monkeypatch):
+    """A batch hitting a locked database is retried rather than dropped"""
+    from app import event_writer as writer_module
+
+    real_create_events = writer_module.create_events
+    calls = []
+
+    async def flaky_create_events(db, rows):
+        calls.append(len(rows))
+        if len(calls) == 1:
+            raise sqlite3.OperationalError("database is locked")
+        return await real_create_events(db, rows)
+
+    monkeypatch.setattr(writer_module, "create_events", flaky_create_events)
+
+    async def run():
+        writer = EventWriter(db_path, batch_size=5, flush_interval_ms=20)
+        await writer.start()
+        for i in range(5):
+            writer.enqueue(sample_event(i))
+        await writer.stop()
+        return writer.stats()
+
+    stats = asyncio.run(run())
+    assert calls == [5, 5]
+    assert stats["retries"] == 1
+    assert stats["failed"] == 0
+    assert count_events(db_path) == 5
+
+
+def test_batch_dropped_after_retries_exhausted(db_path, monkeypatch):
+    """Persistent failures are counted as lost after the retry budget"""
+    from app import event_writer as writer_module
+
+    async def failing_create_events(db, rows):
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(writer_module, "create_events", failing_create_events)
+
+    async def run():
+        writer = EventWriter(db_path, batch_size=3, flush_interval_ms=20, max_retries=1)
+        await writer.start()
+        for i in range(3):
+            writer.enqueue(sample_event(i))
+        await writer.stop()
+        return writer.stats()
+
+    stats = asyncio.run(run())
+    assert stats["retries"] == 1
+    assert stats["failed"] == 3
+
+
+def test_enqueue_many_respects_queue_bound(db_path):
+    """A batch larger than the free queue space is partially accepted"""
+    async def run():
+        writer = EventWriter(db_path, max_queue_size=4)
+        writer.enqueue(sample_event())
+        accepted = writer.enqueue_many([sample_event(i) for i in range(5)])
+        await writer.start()
+        await writer.stop()
+        return accepted, writer.stats()
+
+    accepted, stats = asyncio.run(run())
+    assert accepted == 3
+    assert stats["dropped"] == 2
+    assert count_events(db_path) == 4
@@ -0,0 +1,64 @@
+import random
+
+import pytest
+
+from app.hll import DENSE, SPARSE, HyperLogLog, merge_all
+
+
+def sketch(values, p=12):
+    hll = HyperLogLog(p)
+    hll.update(values)
+    return hll
+
+
+@pytest.mark.parametrize("n", [0, 1, 100, 5_000, 100_000])
+def test_count_within_error_bound(n):
+    # 1.04 / sqrt(4096) = 1.6%; four standard errors keeps this deterministic
+    # test far from flaky while still catching a broken estimator
+    estimate = sketch(f"visitor-{i}" for i in range(n)).count()
+    assert abs(estimate - n) <= max(1, 4 * 0.0163 * n)
+
+
+def test_duplicates_are_counted_once():
+    assert sketch(f"visitor-{i % 50}" for i in range(10_000)).count() == 50
+
+
+def test_merge_is_the_sketch_of_the_union():
+    rng = random.Random(3)
+    hours = [[f"visitor-{rng.randrange(30_000)}" for _ in range(2_000)] for _ in range(24)]
+    union = sketch(value for hour in hours for value in hour)
+
+    merged = HyperLogLog()
+    for hour in hours:
+        merged.merge(sketch(hour))
+    assert merged.registers == union.registers
+    assert merge_all((sketch(hour).to_bytes() for hour in hours), 12).registers == union.registers
+    distinct = len({value for hour in hours for value in hour})
+    assert abs(merged.count() - distinct) <= 4 * 0.0163 * distinct
+
+
+def test_encoding_round_trips_sparse_and_dense():
+    small, large = sketch(map(str, range(30))), sketch(map(str, range(50_000)))
+    assert small.to_bytes()[0] == SPARSE and len(small.to_bytes()) == 2 + 3 * 30
+    assert large.to_bytes()[0] == DENSE and len(large.to_bytes()) == 2 + 4096
+    for hll in (small, large):
+        assert HyperLogLog.from_bytes(hll.to_bytes()).registers == hll.registers
+
+
+def test_lower_precision_merges_like_a_sketch_built_at_it():
+    values = [f"v{i}" for i in range(20_000)]
+    assert sketch(values, 14).reduce(10).registers == sketch(values, 10).registers
+
+    mixed = sketch(values[:10_000], 14)
+    mixed.merge_bytes(sketch(values[10_000:], 10).to_bytes())
+    assert mixed.p == 10
+    assert mixed.registers == sketch(values, 10).registers
+
+
+def test_rejects_bad_input():
+    with pytest.raises(ValueError):
+        HyperLogLog(20)
+    with pytest.raises(ValueError):
+        HyperLogLog.from_bytes(bytes([DENSE, 12]) + b"\0" * 10)
+    with pytest.raises(ValueError):
+        HyperLogLog.from_bytes(bytes([9, 12]))
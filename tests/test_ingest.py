@@ -0,0 +1,90 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from app.db import close_pools, connect, create_site, init_db, site_owner_cache
+from app.event_writer import event_writer
+from app.main import app
+from app.settings import settings
+
+
+@pytest.fixture
+def site_id(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "DATABASE_PATH", str(tmp_path / "ingest.db"))
+    site_owner_cache.clear()
+
+    async def seed():
+        await init_db()
+        db = await connect()
+        site = await create_site(db, "user-1", "example.com")
+        await db.close()
+        return site.id
+
+    yield asyncio.run(seed())
+    site_owner_cache.clear()
+
+
+@pytest.fixture
+def queued(monkeypatch):
+    batches = []
+
+    def enqueue_many(events):
+        batches.append(events)
+        return len(events)
+
+    monkeypatch.setattr(event_writer, "enqueue_many", enqueue_many)
+    return batches
+
+
+def post(body, content_type="text/plain"):
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            response = await client.post("/v1/ingest", content=body,
+                                         headers={"content-type": content_type, "user-agent": "UA"})
+        await close_pools()
+        return response
+
+    return asyncio.run(run())
+
+
+def test_single_event(site_id, queued):
+    response = post(json.dumps({"site_id": site_id, "path": "/pricing"}))
+    assert response.status_code == 204
+    assert response.content == b""
+    [[event]] = queued
+    assert event["kind"] == "pageview"
+    assert event["user_id"] == "user-1"
+    assert event["path"] == "/pricing"
+    assert len(event["ua_hash"]) == 64
+
+
+def test_batch_is_queued_in_one_call(site_id, queued):
+    events = [{"site_id": site_id, "path": f"/p/{i}"} for i in range(20)]
+    assert post(json.dumps(events), "application/json").status_code == 204
+    assert len(queued) == 1
+    assert len(queued[0]) == 20
+
+
+def test_unknown_site_is_dropped(site_id, queued):
+    body = json.dumps([{"site_id": site_id}, {"site_id": "nope"}])
+    assert post(body).status_code == 204
+    assert [e["site_id"] for e in queued[0]] == [site_id]
+
+
+@pytest.mark.parametrize("body", [
+    "not json",
+    json.dumps({"path": "/"}),
+    json.dumps([{"site_id": "s", "kind": "purchase"}]),
+    json.dumps([{"site_id": "s", "path": 42}]),
+])
+def test_invalid_payloads_rejected(site_id, queued, body):
+    assert post(body).status_code == 400
+    assert queued == []
+
+
+def test_oversized_batch_rejected(site_id, queued):
+    events = [{"site_id": site_id}] * (settings.INGEST_MAX_EVENTS + 1)
+    assert post(json.dumps(events)).status_code == 413
@@ -0,0 +1,110 @@
+import asyncio
+import time
+
+import pytest
+
+from app.cache import TTLCache
+from app.db import (connect, create_site, create_tracked_link, delete_site, delete_tracked_link,
+                    init_db, link_cache, resolve_short_code)
+from app.settings import settings
+from app.tracking import add_utm_params
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    path = str(tmp_path / "links.db")
+    monkeypatch.setattr(settings, "DATABASE_PATH", path)
+    asyncio.run(init_db())
+    link_cache.clear()
+    yield path
+    link_cache.clear()
+
+
+async def seed_link(db, short_code="abc123"):
+    site = await create_site(db, "user-1", "example.com")
+    link = await create_tracked_link(db, "user-1", site.id, "https://example.com/post?ref=1",
+                                     "x", short_code, "x", "social", "launch")
+    return site, link
+
+
+def test_lru_evicts_least_recently_used():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.lookup("a")
+    cache.set("c", 3)
+    assert cache.lookup("b") == (False, None)
+    assert cache.lookup("a") == (True, 1)
+    assert cache.stats()["evictions"] == 1
+
+
+def test_entries_expire():
+    cache = TTLCache(maxsize=10, ttl=0.01)
+    cache.set("a", None)
+    assert cache.lookup("a") == (True, None)
+    time.sleep(0.02)
+    assert cache.lookup("a") == (False, None)
+    assert cache.stats()["expirations"] == 1
+
+
+def test_add_utm_params_keeps_existing_query():
+    url = add_utm_params("https://example.com/p?ref=1&utm_source=news", "x", "social", "launch")
+    assert url == "https://example.com/p?ref=1&utm_source=news&utm_medium=social&utm_campaign=launch"
+
+
+def test_resolve_is_served_from_cache(db_path):
+    async def run():
+        db = await connect()
+        _, link = await seed_link(db)
+        first = await resolve_short_code(db, "abc123")
+        second = await resolve_short_code(db, "abc123")
+        await db.close()
+        return link, first, second
+
+    link, first, second = asyncio.run(run())
+    assert first is second
+    assert first.link_id == link.id
+    assert first.redirect_url.endswith("ref=1&utm_source=x&utm_medium=social&utm_campaign=launch")
+    assert link_cache.stats()["hits"] == 1
+
+
+def test_misses_are_cached_until_link_created(db_path):
+    async def run():
+        db = await connect()
+        missing = await resolve_short_code(db, "abc123")
+        cached_miss = link_cache.lookup("abc123")
+        await seed_link(db)
+        found = await resolve_short_code(db, "abc123")
+        await db.close()
+        return missing, cached_miss, found
+
+    missing, cached_miss, found = asyncio.run(run())
+    assert missing is None
+    assert cached_miss == (True, None)
+    assert found is not None
+
+
+def test_delete_tracked_link_invalidates(db_path):
+    async def run():
+        db = await connect()
+        _, link = await seed_link(db)
+        await resolve_short_code(db, "abc123")
+        await delete_tracked_link(db, link.id, "user-1")
+        resolved = await resolve_short_code(db, "abc123")
+        await db.close()
+        return resolved
+
+    assert asyncio.run(run()) is None
+
+
+def test_delete_site_invalidates_its_links(db_path):
+    async def run():
+        db = await connect()
+        site, _ = await seed_link(db)
+        await resolve_short_code(db, "abc123")
+        await delete_site(db, site.id, "user-1")
+        resolved = await resolve_short_code(db, "abc123")
+        await db.close()
+        return resolved
+
+    assert asyncio.run(run()) is None
@@ -0,0 +1,176 @@
+import asyncio
+import sqlite3
+
+import httpx
+import pytest
+
+from app.auth import get_current_user
+from app.db import close_pools, connect, create_site, get_user_tracked_links, init_db, link_cache
+from app.link_import import import_links, parse_rows, site_for_host
+from app.main import app
+from app.models import User
+from app.settings import settings
+from app.short_codes import short_code_allocator
+
+USER = User(id="user-1", email="a@example.com", username="alice", hashed_password="x")
+
+
+@pytest.fixture
+def client_app(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "DATABASE_PATH", str(tmp_path / "import.db"))
+    asyncio.run(init_db())
+    short_code_allocator.reset()
+    app.dependency_overrides[get_current_user] = lambda: USER
+    yield app
+    app.dependency_overrides.clear()
+
+
+async def upload(path, content: bytes):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        return await client.post(path, files={"file": ("links.csv", content, "text/csv")})
+
+
+async def user_sites(*domains):
+    db = await connect()
+    try:
+        return [await create_site(db, USER.id, domain) for domain in domains]
+    finally:
+        await db.close()
+
+
+async def user_links():
+    db = await connect()
+    try:
+        return await get_user_tracked_links(db, USER.id)
+    finally:
+        await db.close()
+
+
+def test_hosts_match_their_site_or_a_parent_domain():
+    domains = {"example.com": "s1", "blog.other.org": "s2"}
+    assert site_for_host(domains, "example.com") == "s1"
+    assert site_for_host(domains, "www.example.com") == "s1"
+    assert site_for_host(domains, "blog.other.org") == "s2"
+    assert site_for_host(domains, "other.org") is None
+    assert site_for_host(domains, "notexample.com") is None
+
+
+def test_parse_reports_bad_rows_by_line():
+    csv_text = [
+        "URL,Source,Campaign\n",
+        "example.com/a,X,launch\n",
+        "https://example.com/b,mastodon,\n",
+        ",x,\n",
+        "https://elsewhere.com/c,reddit,\n",
+        "https://www.example.com/d,reddit,\n",
+    ]
+    rows, errors = parse_rows(csv_text, {"example.com": "s1"}, 100)
+    assert rows == [(2, "s1", "https://example.com/a", "x", "launch"),
+                    (6, "s1", "https://www.example.com/d", "reddit", "link_tracking")]
+    assert [(e.line, e.error) for e in errors] == [
+        (3, "Invalid source"), (4, "URL is required"), (5, "URL must belong to one of your sites")]
+
+
+def test_parse_rejects_unusable_files():
+    with pytest.raises(ValueError):
+        parse_rows(["link,source\n", "https://example.com,x\n"], {}, 100)
+    with pytest.raises(ValueError):
+        parse_rows(["url,source\n"] + ["https://example.com,x\n"] * 3, {"example.com": "s1"}, 2)
+
+
+def test_import_creates_links_in_one_transaction(client_app):
+    site, other = asyncio.run(user_sites("example.com", "other.com"))
+    lines = ["url,source,campaign\n"] + [f"https://example.com/{i},x,bulk\n" for i in range(300)]
+    lines += ["https://other.com/x,linkedin,\n", "https://nope.com/x,x,\n"]
+
+    async def run():
+        db = await connect()
+        try:
+            statements = []
+            await db.set_trace_callback(statements.append)
+            report = await import_links(db, USER.id, lines)
+            await db.set_trace_callback(None)
+        finally:
+            await db.close()
+        return report, statements
+
+    report, statements = asyncio.run(run())
+    assert len(report.links) == 301 and report.lines[:2] == [2, 3]
+    assert [e.line for e in report.errors] == [303]
+    assert len({link.short_code for link in report.links}) == 301
+    assert sum(sql.strip().startswith("INSERT INTO tracked_links") for sql in statements) == 301
+    # One commit for the links, after the short-code block reservation's own
+    inserts = [i for i, sql in enumerate(statements) if sql.strip().startswith("INSERT INTO tracked_links")]
+    assert statements[inserts[0]:].count("COMMIT") == 1
+
+    links = asyncio.run(user_links())
+    assert len(links) == 301
+    assert {link.site_id for link in links} == {site.id, other.id}
+    assert {link.utm_campaign for link in links} == {"bulk", "link_tracking"}
+
+
+def test_collision_with_an_old_random_code_is_retried(client_app, monkeypatch):
+    site, = asyncio.run(user_sites("example.com"))
+    with sqlite3.connect(settings.DATABASE_PATH) as conn:
+        conn.execute('''
+            INSERT INTO tracked_links (id, user_id, site_id, original_url, source, short_code, utm_source, created_at)
+            VALUES ('old', ?, ?, 'https://example.com/old', 'x', 'AAAAAA', 'x', '2025-01-01T00:00:00+00:00')
+        ''', (USER.id, site.id))
+    draws = iter([["AAAAAA", "BBBBBB"], ["CCCCCC", "DDDDDD"]])
+
+    async def allocate(db, count=1):
+        return next(draws)
+    monkeypatch.setattr(short_code_allocator, "allocate", allocate)
+
+    async def run():
+        db = await connect()
+        try:
+            return await import_links(db, USER.id, ["url,source\n", "example.com/1,x\n", "example.com/2,x\n"])
+        finally:
+            await db.close()
+
+    report = asyncio.run(run())
+    assert [link.short_code for link in report.links] == ["CCCCCC", "DDDDDD"]
+    assert len(asyncio.run(user_links())) == 3
+
+
+def test_new_codes_clear_remembered_misses(client_app):
+    asyncio.run(user_sites("example.com"))
+
+    async def run():
+        db = await connect()
+        try:
+            report = await import_links(db, USER.id, ["url,source\n", "example.com/1,x\n"])
+        finally:
+            await db.close()
+        return report
+
+    link_cache.clear()
+    report = asyncio.run(run())
+    assert link_cache.lookup(report.links[0].short_code) == (False, None)
+
+
+def test_upload_endpoints(client_app):
+    asyncio.run(user_sites("example.com"))
+
+    async def run():
+        try:
+            page = await upload("/links/upload", b"url,source\nexample.com/a,x\nelsewhere.com/b,x\n")
+            api = await upload("/links/api/bulk", b"url,source,campaign\nexample.com/c,reddit,spring\n")
+            bad = await upload("/links/api/bulk", b"link\nexample.com\n")
+            binary = await upload("/links/api/bulk", b"url,source\n\xff\xfe,x\n")
+        finally:
+            await close_pools()
+        return page, api, bad, binary
+
+    page, api, bad, binary = asyncio.run(run())
+    assert page.status_code == 200
+    assert "Created 1 link" in page.text and "Skipped 1 row" in page.text
+    assert api.status_code == 200
+    body = api.json()
+    assert body["errors"] == [] and body["created"][0]["line"] == 2
+    assert body["created"][0]["original_url"] == "https://example.com/c"
+    assert bad.status_code == 400
+    assert binary.status_code == 400
+    assert len(asyncio.run(user_links())) == 2
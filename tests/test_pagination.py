@@ -0,0 +1,157 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import httpx
+import pytest
+
+from app.auth import get_current_user
+from app.db import (close_pools, connect, create_site, decode_cursor, encode_cursor, get_tracked_links_page,
+                    init_db)
+from app.main import app
+from app.models import User
+from app.settings import settings
+
+USER = User(id="user-1", email="a@example.com", username="alice", hashed_password="x")
+
+
+@pytest.fixture
+def client_app(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "DATABASE_PATH", str(tmp_path / "pages.db"))
+    asyncio.run(init_db())
+    app.dependency_overrides[get_current_user] = lambda: USER
+    yield app
+    app.dependency_overrides.clear()
+
+
+async def get(path):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        return await client.get(path)
+
+
+async def add_links(db, site_id, count, start=0, created_at=None):
+    """``count`` links, one second apart, or all sharing ``created_at``"""
+    base = datetime(2025, 3, 1)
+    await db.executemany('''
+        INSERT INTO tracked_links (id, user_id, site_id, original_url, source, short_code,
+                                   utm_source, utm_medium, utm_campaign, created_at, is_active)
+        VALUES (?, ?, ?, ?, 'x', ?, 'x', 'social', 'link_tracking', ?, 1)
+    ''', [(f"link-{site_id}-{i:03d}", USER.id, site_id, f"https://example.com/{i}", f"{site_id[:4]}{i:03d}",
+           (created_at or base + timedelta(seconds=i)).isoformat()) for i in range(start, start + count)])
+    await db.commit()
+
+
+def test_cursor_round_trip_and_rejects_garbage():
+    created = datetime(2025, 3, 1, 12, 30, 15, 123456)
+    assert decode_cursor(encode_cursor(created, "link-1")) == (created.isoformat(), "link-1")
+    for bad in ("", "not a cursor", "bm9waXBl"):
+        with pytest.raises(ValueError):
+            decode_cursor(bad)
+
+
+def test_pages_cover_every_link_once_despite_inserts(client_app):
+    async def run():
+        db = await connect()
+        try:
+            site = await create_site(db, USER.id, "example.com")
+            await add_links(db, site.id, 25)
+            seen, cursor, pages = [], None, 0
+            while True:
+                page = await get_tracked_links_page(db, USER.id, 10, cursor)
+                seen += [link.id for link in page.items]
+                pages += 1
+                if pages == 1:
+                    # Newer links arriving mid-scroll must not shift later pages
+                    await add_links(db, site.id, 5, start=100)
+                if not page.next_cursor:
+                    return site.id, seen, pages
+                cursor = page.next_cursor
+        finally:
+            await db.close()
+
+    site_id, seen, pages = asyncio.run(run())
+    assert pages == 3
+    assert seen == [f"link-{site_id}-{i:03d}" for i in range(24, -1, -1)]
+
+
+def test_ties_on_created_at_are_broken_by_id(client_app):
+    async def run():
+        db = await connect()
+        try:
+            site = await create_site(db, USER.id, "example.com")
+            await add_links(db, site.id, 7, created_at=datetime(2025, 3, 1))
+            seen, cursor = [], None
+            while True:
+                page = await get_tracked_links_page(db, USER.id, 3, cursor)
+                seen += [link.id for link in page.items]
+                if not (cursor := page.next_cursor):
+                    return seen
+        finally:
+            await db.close()
+
+    seen = asyncio.run(run())
+    assert seen == sorted(seen, reverse=True) and len(set(seen)) == 7
+
+
+def test_api_pages_links_by_site(client_app):
+    async def run():
+        db = await connect()
+        try:
+            site = await create_site(db, USER.id, "example.com")
+            other = await create_site(db, USER.id, "other.com")
+            await add_links(db, site.id, 3)
+            await add_links(db, other.id, 4)
+        finally:
+            await db.close()
+        first = await get(f"/links/api/list?limit=2&site_id={other.id}")
+        second = await get(f"/links/api/list?limit=2&site_id={other.id}&cursor={first.json()['next_cursor']}")
+        everything = await get("/links/api/list")
+        await close_pools()
+        return other, first, second, everything
+
+    other, first, second, everything = asyncio.run(run())
+    assert first.status_code == second.status_code == 200
+    assert first.headers["etag"] != second.headers["etag"]
+    links = first.json()["links"] + second.json()["links"]
+    assert len(links) == 4 and {link["site_id"] for link in links} == {other.id}
+    assert second.json()["next_cursor"] is None
+    assert len(everything.json()["links"]) == 7 and everything.json()["next_cursor"] is None
+
+
+def test_bad_cursor_and_limit_are_rejected(client_app):
+    async def run():
+        responses = [await get(path) for path in (
+            "/links/api/list?cursor=garbage",
+            "/sites/api/list?cursor=garbage",
+            "/links/rows?cursor=garbage",
+            f"/links/api/list?limit={settings.LIST_PAGE_MAX_SIZE + 1}",
+        )]
+        await close_pools()
+        return [r.status_code for r in responses]
+
+    assert asyncio.run(run()) == [400, 400, 400, 422]
+
+
+def test_links_page_renders_first_page_and_rows_continue(client_app, monkeypatch):
+    monkeypatch.setattr(settings, "LIST_PAGE_SIZE", 10)
+
+    async def run():
+        db = await connect()
+        try:
+            site = await create_site(db, USER.id, "example.com")
+            await add_links(db, site.id, 15)
+        finally:
+            await db.close()
+        page = await get("/links/")
+        cursor = (await get("/links/api/list?limit=10")).json()["next_cursor"]
+        rows = await get(f"/links/rows?cursor={cursor}")
+        await close_pools()
+        return page, rows
+
+    page, rows = asyncio.run(run())
+    assert page.status_code == 200
+    assert page.text.count('onclick="copyShortUrl(') == 10
+    assert 'hx-trigger="revealed"' in page.text and "/links/rows?cursor=" in page.text
+    assert rows.status_code == 200
+    assert rows.text.count('onclick="copyShortUrl(') == 5
+    assert 'hx-trigger="revealed"' not in rows.text
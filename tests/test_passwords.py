@@ -0,0 +1,82 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from app import auth
+from app.db import close_pools
+from app.models import User
+from app.passwords import PasswordBusy, PasswordExecutor
+from app.settings import settings
+
+
+def slow_hash(seconds):
+    time.sleep(seconds)
+    return "hashed"
+
+
+def test_hashing_does_not_block_the_event_loop():
+    executor = PasswordExecutor(max_workers=1)
+
+    async def run():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        task = asyncio.create_task(ticker())
+        result = await executor.run(slow_hash, 0.2)
+        task.cancel()
+        return result, ticks
+
+    result, ticks = asyncio.run(run())
+    executor.shutdown()
+    assert result == "hashed"
+    assert ticks >= 10
+
+
+def test_rejects_work_beyond_workers_and_queue():
+    executor = PasswordExecutor(max_workers=1, max_queue=1)
+
+    async def run():
+        return await asyncio.gather(*(executor.run(slow_hash, 0.05) for _ in range(3)),
+                                    return_exceptions=True)
+
+    results = asyncio.run(run())
+    executor.shutdown()
+    assert results.count("hashed") == 2
+    assert sum(isinstance(r, PasswordBusy) for r in results) == 1
+    stats = executor.stats()
+    assert stats["completed"] == 2
+    assert stats["rejected"] == 1
+    assert stats["max_wait_ms"] >= 40
+
+
+def test_login_returns_503_when_password_pool_is_full(tmp_path, monkeypatch):
+    from app.main import app
+
+    monkeypatch.setattr(settings, "DATABASE_PATH", str(tmp_path / "login.db"))
+
+    async def get_user_by_email(db, email):
+        return User(id="user-1", email=email, username="alice", hashed_password="x")
+
+    async def verify_password_async(plain_password, hashed_password):
+        raise PasswordBusy()
+
+    monkeypatch.setattr(auth, "get_user_by_email", get_user_by_email)
+    monkeypatch.setattr(auth, "verify_password_async", verify_password_async)
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            response = await client.post("/auth/login", data={"email": "a@example.com", "password": "secret123"})
+        await close_pools()
+        return response
+
+    response = asyncio.run(run())
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "1"
@@ -0,0 +1,449 @@
+"""Query-plan regression suite for the SQL in app/db.py.
+
+Every public function in app.db that takes a connection is run against a
+synthetic dataset with an SQLite trace callback attached. Each captured
+statement goes through EXPLAIN QUERY PLAN and the test fails if it scans a
+whole table, unless the case lists that table as an expected scan, or sorts
+rows for ORDER BY that an index could have returned in order. Calls are also
+timed against a latency budget. Adding a query function without a case
+here fails test_every_query_function_has_a_case.
+"""
+
+import asyncio
+import inspect
+import random
+import sqlite3
+import time
+import uuid
+from typing import Callable, NamedTuple
+
+import pytest
+
+import app.db as app_db
+from app.db import (DAY_MS, connect, data_version_cache, entity_key_cache, event_partition, event_partition_ddl,
+                    event_row, init_db, link_cache, now_ms, site_owner_cache, site_scope, user_scope)
+from app.models import UserCreate
+from app.settings import settings
+
+USERS = 200
+SITES_PER_USER = 5
+LINKS_PER_SITE = 10
+EVENTS = 100_000
+LEGACY_EVENTS = 500
+UNPARTITIONED_EVENTS = 500
+DAYS = 30
+EXPIRED_DAYS_AGO = 400
+
+READ_BUDGET_MS = 25.0
+WRITE_BUDGET_MS = 100.0
+
+DML = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH')
+
+
+class Case(NamedTuple):
+    run: Callable
+    budget_ms: float | None
+    repeat: bool
+    allow_scans: tuple
+    allow_sort: bool
+
+
+CASES: dict[str, Case] = {}
+
+
+def case(name, budget_ms=READ_BUDGET_MS, repeat=True, allow_scans=(), allow_sort=False):
+    """Register the workload that exercises app.db.<name>"""
+    def register(fn):
+        CASES[name] = Case(fn, budget_ms, repeat, allow_scans, allow_sort)
+        return fn
+    return register
+
+
+@pytest.fixture(scope="module")
+def dataset(tmp_path_factory):
+    """A database with USERS users, their sites and links, and EVENTS events"""
+    path = str(tmp_path_factory.mktemp("plans") / "plans.db")
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(settings, "DATABASE_PATH", path)
+        asyncio.run(init_db())
+        yield build_dataset(path)
+
+
+def build_dataset(path):
+    rng = random.Random(7)
+    now = now_ms()
+    users = [str(uuid.uuid4()) for _ in range(USERS)]
+    sites = [(str(uuid.uuid4()), user) for user in users for _ in range(SITES_PER_USER)]
+    links = [(str(uuid.uuid4()), user, site, f"q{i:06d}")
+             for i, (site, user) in enumerate((s for s in sites for _ in range(LINKS_PER_SITE)))]
+    links_by_site = {}
+    for link_id, _, site, _ in links:
+        links_by_site.setdefault(site, []).append(link_id)
+
+    with sqlite3.connect(path) as conn:
+        created = "2025-01-01T00:00:00+00:00"
+        conn.executemany("INSERT INTO users VALUES (?, ?, ?, 'x', ?, 1)",
+                         [(u, f"user{i}@example.com", f"user{i}", created) for i, u in enumerate(users)])
+        conn.executemany("INSERT INTO sites VALUES (?, ?, ?, ?, 1)",
+                         [(s, u, f"site{i}.example.com", created) for i, (s, u) in enumerate(sites)])
+        conn.executemany('''
+            INSERT INTO tracked_links (id, user_id, site_id, original_url, source, short_code,
+                                       utm_source, created_at)
+            VALUES (?, ?, ?, ?, 'x', ?, 'x', ?)
+        ''', [(l, u, s, f"https://example.com/{code}", code, created) for l, u, s, code in links])
+        conn.executemany("INSERT INTO entity_keys (uuid) VALUES (?)",
+                         [(u,) for u in users] + [(s,) for s, _ in sites] + [(l[0],) for l in links])
+        keys = dict(conn.execute("SELECT uuid, id FROM entity_keys").fetchall())
+
+        def events():
+            for _ in range(EVENTS):
+                site, user = rng.choice(sites)
+                click = rng.random() < 0.2
+                yield (now - rng.randrange(DAYS * 86_400_000), keys[site], keys[user],
+                       keys[rng.choice(links_by_site[site])] if click else None,
+                       "click" if click else "pageview", rng.choice(["x", "reddit", "linkedin", "other"]),
+                       f"/p/{rng.randrange(1000)}", f"ip{rng.randrange(20_000)}", f"ua{rng.randrange(50)}")
+
+        by_partition = {}
+        for row in events():
+            by_partition.setdefault(event_partition(row[0]), []).append(row)
+        # A day old enough for drop_event_partitions to expire
+        by_partition[event_partition(now - EXPIRED_DAYS_AGO * DAY_MS)] = [
+            (now - EXPIRED_DAYS_AGO * DAY_MS, keys[sites[0][0]], keys[sites[0][1]], None, "pageview", "x", "/", "ip0", "ua0")
+        ]
+        for name, rows in by_partition.items():
+            for sql in event_partition_ddl(name):
+                conn.execute(sql)
+            conn.executemany(f'''
+                INSERT INTO {name} (ts, site_key, user_key, link_key, kind, source, path, ip_hash, ua_hash)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', rows)
+            conn.execute(f'''
+                INSERT INTO events_hourly (site_id, kind, hour, tracked_link_id, source, count)
+                SELECT s.uuid, e.kind, e.ts / 3600000 * 3600, COALESCE(l.uuid, ''), e.source, COUNT(*)
+                FROM {name} e
+                JOIN entity_keys s ON s.id = e.site_key
+                LEFT JOIN entity_keys l ON l.id = e.link_key
+                GROUP BY 1, 2, 3, 4, 5
+                ON CONFLICT (site_id, kind, hour, tracked_link_id, source)
+                DO UPDATE SET count = count + excluded.count
+            ''')
+            sketches = app_db.visitor_sketches(conn.execute(f'''
+                SELECT s.uuid, e.ts, e.ip_hash, e.ua_hash FROM {name} e JOIN entity_keys s ON s.id = e.site_key
+                WHERE e.kind = 'pageview'
+            '''))
+            conn.executemany(app_db.VISITORS_HOURLY_SQL, [(site, hour, sketch.to_bytes())
+                                                          for (site, hour), sketch in sketches.items()])
+        conn.execute('''
+            CREATE TABLE events_legacy (
+                id TEXT PRIMARY KEY, tracked_link_id TEXT, site_id TEXT NOT NULL, user_id TEXT NOT NULL,
+                kind TEXT NOT NULL, ts TEXT NOT NULL, ip_hash TEXT, ua_hash TEXT, referer TEXT,
+                utm_source TEXT, utm_medium TEXT, utm_campaign TEXT, country TEXT, path TEXT,
+                session_id TEXT, source TEXT
+            )
+        ''')
+        conn.executemany('''
+            INSERT INTO events_legacy (id, site_id, user_id, kind, ts) VALUES (?, ?, ?, 'pageview', ?)
+        ''', [(str(uuid.uuid4()), sites[0][0], sites[0][1], created) for _ in range(LEGACY_EVENTS)])
+        # The single events table from before day partitions
+        conn.execute('''
+            CREATE TABLE events (
+                id INTEGER PRIMARY KEY, ts INTEGER NOT NULL, site_key INTEGER NOT NULL,
+                user_key INTEGER NOT NULL, link_key INTEGER, kind TEXT NOT NULL, source TEXT,
+                ip_hash TEXT, ua_hash TEXT, referer TEXT, utm_source TEXT, utm_medium TEXT,
+                utm_campaign TEXT, country TEXT, path TEXT, session_id TEXT
+            )
+        ''')
+        conn.executemany('''
+            INSERT INTO events (ts, site_key, user_key, kind, source) VALUES (?, ?, ?, 'pageview', 'x')
+        ''', [(now - rng.randrange(DAYS * DAY_MS), keys[sites[1][0]], keys[sites[1][1]])
+              for _ in range(UNPARTITIONED_EVENTS)])
+
+    return {
+        "users": users,
+        "sites": sites,
+        "links": links,
+        "spare_sites": sites[-3:],
+        "spare_links": links[-3:],
+    }
+
+
+# Users
+
+@case("create_user", WRITE_BUDGET_MS, repeat=False)
+async def _(db, data):
+    await app_db.create_user(db, UserCreate(email="new@example.com", username="new", password="pw"), "x")
+
+@case("get_user_by_email")
+async def _(db, data):
+    await app_db.get_user_by_email(db, "user42@example.com")
+
+@case("get_user_by_id")
+async def _(db, data):
+    await app_db.get_user_by_id(db, data["users"][42])
+
+@case("check_email_exists")
+async def _(db, data):
+    await app_db.check_email_exists(db, "user42@example.com")
+
+@case("check_username_exists")
+async def _(db, data):
+    await app_db.check_username_exists(db, "user42")
+
+# Data versions
+
+@case("bump_data_versions", WRITE_BUDGET_MS, repeat=False)
+async def _(db, data):
+    await app_db.bump_data_versions(db, [user_scope(data["users"][5]), site_scope(data["sites"][5][0])])
+    await db.commit()
+
+@case("get_data_version")
+async def _(db, data):
+    data_version_cache.clear()
+    await app_db.get_data_version(db, user_scope(data["users"][5]))
+
+# Sites
+
+@case("create_site", WRITE_BUDGET_MS, repeat=False)
+async def _(db, data):
+    await app_db.create_site(db, data["users"][0], "new.example.com")
+
+@case("get_user_sites")
+async def _(db, data):
+    await app_db.get_user_sites(db, data["users"][42])
+
+@case("get_sites_page")
+async def _(db, data):
+    page = await app_db.get_sites_page(db, data["users"][42], 1)
+    await app_db.get_sites_page(db, data["users"][42], 1, page.next_cursor)
+
+@case("get_site_owner")
+async def _(db, data):
+    site_owner_cache.clear()
+    await app_db.get_site_owner(db, data["sites"][42][0])
+
+@case("get_site_by_id")
+async def _(db, data):
+    site, user = data["sites"][42]
+    await app_db.get_site_by_id(db, site, user)
+
+@case("update_site", WRITE_BUDGET_MS, repeat=False)
+async def _(db, data):
+    site, user = data["spare_sites"][0]
+    await app_db.update_site(db, site, user, "renamed.example.com")
+
+@case("delete_site", WRITE_BUDGET_MS, repeat=False)
+async def _(db, data):
+    site, user = data["spare_sites"][1]
+    assert await app_db.delete_site(db, site, user)
+
+# Links
+
+@case("create_tracked_link", WRITE_BUDGET_MS, repeat=False)
+async def _(db, data):
+    site, user = data["sites"][0]
+    await app_db.create_tracked_link(db, user, site, "https://example.com/new", "x", "newcode1", "x")
+
+@case("create_tracked_links", WRITE_BUDGET_MS, repeat=False)
+async def _(db, data):
+    site, user = data["sites"][0]
+    await app_db.create_tracked_links(db, user, [
+        app_db.NewTrackedLink(site, f"https://example.com/bulk/{i}", "x", f"bulk{i:04d}", "x") for i in range(100)
+    ])
+
+@case("reserve_short_code_block", WRITE_BUDGET_MS, repeat=False)
+async def _(db, data):
+    start, _ = await app_db.reserve_short_code_block(db, 6, 1000, "00" * 16)
+    assert await app_db.reserve_short_code_block(db, 6, 1000, "11" * 16) == (start + 1000, "00" * 16)
+
+@case("get_tracked_link_by_short_code")
+async def _(db, data):
+    await app_db.get_tracked_link_by_short_code(db, data["links"][420][3])
+
+@case("resolve_short_code")
+async def _(db, data):
+    link_cache.clear()
+    await app_db.resolve_short_code(db, data["links"][420][3])
+
+@case("load_short_code")
+async def _(db, data):
+    await app_db.load_short_code(db, data["links"][420][3])
+
+@case("get_user_tracked_links")
+async def _(db, data):
+    site, user = data["sites"][42]
+    await app_db.get_user_tracked_links(db, user)
+    await app_db.get_user_tracked_links(db, user, site)
+
+@case("get_tracked_links_page")
+async def _(db, data):
+    site, user = data["sites"][42]
+    page = await app_db.get_tracked_links_page(db, user, 2)
+    await app_db.get_tracked_links_page(db, user, 2, page.next_cursor)
+    page = await app_db.get_tracked_links_page(db, user, 2, site_id=site)
+    await app_db.get_tracked_links_page(db, user, 2, page.next_cursor, site)
+
+@case("delete_tracked_link", WRITE_BUDGET_MS, repeat=False)
+async def _(db, data):
+    link_id, user, _, _ = data["spare_links"][0]
+    assert await app_db.delete_tracked_link(db, link_id, user)
+
+# Events and rollups
+
+def sample_rows(data, n=50):
+    site, user = data["sites"][7]
+    return [event_row({"site_id": site, "user_id": user, "kind": "pageview", "referer": "https://t.co/x",
+                       "ip_hash": f"ip{i}", "ua_hash": "ua"}, now_ms()) for i in range(n)]
+
+@case("get_entity_keys")
+async def _(db, data):
+    entity_key_cache.clear()
+    await app_db.get_entity_keys(db, [data["users"][3], data["sites"][3][0]])
+
+@case("create_event", WRITE_BUDGET_MS, repeat=False)
+async def _(db, data):
+    site, user = data["sites"][7]
+    assert await app_db.create_event(db, {"site_id": site, "user_id": user, "kind": "pageview"})
+
+@case("create_events", WRITE_BUDGET_MS, repeat=False)
+async def _(db, data):
+    await app_db.create_events(db, sample_rows(data))
+
+@case("update_hourly_rollup", WRITE_BUDGET_MS, repeat=False)
+async def _(db, data):
+    await app_db.update_hourly_rollup(db, sample_rows(data))
+    await db.rollback()
+
+@case("update_visitor_sketches", WRITE_BUDGET_MS, repeat=False)
+async def _(db, data):
+    await app_db.update_visitor_sketches(db, sample_rows(data))
+    await db.rollback()
+
+@case("list_event_partitions")
+async def _(db, data):
+    await app_db.list_event_partitions(db, now_ms() - DAY_MS, now_ms())
+
+@case("count_site_events")
+async def _(db, data):
+    await app_db.count_site_events(db, data["sites"][42][0], now_ms() - 7 * DAY_MS, now_ms())
+
+@case("drop_event_partitions", WRITE_BUDGET_MS, repeat=False)
+async def _(db, data):
+    assert len(await app_db.drop_event_partitions(db, now_ms() - (EXPIRED_DAYS_AGO - 1) * DAY_MS)) == 1
+
+# Maintenance jobs walk whole tables on purpose, in primary-key batches;
+# the partial rebuild clears recent hours of the rollup table
+@case("rebuild_hourly_rollup", None, repeat=False, allow_scans=("events_hourly",))
+async def _(db, data):
+    assert await app_db.rebuild_hourly_rollup(db) >= EVENTS
+    await app_db.rebuild_hourly_rollup(db, since_ms=now_ms() - DAY_MS)
+
+@case("rebuild_visitor_sketches", None, repeat=False, allow_scans=("visitors_hourly",))
+async def _(db, data):
+    await app_db.rebuild_visitor_sketches(db)
+    await app_db.rebuild_visitor_sketches(db, since_ms=now_ms() - DAY_MS)
+
+@case("backfill_event_sources", None, repeat=False)
+async def _(db, data):
+    await app_db.backfill_event_sources(db)
+
+@case("migrate_legacy_events", None, repeat=False, allow_scans=("events_legacy",))
+async def _(db, data):
+    assert await app_db.migrate_legacy_events(db, batch_size=200) == LEGACY_EVENTS
+
+@case("partition_events", None, repeat=False, allow_scans=("events",))
+async def _(db, data):
+    assert await app_db.partition_events(db, batch_size=200) == UNPARTITIONED_EVENTS
+
+@case("get_24h_traffic_by_source")
+async def _(db, data):
+    await app_db.get_24h_traffic_by_source(db, data["sites"][42][0])
+
+@case("get_unique_visitors")
+async def _(db, data):
+    await app_db.get_unique_visitors(db, data["sites"][42][0], now_ms() - 7 * DAY_MS, now_ms())
+
+@case("get_24h_unique_visitors")
+async def _(db, data):
+    await app_db.get_24h_unique_visitors(db, data["sites"][42][0])
+
+# Ordered by the aggregated click count, which no index can provide
+@case("get_24h_clicks_by_link", allow_sort=True)
+async def _(db, data):
+    await app_db.get_24h_clicks_by_link(db, data["sites"][42][0])
+
+
+def query_functions() -> set[str]:
+    """Public coroutines in app.db whose first parameter is a connection"""
+    names = set()
+    for name, fn in inspect.getmembers(app_db, inspect.iscoroutinefunction):
+        if name.startswith('_') or fn.__module__ != app_db.__name__:
+            continue
+        params = list(inspect.signature(fn).parameters)
+        if params and params[0] == 'db':
+            names.add(name)
+    return names
+
+
+def full_scans(plan: list[tuple]) -> list[str]:
+    """Tables an EXPLAIN QUERY PLAN walks end to end.
+
+    Scans of materialized subqueries and co-routines are fine; they are
+    already filtered by the plan steps that build them.
+    """
+    derived = set()
+    scans = []
+    for _, _, _, detail in plan:
+        words = detail.split()
+        if words[0] in ('MATERIALIZE', 'CO-ROUTINE'):
+            derived.add(words[1])
+        elif words[0] == 'SCAN' and words[1] not in derived | {'CONSTANT', 'sqlite_master'}:
+            scans.append(detail)
+    return scans
+
+
+def test_every_query_function_has_a_case():
+    assert query_functions() == set(CASES)
+
+
+@pytest.mark.parametrize("name", sorted(CASES))
+def test_query_plan_and_latency(dataset, name):
+    check = CASES[name]
+
+    async def run():
+        db = await connect()
+        try:
+            statements = []
+            await db.set_trace_callback(statements.append)
+            timings = []
+            for _ in range(3 if check.repeat else 1):
+                started = time.perf_counter()
+                await check.run(db, dataset)
+                timings.append((time.perf_counter() - started) * 1000)
+            await db.set_trace_callback(None)
+
+            plans = {}
+            for sql in dict.fromkeys(statements):
+                if not sql.lstrip().upper().startswith(DML):
+                    continue
+                try:
+                    async with db.execute(f'EXPLAIN QUERY PLAN {sql}') as cursor:
+                        plans[sql] = [tuple(row) for row in await cursor.fetchall()]
+                except sqlite3.OperationalError as e:
+                    # Migrations and retention drop the tables they drain before we get here
+                    table = str(e).removeprefix('no such table: ')
+                    if table not in check.allow_scans and f'DROP TABLE {table}' not in statements:
+                        raise
+            return min(timings), plans
+        finally:
+            await db.close()
+
+    elapsed_ms, plans = asyncio.run(run())
+    assert plans, f"{name} ran no SQL"
+    for sql, plan in plans.items():
+        scans = [s for s in full_scans(plan) if s.split()[1] not in check.allow_scans]
+        assert not scans, f"{name} scans a whole table: {scans}\n{sql}"
+        sorts = [detail for *_, detail in plan if detail == 'USE TEMP B-TREE FOR ORDER BY']
+        assert check.allow_sort or not sorts, f"{name} sorts without an index\n{sql}"
+    if check.budget_ms is not None:
+        assert elapsed_ms <= check.budget_ms, f"{name} took {elapsed_ms:.1f} ms (budget {check.budget_ms} ms)"
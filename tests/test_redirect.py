@@ -0,0 +1,68 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app.db import close_pools, connect, create_site, create_tracked_link, init_db, link_cache
+from app.event_writer import event_writer
+from app.main import app
+from app.settings import settings
+
+
+@pytest.fixture
+def short_code(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "DATABASE_PATH", str(tmp_path / "redirect.db"))
+    link_cache.clear()
+
+    async def seed():
+        await init_db()
+        db = await connect()
+        site = await create_site(db, "user-1", "example.com")
+        await create_tracked_link(db, "user-1", site.id, "https://example.com/post",
+                                  "x", "abc123", "x", "social", "launch")
+        await db.close()
+
+    asyncio.run(seed())
+    yield "abc123"
+    link_cache.clear()
+
+
+def get(path, headers=None):
+    async def run():
+        transport = httpx.ASGITransport(app=app, client=("203.0.113.9", 1234))
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            response = await client.get(path, headers=headers)
+        await close_pools()
+        return response
+
+    return asyncio.run(run())
+
+
+def test_redirect_queues_click(short_code, monkeypatch):
+    queued = []
+    monkeypatch.setattr(event_writer, "enqueue", queued.append)
+
+    response = get(f"/{short_code}", headers={"user-agent": "UA", "referer": "https://t.co/x"})
+
+    assert response.status_code == 302
+    assert response.headers["location"] == (
+        "https://example.com/post?utm_source=x&utm_medium=social&utm_campaign=launch")
+    assert response.headers["cache-control"] == "no-store"
+    assert len(queued) == 1
+    event = queued[0]
+    assert event["kind"] == "click"
+    assert event["site_id"] and event["tracked_link_id"]
+    assert event["referer"] == "https://t.co/x"
+    assert event["utm_campaign"] == "launch"
+    assert len(event["ip_hash"]) == 64 and "203.0.113.9" not in event["ip_hash"]
+
+
+def test_unknown_code_is_404(short_code):
+    assert get("/zzz999").status_code == 404
+    assert get("/favicon.ico").status_code == 404
+
+
+def test_router_prefixes_are_not_treated_as_codes(short_code):
+    response = get("/links?success=created")
+    assert response.status_code == 307
+    assert response.headers["location"].endswith("/links/?success=created")
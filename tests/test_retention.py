@@ -0,0 +1,101 @@
+import asyncio
+import sqlite3
+
+import pytest
+
+from app.db import (DAY_MS, connect, create_events, event_row, get_24h_traffic_by_source, init_db,
+                    list_event_partitions, now_ms)
+from app.retention import RetentionJob, run_retention
+from app.settings import settings
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    path = str(tmp_path / "retention.db")
+    monkeypatch.setattr(settings, "DATABASE_PATH", path)
+    return path
+
+
+def pageviews(days_ago, n):
+    ts = now_ms() - days_ago * DAY_MS
+    return [event_row({"site_id": "site-a", "user_id": "user-1", "kind": "pageview",
+                       "path": f"/a/long/enough/path/{i:06d}" * 4}, ts) for i in range(n)]
+
+
+async def seed(db):
+    for days_ago in (100, 95, 91):
+        await create_events(db, pageviews(days_ago, 3000))
+    await create_events(db, pageviews(0, 10))
+
+
+def test_new_databases_use_incremental_vacuum(db_path):
+    asyncio.run(init_db())
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+
+
+def test_expired_days_are_dropped_and_space_returned(db_path):
+    async def run():
+        await init_db()
+        db = await connect()
+        try:
+            await seed(db)
+            before = await list_event_partitions(db)
+            report = await run_retention(db, retention_days=90, vacuum_pages=50)
+            after = await list_event_partitions(db)
+            traffic = await get_24h_traffic_by_source(db, "site-a")
+            async with db.execute("SELECT SUM(count) FROM events_hourly") as cursor:
+                rolled_up = (await cursor.fetchone())[0]
+        finally:
+            await db.close()
+        return before, report, after, traffic, rolled_up
+
+    before, report, after, traffic, rolled_up = asyncio.run(run())
+    assert len(before) == 4 and len(after) == 1
+    assert report.partitions_dropped == before[:3]
+    assert report.rows_removed == 9000
+    assert report.vacuum_enabled
+    assert report.pages_vacuumed > 0
+    assert report.bytes_freed > 0
+    # One transaction per dropped day plus several bounded vacuum steps
+    assert report.transactions > 4
+    assert report.lock_ms_max <= report.lock_ms_total
+    # Rollups outlive the raw events
+    assert rolled_up == 9010
+    assert sum(r["visits"] for r in traffic) == 10
+
+
+def test_databases_without_incremental_vacuum_still_drop(db_path):
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("CREATE TABLE placeholder (x)")
+
+    async def run():
+        await init_db()
+        db = await connect()
+        try:
+            await seed(db)
+            return await run_retention(db, retention_days=90)
+        finally:
+            await db.close()
+
+    report = asyncio.run(run())
+    assert not report.vacuum_enabled
+    assert report.rows_removed == 9000
+    assert report.bytes_freed == 0
+
+
+def test_job_records_its_last_report(db_path):
+    async def run():
+        await init_db()
+        db = await connect()
+        await seed(db)
+        await db.close()
+        job = RetentionJob(interval=0)
+        job.start()  # disabled by interval=0
+        assert not job.running
+        await job.run_once()
+        return job.stats()
+
+    stats = asyncio.run(run())
+    assert stats["runs"] == 1
+    assert stats["last_report"]["rows_removed"] == 9000
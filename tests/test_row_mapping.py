@@ -0,0 +1,62 @@
+import asyncio
+from datetime import datetime
+
+from app.db import (SITE_ROWS, TRACKED_LINK_ROWS, USER_ROWS, connect, create_site, create_tracked_link,
+                    create_user, get_site_by_id, get_tracked_link_by_short_code, get_user_by_email,
+                    get_user_sites, get_user_tracked_links, init_db)
+from app.models import Site, SourceType, TrackedLink, User, UserCreate
+from app.settings import settings
+
+
+def test_mapped_rows_match_validated_models():
+    """A mapped row is indistinguishable from the validated model"""
+    created = "2025-03-01T12:00:00+00:00"
+    link = TRACKED_LINK_ROWS(("l1", "u1", "s1", "https://a.co/", "reddit", "abc123", "reddit", "social",
+                              "launch", created, 1))
+    validated = TrackedLink(id="l1", user_id="u1", site_id="s1", original_url="https://a.co/", source="reddit",
+                            short_code="abc123", utm_source="reddit", utm_medium="social",
+                            utm_campaign="launch", created_at=datetime.fromisoformat(created), is_active=True)
+    assert link == validated
+    assert link.model_dump() == validated.model_dump()
+    assert link.model_dump_json() == validated.model_dump_json()
+    assert link.source is SourceType.reddit
+    assert link.is_active is True and isinstance(link.created_at, datetime)
+
+    site = SITE_ROWS(("s1", "u1", "a.co", created, 0))
+    assert site == Site(id="s1", user_id="u1", domain="a.co", created_at=datetime.fromisoformat(created),
+                        is_active=False)
+    user = USER_ROWS(("u1", "a@b.co", "a", "hash", created, 1))
+    assert user == User(id="u1", email="a@b.co", username="a", hashed_password="hash",
+                        created_at=datetime.fromisoformat(created))
+
+
+def test_mapped_instances_are_independent():
+    first = SITE_ROWS(("s1", "u1", "a.co", "2025-03-01T12:00:00+00:00", 1))
+    second = SITE_ROWS(("s2", "u1", "b.co", "2025-03-01T12:00:00+00:00", 1))
+    first.domain = "changed.co"
+    assert second.domain == "b.co"
+    assert first.model_copy(update={"domain": "c.co"}).domain == "c.co"
+
+
+def test_query_functions_return_what_was_written(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "DATABASE_PATH", str(tmp_path / "rows.db"))
+
+    async def run():
+        await init_db()
+        db = await connect()
+        try:
+            user = await create_user(db, UserCreate(email="a@b.co", username="a", password="x" * 8), "hash")
+            site = await create_site(db, user.id, "a.co")
+            links = [await create_tracked_link(db, user.id, site.id, f"https://a.co/{i}", "x", f"code{i}", "x")
+                     for i in range(3)]
+            return (user, site, links, await get_user_by_email(db, "a@b.co"), await get_user_sites(db, user.id),
+                    await get_site_by_id(db, site.id, user.id), await get_user_tracked_links(db, user.id),
+                    await get_tracked_link_by_short_code(db, "code1"))
+        finally:
+            await db.close()
+
+    user, site, links, user_row, sites, site_row, link_rows, link_row = asyncio.run(run())
+    assert user_row == user
+    assert sites == [site] and site_row == site
+    assert sorted(link_rows, key=lambda l: l.short_code) == links
+    assert link_row == links[1]
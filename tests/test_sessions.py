@@ -0,0 +1,126 @@
+import os
+import sqlite3
+import subprocess
+import sys
+
+import pytest
+
+from app.models import SessionData
+from app.sessions import SessionStore
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "sessions.db")
+
+
+def session_data():
+    return SessionData(user_id="user-1", email="a@example.com", username="alice")
+
+
+def test_session_is_visible_to_another_worker(db_path):
+    """Two stores on one file stand in for two gunicorn workers"""
+    worker_a, worker_b = SessionStore(db_path), SessionStore(db_path)
+    session_id = worker_a.create(session_data())
+    assert worker_b.get(session_id) == session_data()
+    assert worker_b.get("no-such-session") is None
+    worker_a.close()
+    worker_b.close()
+
+
+def test_session_is_visible_to_another_process(db_path):
+    session_id = SessionStore(db_path).create(session_data())
+    script = (
+        "import sys; from app.sessions import SessionStore; "
+        f"print(SessionStore({db_path!r}).get(sys.argv[1]).username)"
+    )
+    result = subprocess.run([sys.executable, "-c", script, session_id], capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    assert result.stdout.strip() == "alice", result.stderr
+
+
+def test_logout_on_one_worker_reaches_the_other(db_path):
+    worker_a, worker_b = SessionStore(db_path), SessionStore(db_path, cache_ttl=0)
+    session_id = worker_a.create(session_data())
+    assert worker_b.get(session_id)
+    worker_a.delete(session_id)
+    assert worker_a.get(session_id) is None
+    assert worker_b.get(session_id) is None
+
+
+def test_reads_are_served_from_the_worker_cache(db_path):
+    store = SessionStore(db_path)
+    session_id = SessionStore(db_path).create(session_data())
+    for _ in range(5):
+        assert store.get(session_id)
+    assert store.cache.stats()["hits"] == 4
+    assert store.cache.stats()["misses"] == 1
+
+
+def test_expired_sessions_are_rejected_and_swept(db_path):
+    store = SessionStore(db_path)
+    expired = [store.create(session_data()) for _ in range(3)]
+    live = store.create(session_data())
+    with sqlite3.connect(db_path) as conn:
+        conn.executemany("UPDATE sessions SET expires_at = 0 WHERE id = ?", [(s,) for s in expired])
+
+    fresh = SessionStore(db_path)
+    assert fresh.get(expired[0]) is None
+    assert fresh.get(live)
+    assert fresh.sweep() == 3
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0] == 1
+
+
+def test_new_logins_sweep_expired_sessions(db_path):
+    store = SessionStore(db_path, sweep_interval=0)
+    old = store.create(session_data())
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("UPDATE sessions SET expires_at = 0 WHERE id = ?", (old,))
+    store.create(session_data())
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM sessions WHERE id = ?", (old,)).fetchone()[0] == 0
+
+
+def test_login_waits_for_a_write_lock_without_blocking_the_loop(tmp_path, monkeypatch):
+    """A login arriving mid-transaction must let that transaction commit"""
+    import asyncio
+
+    import httpx
+
+    from app import auth
+    from app.db import close_pools, connect, init_db
+    from app.main import app
+    from app.models import User
+    from app.settings import settings
+
+    monkeypatch.setattr(settings, "DATABASE_PATH", str(tmp_path / "app.db"))
+    asyncio.run(init_db())
+
+    async def get_user_by_email(db, email):
+        return User(id="user-1", email=email, username="alice", hashed_password="x")
+
+    monkeypatch.setattr(auth, "get_user_by_email", get_user_by_email)
+    monkeypatch.setattr(auth, "verify_password", lambda plain, hashed: True)
+
+    async def run():
+        writer = await connect()
+        await writer.execute("INSERT INTO entity_keys (uuid) VALUES ('held')")
+
+        async def commit_later():
+            await asyncio.sleep(0.2)
+            await writer.commit()
+
+        committer = asyncio.create_task(commit_later())
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            response = await asyncio.wait_for(
+                client.post("/auth/login", data={"email": "a@example.com", "password": "secret123"}), 3)
+        await committer
+        await writer.close()
+        await close_pools()
+        return response
+
+    response = asyncio.run(run())
+    assert response.status_code == 302
+    assert settings.SESSION_COOKIE_NAME in response.cookies
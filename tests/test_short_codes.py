@@ -0,0 +1,140 @@
+import asyncio
+import sqlite3
+
+import httpx
+import pytest
+
+from app.auth import get_current_user
+from app.db import close_pools, connect, create_site, init_db
+from app.main import app
+from app.models import User
+from app.settings import settings
+from app.short_codes import (ALPHABET, BASE, Permutation, ShortCodeAllocator, ShortCodesExhausted, encode,
+                             short_code_allocator)
+
+USER = User(id="user-1", email="a@example.com", username="alice", hashed_password="x")
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "DATABASE_PATH", str(tmp_path / "codes.db"))
+    asyncio.run(init_db())
+    short_code_allocator.reset()
+
+
+@pytest.mark.parametrize("length", [1, 2, 3])
+def test_permutation_is_a_bijection(length):
+    permutation = Permutation(length, b"k" * 16)
+    assert sorted(map(permutation, range(BASE ** length))) == list(range(BASE ** length))
+
+
+def test_encode_pads_to_length():
+    assert encode(0, 6) == ALPHABET[0] * 6
+    assert encode(BASE ** 6 - 1, 6) == ALPHABET[-1] * 6
+    assert len(Permutation(7, b"k" * 16).code(12345)) == 7
+
+
+def test_workers_never_hand_out_the_same_code(database):
+    async def run():
+        db = await connect()
+        try:
+            # Two workers sharing the database, interleaving small blocks
+            workers = [ShortCodeAllocator(block_size=10), ShortCodeAllocator(block_size=10)]
+            codes = []
+            for i in range(50):
+                codes += await workers[i % 2].allocate(db, 3)
+            codes += await workers[0].allocate(db, 500)
+        finally:
+            await db.close()
+        return workers, codes
+
+    workers, codes = asyncio.run(run())
+    assert len(codes) == len(set(codes)) == 650
+    assert all(len(code) == 6 and set(code) <= set(ALPHABET) for code in codes)
+    # 75 codes each in blocks of 10, then the rest of the 500 as one block
+    assert (workers[0].blocks, workers[1].blocks) == (9, 8)
+
+
+def test_concurrent_allocations_stay_unique(database):
+    async def run():
+        db = await connect()
+        try:
+            allocator = ShortCodeAllocator(block_size=7)
+            batches = await asyncio.gather(*(allocator.allocate(db, 5) for _ in range(20)))
+        finally:
+            await db.close()
+        return [code for batch in batches for code in batch]
+
+    codes = asyncio.run(run())
+    assert len(set(codes)) == 100
+
+
+def test_permutation_key_is_kept_per_database(database):
+    async def run():
+        db = await connect()
+        try:
+            first = await ShortCodeAllocator(block_size=5).allocate(db, 5)
+            # A new process reserves the next block with the stored key
+            second = await ShortCodeAllocator(block_size=5).allocate(db, 5)
+        finally:
+            await db.close()
+        return first + second
+
+    codes = asyncio.run(run())
+    with sqlite3.connect(settings.DATABASE_PATH) as conn:
+        (key,) = conn.execute("SELECT perm_key FROM short_code_counters WHERE length = 6").fetchone()
+    permutation = Permutation(6, bytes.fromhex(key))
+    assert codes == [permutation.code(value) for value in range(10)]
+
+
+def test_exhausted_code_space_raises(database):
+    async def run():
+        db = await connect()
+        try:
+            allocator = ShortCodeAllocator(length=1, block_size=31)
+            codes = await allocator.allocate(db, 62)
+            with pytest.raises(ShortCodesExhausted):
+                await allocator.allocate(db)
+        finally:
+            await db.close()
+        return codes
+
+    assert sorted(asyncio.run(run())) == sorted(ALPHABET)
+
+
+def test_create_route_retries_a_taken_code(database, monkeypatch):
+    async def seed():
+        db = await connect()
+        try:
+            return await create_site(db, USER.id, "example.com")
+        finally:
+            await db.close()
+
+    site = asyncio.run(seed())
+    with sqlite3.connect(settings.DATABASE_PATH) as conn:
+        conn.execute('''
+            INSERT INTO tracked_links (id, user_id, site_id, original_url, source, short_code, utm_source, created_at)
+            VALUES ('old', ?, ?, 'https://example.com/old', 'x', 'AAAAAA', 'x', '2025-01-01T00:00:00+00:00')
+        ''', (USER.id, site.id))
+    draws = iter([["AAAAAA"], ["BBBBBB"]])
+
+    async def allocate(db, count=1):
+        return next(draws)
+    monkeypatch.setattr(short_code_allocator, "allocate", allocate)
+    app.dependency_overrides[get_current_user] = lambda: USER
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        try:
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                return await client.post("/links/", data={
+                    "site_id": site.id, "original_url": "example.com/new", "source": "x"})
+        finally:
+            await close_pools()
+
+    try:
+        response = asyncio.run(run())
+    finally:
+        app.dependency_overrides.clear()
+    assert response.status_code == 302
+    assert "short_code=BBBBBB" in response.headers["location"]
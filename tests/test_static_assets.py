@@ -0,0 +1,72 @@
+import asyncio
+import gzip
+
+import httpx
+
+from app.main import app
+from app.static_assets import StaticAssets, accepted_encodings, static_assets
+
+
+def get(path, **headers):
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.get(path, headers=headers)
+    return asyncio.run(run())
+
+
+def test_accept_encoding_parsing():
+    assert accepted_encodings("gzip, deflate, br") == {"gzip", "deflate", "br"}
+    assert accepted_encodings("br;q=0, gzip;q=0.5") == {"gzip"}
+    assert accepted_encodings("*") >= {"br", "gzip"}
+    assert accepted_encodings("") == set()
+
+
+def test_fingerprinted_url_is_immutable_and_compressed():
+    url = static_assets.url("em.js")
+    assert url != "/static/em.js" and url.endswith(".js")
+
+    response = get(url, **{"accept-encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["cache-control"].endswith("immutable")
+    assert response.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert "javascript" in response.headers["content-type"]
+    with open("app/static/em.js", "rb") as f:
+        assert response.content == f.read()  # httpx decodes gzip
+
+
+def test_identity_when_compression_not_accepted():
+    response = get("/static/em.js", **{"accept-encoding": "identity"})
+    assert response.status_code == 200
+    assert "content-encoding" not in response.headers
+    assert "immutable" not in response.headers["cache-control"]
+
+
+def test_conditional_request_gets_304():
+    first = get("/static/em.js", **{"accept-encoding": "gzip"})
+    again = get("/static/em.js", **{"accept-encoding": "gzip", "if-none-match": first.headers["etag"]})
+    assert again.status_code == 304
+    assert again.content == b""
+    # The gzip ETag does not validate the identity representation
+    plain = get("/static/em.js", **{"accept-encoding": "identity", "if-none-match": first.headers["etag"]})
+    assert plain.status_code == 200
+
+
+def test_unknown_file_is_404():
+    assert get("/static/nope.js").status_code == 404
+
+
+def test_build_keeps_compressed_variants_only_when_smaller(tmp_path):
+    (tmp_path / "tiny.txt").write_bytes(b"x")
+    (tmp_path / "big.txt").write_bytes(b"hello " * 1000)
+    assets = StaticAssets(str(tmp_path))
+    assert assets.build() == 2
+    assert set(assets.assets["tiny.txt"].variants) == {"identity"}
+    big = assets.assets["big.txt"]
+    assert gzip.decompress(big.variants["gzip"]) == b"hello " * 1000
+
+
+def test_templates_link_fingerprinted_assets():
+    response = get("/auth/login")
+    assert static_assets.url("favicon.svg") in response.text
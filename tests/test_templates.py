@@ -0,0 +1,64 @@
+import asyncio
+import os
+from datetime import datetime
+
+import httpx
+from starlette.requests import Request
+
+from app import templates
+from app.models import User
+from app.settings import settings
+
+
+def test_routers_share_one_environment():
+    from app import auth
+    from app.routes import dashboard, home, sites
+
+    env = templates.get_templates()
+    assert auth.templates is env
+    assert home.templates is env and sites.templates is env and dashboard.templates is env
+    assert env.auto_reload is False
+
+
+def test_precompile_fills_the_bytecode_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "TEMPLATE_BYTECODE_CACHE_DIR", str(tmp_path / "jinja"))
+    templates.get_templates.cache_clear()
+    try:
+        assert templates.precompile_templates() >= 8
+        assert len(os.listdir(tmp_path / "jinja")) >= 8
+    finally:
+        templates.get_templates.cache_clear()
+
+
+def test_streamed_page_matches_rendered_page():
+    context = dict(
+        request=Request({"type": "http", "method": "GET", "path": "/links/", "headers": [],
+                         "query_string": b""}),
+        current_user=User(id="user-1", email="a@example.com", username="alice", hashed_password="x"),
+        sites=[],
+        links=[],
+        now=datetime(2024, 1, 1),
+    )
+
+    async def run():
+        rendered = await templates.get_templates().get_template("links.html").render_async(**context)
+        response = templates.stream_template("links.html", **context)
+        streamed = "".join([chunk async for chunk in response.body_iterator])
+        return rendered, streamed
+
+    rendered, streamed = asyncio.run(run())
+    assert streamed == rendered
+    assert streamed.rstrip().endswith("</html>")
+
+
+def test_pages_render_inside_the_event_loop():
+    from app.main import app
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.get("/auth/login")
+
+    response = asyncio.run(run())
+    assert response.status_code == 200
+    assert "<form" in response.text
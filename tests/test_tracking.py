@@ -0,0 +1,31 @@
+import pytest
+
+from app.models import SourceType
+from app.tracking import classify_source
+
+
+@pytest.mark.parametrize("utm_source,referer,expected", [
+    (None, "https://t.co/abc", "x"),
+    (None, "https://x.com/someone/status/1", "x"),
+    (None, "https://mobile.twitter.com/someone", "x"),
+    (None, "https://old.reddit.com/r/python", "reddit"),
+    (None, "https://lnkd.in/xyz", "linkedin"),
+    (None, "https://www.linkedin.com/feed/", "linkedin"),
+    (None, "https://notreddit.com/", "other"),
+    (None, "https://reddit.com.evil.example/", "other"),
+    (None, "not a url", "other"),
+    (None, None, "other"),
+    ("Twitter", None, "x"),
+    ("newsletter", "https://t.co/abc", "x"),
+    ("newsletter", None, "other"),
+])
+def test_classify_source(utm_source, referer, expected):
+    assert classify_source(utm_source, referer) == expected
+
+
+def test_classified_sources_are_source_types():
+    from app.tracking import SOURCE_HOSTS, UTM_SOURCE_ALIASES
+    values = {s.value for s in SourceType}
+    assert set(SOURCE_HOSTS.values()) <= values
+    assert set(UTM_SOURCE_ALIASES.values()) <= values
+    assert "other" in values
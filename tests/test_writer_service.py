@@ -0,0 +1,106 @@
+import asyncio
+import sqlite3
+
+import pytest
+
+from app.db import EVENT_PARTITION_GLOB, init_db
+from app.event_writer import ForwardingEventWriter, decode_batch, encode_batch
+from app.settings import settings
+from app.writer_service import EventWriterService
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    path = str(tmp_path / "events.db")
+    monkeypatch.setattr(settings, "DATABASE_PATH", path)
+    asyncio.run(init_db())
+    return path
+
+
+def sample_event(i=0):
+    return {"site_id": "site-1", "user_id": "user-1", "kind": "pageview", "path": f"/page/{i}"}
+
+
+def count_events(path):
+    with sqlite3.connect(path) as conn:
+        partitions = [r[0] for r in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name GLOB ?", (EVENT_PARTITION_GLOB,))]
+        return sum(conn.execute(f"SELECT COUNT(*) FROM {name}").fetchone()[0] for name in partitions)
+
+
+def test_frames_round_trip():
+    from app.db import event_row
+
+    rows = [event_row(sample_event(i), 1_700_000_000_000 + i) for i in range(3)]
+    assert decode_batch(encode_batch(rows)) == rows
+    with pytest.raises(ValueError):
+        decode_batch(b'[[1, 2]]\n')
+
+
+def test_workers_forward_batches_to_one_writer(db_path, tmp_path):
+    """Events from several forwarding workers are all written by the service"""
+    socket_path = str(tmp_path / "writer.sock")
+
+    async def run():
+        service = EventWriterService(socket_path, batch_size=1000)
+        await service.start()
+        workers = [ForwardingEventWriter(socket_path, batch_size=25, flush_interval_ms=10) for _ in range(3)]
+        try:
+            for worker in workers:
+                await worker.start()
+            for i in range(100):
+                for worker in workers:
+                    assert worker.enqueue(sample_event(i))
+        finally:
+            for worker in workers:
+                await worker.stop()
+            await service.stop()
+        return [w.stats() for w in workers], service.stats()
+
+    worker_stats, service_stats = asyncio.run(run())
+    assert all(s["forwarded"] == 100 and s["fallbacks"] == 0 for s in worker_stats)
+    assert service_stats["connections"] == 3
+    assert service_stats["writer"]["flushed"] == 300
+    # Far fewer transactions than the workers' own batches would have needed
+    assert service_stats["writer"]["flush_count"] < service_stats["frames"]
+    assert count_events(db_path) == 300
+
+
+def test_malformed_frames_are_skipped(db_path, tmp_path):
+    socket_path = str(tmp_path / "writer.sock")
+
+    async def run():
+        service = EventWriterService(socket_path)
+        await service.start()
+        try:
+            _, stream = await asyncio.open_unix_connection(socket_path)
+            stream.write(b'not json\n')
+            stream.write(encode_batch([]))
+            await stream.drain()
+            stream.close()
+            await stream.wait_closed()
+        finally:
+            await service.stop()
+        return service.stats()
+
+    stats = asyncio.run(run())
+    assert stats["bad_frames"] == 1
+    assert stats["frames"] == 1
+
+
+def test_falls_back_to_local_writes_without_a_writer(db_path, tmp_path):
+    """No service listening: batches are still written, through the worker's own connection"""
+    async def run():
+        worker = ForwardingEventWriter(str(tmp_path / "missing.sock"), batch_size=10, flush_interval_ms=10)
+        await worker.start()
+        try:
+            for i in range(15):
+                worker.enqueue(sample_event(i))
+        finally:
+            await worker.stop()
+        return worker.stats()
+
+    stats = asyncio.run(run())
+    assert stats["fallbacks"] == 15 and stats["forwarded"] == 0
+    assert stats["failed"] == 0
+    assert count_events(db_path) == 15